@@ -0,0 +1,23 @@
+from flask import Blueprint, jsonify
+from flasgger import swag_from
+from utils.result_cache import result_cache
+from utils.price_cache import price_cache
+from utils.data_version import get_data_version
+from utils.reference_data import reference_cache
+from core.covariance import factorization_cache_stats
+
+cache_stats_bp = Blueprint('cache_stats', __name__)
+
+@cache_stats_bp.route('/api/cache_stats', methods=['GET'])
+@swag_from('../docs/cache_stats.yml')
+def cache_stats():
+    try:
+        return jsonify({
+            "data_version": get_data_version(),
+            "result_cache": result_cache.stats(),
+            "price_cache": price_cache.stats(),
+            "reference_cache": reference_cache.stats(),
+            "factorization_cache": factorization_cache_stats(),
+        })
+    except Exception as e:
+        return jsonify({"error": f"Ошибка при получении статистики кэша: {str(e)}"}), 500
@@ -1,8 +1,15 @@
 from flask import Blueprint, request, jsonify
 from flasgger import swag_from
 from datetime import datetime
-from core.optimizer import optimizer_for_tickers, optimizer_for_assets
-from core.history import get_portfolio_history, calculate_max_drawdown_and_recovery
+from core.optimizer import optimizer_for_portfolio
+from utils.result_cache import result_cache
+from core.covariance import check_risk_model, DEFAULT_RISK_MODEL
+from core.history import get_portfolios_history
+from core.drawdown import drawdown_analytics, DEFAULT_MAX_EPISODES
+from core.downsample import downsample_history, get_downsample_options
+from core.backtest import get_rebalance_options
+from core.risk_metrics import risk_metrics, get_risk_options
+from utils.json_stream import History, get_history_options, json_response
 
 
 # Создаем Blueprint для объединенного эндпоинта
@@ -30,42 +37,57 @@ def run_optimizer(data, include_history=False):
         l2_reg = data.get("l2_reg", False)
         gamma = data.get("gamma", 1.0)
         frequency = data.get("frequency", 252)
+        risk_model = data.get("risk_model", DEFAULT_RISK_MODEL)
+        history_format, stream = get_history_options(data)
 
         # Оптимизация
-        if mode == "tickers":
-            result = optimizer_for_tickers(
-                tickers, rf, start_date, end_date, objective,
-                risk_aversion, target_volatility, target_return,
-                short_positions, l2_reg, gamma, frequency=frequency
-            )
-        elif mode == "assets":
-            result = optimizer_for_assets(
-                tickers, rf, start_date, end_date, objective,
-                risk_aversion, target_volatility, target_return,
-                short_positions, l2_reg, gamma, frequency=frequency
-            )
-        else:
+        if mode not in ("tickers", "assets"):
             return jsonify({"error": "Invalid mode"}), 400
 
+        if history_format is None:
+            return jsonify({"error": "Неизвестный формат истории (history_format)"}), 400
+
+        try:
+            max_points, resample = get_downsample_options(data)
+            rebalance = get_rebalance_options(data)
+            risk = get_risk_options(data)
+            check_risk_model(risk_model)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # Тот же кэш, что и у /api/optimize: ключ - канонический запрос к оптимизатору
+        params = dict(
+            tickers=tickers, rf=rf, start_date=start_date, end_date=end_date, objective=objective,
+            risk_aversion=risk_aversion, target_volatility=target_volatility, target_return=target_return,
+            short_positions=short_positions, l2_reg=l2_reg, gamma=gamma, frequency=frequency, mode=mode,
+            risk_model=risk_model
+        )
+        result = result_cache.get_or_compute(
+            "optimizer_for_portfolio", params, lambda: optimizer_for_portfolio(**params)
+        )
+
         # История портфеля
         if include_history:
             weights = result.get("weights_dict")
             if not weights:
                 return jsonify({"error": "Не удалось получить веса портфеля"}), 500
 
-            df_history, message = get_portfolio_history(weights, start_date, end_date, mode=mode)
-            max_dd, dd_dates, recovery_days = calculate_max_drawdown_and_recovery(df_history)
+            benchmark = risk.pop("benchmark")
+            histories = get_portfolios_history(
+                [weights] + ([{benchmark: 1.0}] if benchmark else []), start_date, end_date,
+                mode=mode, rebalance=rebalance
+            )
+            df_history, message = histories[0]
             
-            result["history"] = df_history.to_dict(orient="records")
+            result["history"] = History(downsample_history(df_history, max_points, resample), history_format)
             result["history_message"] = message
-            result["metrics"] = {
-                "max_drawdown": max_dd,
-                "max_drawdown_date": dd_dates[0],
-                "recovery_date": dd_dates[1],
-                "recovery_days": recovery_days
-            }
+            result["metrics"] = drawdown_analytics(df_history, max_episodes=DEFAULT_MAX_EPISODES)
+            if result["metrics"] is not None:
+                result["metrics"].update(risk_metrics(
+                    df_history, histories[1][0] if benchmark else None, rf=rf, **risk
+                ) or {})
 
-        return jsonify(result)
+        return json_response(result, history_format, stream)
     
     except Exception as e:
         return jsonify({"error": f"Ошибка на сервере: {str(e)}"}), 500
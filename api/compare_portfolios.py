@@ -1,8 +1,14 @@
 from flask import Blueprint, request, jsonify
 from flasgger import swag_from
 from datetime import datetime
-from core.optimizer import optimizer_for_tickers
-from core.history import get_portfolio_history, calculate_max_drawdown_and_recovery
+from core.optimizer import optimizer_for_portfolio
+from core.covariance import check_risk_model, DEFAULT_RISK_MODEL
+from core.history import get_portfolios_history
+from core.drawdown import drawdown_analytics_for_histories, DEFAULT_MAX_EPISODES
+from core.downsample import downsample_history, get_downsample_options
+from core.backtest import get_rebalance_options
+from core.risk_metrics import risk_metrics_for_histories, get_risk_options
+from utils.json_stream import History, get_history_options, json_response
 
 compare_bp = Blueprint('compare_portfolios', __name__)
 
@@ -32,77 +38,78 @@ def compare_portfolios():
         l2_reg = data.get("l2_reg", False)
         gamma = data.get("gamma", 1.0)
         frequency = data.get("frequency", 252)
+        risk_model = data.get("risk_model", DEFAULT_RISK_MODEL)
+        history_format, stream = get_history_options(data)
 
-        result = {}
+        if history_format is None:
+            return jsonify({"error": "Неизвестный формат истории (history_format)"}), 400
 
-        # 1. Пользовательский портфель (если есть веса)
-        if user_weights:
-            df_user_hist, msg = get_portfolio_history(user_weights, start_date, end_date, mode="tickers", frequency=frequency)
-            ret, vol = df_user_hist['portfolio_value'].pct_change().mean() * frequency, df_user_hist['portfolio_value'].pct_change().std() * (frequency ** 0.5)
-            sharpe = (ret - rf) / vol if vol > 0 else None
-            dd, dd_dates, recovery_days = calculate_max_drawdown_and_recovery(df_user_hist)
-
-            result["user"] = {
-                "weights_dict": user_weights,
-                "history": df_user_hist.to_dict(orient="records"),
-                "metrics": {
-                    "return": ret,
-                    "volatility": vol,
-                    "sharpe_ratio": sharpe,
-                    "max_drawdown": dd,
-                    "max_drawdown_date": dd_dates[0],
-                    "recovery_date": dd_dates[1],
-                    "recovery_days": recovery_days
-                }
-            }
+        try:
+            max_points, resample = get_downsample_options(data)
+            rebalance = get_rebalance_options(data)
+            risk = get_risk_options(data)
+            check_risk_model(risk_model)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        result = {}
 
-        # 2. Оптимизированный портфель (всегда)
-        opt_result = optimizer_for_tickers(
+        # 1. Оптимизированный портфель (всегда)
+        opt_result = optimizer_for_portfolio(
             tickers, rf, start_date, end_date, objective,
             risk_aversion, target_volatility, target_return,
-            short_positions, l2_reg, gamma, frequency
+            short_positions, l2_reg, gamma, frequency, risk_model=risk_model
         )
-
         opt_weights = opt_result["weights_dict"]
-        df_opt_hist, msg = get_portfolio_history(opt_weights, start_date, end_date, mode="tickers", frequency=frequency)
-        dd, dd_dates, recovery_days = calculate_max_drawdown_and_recovery(df_opt_hist)
-
-        result["optimized"] = {
-            "weights_dict": opt_weights,
-            "history": df_opt_hist.to_dict(orient="records"),
-            "metrics": {
-                "return": opt_result["performance"]["return"],
-                "volatility": opt_result["performance"]["volatility"],
-                "sharpe_ratio": opt_result["performance"]["sharpe_ratio"],
-                "max_drawdown": dd,
-                "max_drawdown_date": dd_dates[0],
-                "recovery_date": dd_dates[1],
-                "recovery_days": recovery_days
-            }
-        }
-
-        # 3. Бенчмарк (опционально)
-        if benchmark:
-            df_bench_hist, msg = get_portfolio_history({benchmark: 1.0}, start_date, end_date, mode="assets")
-            ret, vol = df_bench_hist['portfolio_value'].pct_change().mean() * frequency, df_bench_hist['portfolio_value'].pct_change().std() * (frequency ** 0.5)
-            sharpe = (ret - rf) / vol if vol > 0 else None
-            dd, dd_dates, recovery_days = calculate_max_drawdown_and_recovery(df_bench_hist)
-
-            result["benchmark"] = {
-                "weights_dict": {benchmark: 1.0},
-                "history": df_bench_hist.to_dict(orient="records"),
-                "metrics": {
-                    "return": ret,
-                    "volatility": vol,
-                    "sharpe_ratio": sharpe,
-                    "max_drawdown": dd,
-                    "max_drawdown_date": dd_dates[0],
-                    "recovery_date": dd_dates[1],
-                    "recovery_days": recovery_days
-                }
+
+        # Портфели, история которых строится за один проход по общей матрице доходностей
+        portfolios = {"optimized": opt_weights}
+        if user_weights:
+            portfolios["user"] = user_weights
+        if benchmark and frequency == 252:
+            portfolios["benchmark"] = {benchmark: 1.0}
+
+        names = list(portfolios)
+        histories = dict(zip(names, get_portfolios_history(
+            [portfolios[name] for name in names], start_date, end_date, frequency=frequency, rebalance=rebalance
+        )))
+
+        # История бенчмарка всегда дневная
+        if benchmark and "benchmark" not in histories:
+            histories["benchmark"] = get_portfolios_history([{benchmark: 1.0}], start_date, end_date)[0]
+            portfolios["benchmark"] = {benchmark: 1.0}
+            names.append("benchmark")
+
+        # Просадки и метрики риска всех траекторий - векторными проходами
+        history_dfs = [histories[name][0] for name in names]
+        drawdowns = dict(zip(names, drawdown_analytics_for_histories(history_dfs, max_episodes=DEFAULT_MAX_EPISODES)))
+        risk.pop("benchmark")
+        risks = dict(zip(names, risk_metrics_for_histories(
+            history_dfs, histories["benchmark"][0] if "benchmark" in histories else None, rf=rf,
+            frequency=[252 if name == "benchmark" else frequency for name in names], **risk
+        )))
+
+        # Метрики пользовательского, оптимизированного портфелей и бенчмарка
+        for name in ("user", "optimized", "benchmark"):
+            if name not in portfolios:
+                continue
+
+            df_hist, message = histories[name]
+            metrics = {**(risks[name] or {}), **(drawdowns[name] or {})}
+            if name == "optimized":
+                # Ожидаемые доходность, риск и Шарп оптимизатора
+                metrics["return"] = opt_result["performance"]["return"]
+                metrics["volatility"] = opt_result["performance"]["volatility"]
+                metrics["sharpe_ratio"] = opt_result["performance"]["sharpe_ratio"]
+
+            result[name] = {
+                "weights_dict": portfolios[name],
+                "history": History(downsample_history(df_hist, max_points, resample), history_format),
+                "history_message": message,
+                "metrics": metrics or None  # как в /api/history: пустая история - без метрик
             }
 
-        return jsonify(result)
+        return json_response(result, history_format, stream)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -0,0 +1,40 @@
+from flask import Blueprint, request, jsonify
+from flasgger import swag_from
+from datetime import datetime
+from core.frontier import frontier_for_portfolio
+from core.covariance import check_risk_model, DEFAULT_RISK_MODEL
+
+frontier_bp = Blueprint('frontier', __name__)
+
+@frontier_bp.route('/api/frontier', methods=['POST'])
+@swag_from('../docs/frontier.yml')
+def efficient_frontier():
+    data = request.get_json()
+
+    tickers = data.get("tickers", [])
+    rf = data.get("rf", 0.0)
+    start_date = data.get("start_date", "1995-01-01")
+    end_date = data.get("end_date", datetime.today().strftime("%Y-%m-%d"))
+    n_points = data.get("n_points", 50)
+    short_positions = data.get("short_positions", False)
+    frequency = data.get("frequency", 252)
+    risk_model = data.get("risk_model", DEFAULT_RISK_MODEL)
+
+    if not tickers:
+        return jsonify({"error": "Список активов (tickers) обязателен"}), 400
+
+    try:
+        check_risk_model(risk_model)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        points = frontier_for_portfolio(
+            tickers, rf, start_date, end_date,
+            n_points=n_points, short_positions=short_positions, frequency=frequency,
+            risk_model=risk_model
+        )
+    except Exception as e:
+        return jsonify({"error": f"Ошибка на сервере: {str(e)}"}), 500
+
+    return jsonify({"points": points})
@@ -0,0 +1,71 @@
+from flask import Blueprint, request, jsonify
+from flasgger import swag_from
+from datetime import datetime
+from core.history import get_portfolio_paths, get_history_frames
+from core.drawdown import drawdown_analytics_batch, DEFAULT_MAX_EPISODES
+from core.downsample import downsample_history, get_downsample_options
+from core.backtest import get_rebalance_options
+from core.risk_metrics import risk_metrics_batch, get_risk_options
+from utils.json_stream import History, get_history_options, json_response
+
+history_multi_bp = Blueprint('history_multi', __name__)
+
+@history_multi_bp.route('/api/history_multi', methods=['POST'])
+@swag_from('../docs/history_multi.yml')
+def portfolios_history():
+    data = request.get_json()
+    portfolios = data.get("portfolios", [])
+    start_date = data.get("start_date", "1995-01-01")
+    end_date = data.get("end_date", datetime.today().strftime("%Y-%m-%d"))
+    frequency = data.get("frequency", 252)
+    rf = data.get("rf", 0.0)
+    history_format, stream = get_history_options(data)
+
+    if history_format is None:
+        return jsonify({"error": "Неизвестный формат истории (history_format)"}), 400
+
+    try:
+        max_points, resample = get_downsample_options(data)
+        rebalance = get_rebalance_options(data)
+        risk = get_risk_options(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if not portfolios or not isinstance(portfolios, list):
+        return jsonify({"error": "Список портфелей (portfolios) обязателен"}), 400
+
+    if any(not item.get("weights_dict") for item in portfolios):
+        return jsonify({"error": "Отсутствуют веса портфеля"}), 400
+
+    try:
+        # Все траектории (и бенчмарк - последним столбцом) - одним умножением матриц,
+        # просадки и метрики риска - одним векторным проходом
+        benchmark = risk.pop("benchmark")
+        weights_list = [item["weights_dict"] for item in portfolios]
+        dates, values, first_dates, last_dates = get_portfolio_paths(
+            weights_list + ([{benchmark: 1.0}] if benchmark else []),
+            start_date=start_date, end_date=end_date, frequency=frequency, rebalance=rebalance
+        )
+        benchmark_values = values[:, len(weights_list)] if benchmark else None
+        values = values[:, :len(weights_list)]
+        drawdowns = drawdown_analytics_batch(dates, values, max_episodes=DEFAULT_MAX_EPISODES)
+        risks = risk_metrics_batch(values, benchmark=benchmark_values, rf=rf, frequency=frequency, **risk)
+
+        histories = get_history_frames(dates, values, first_dates, last_dates)
+
+        results = []
+        for k, item in enumerate(portfolios):
+            df_history, message = histories[k]
+
+            results.append({
+                "name": item.get("name", f"portfolio_{k + 1}"),
+                "weights_dict": item["weights_dict"],
+                "history": History(downsample_history(df_history, max_points, resample), history_format),
+                "history_message": message,
+                "metrics": {**drawdowns[k], **(risks[k] or {})} if drawdowns[k] is not None else None
+            })
+
+    except Exception as e:
+        return jsonify({"error": f"Ошибка при получении данных: {str(e)}"}), 500
+
+    return json_response({"portfolios": results}, history_format, stream)
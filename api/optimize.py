@@ -1,7 +1,9 @@
 from flask import Blueprint, request, jsonify
 from flasgger import swag_from
 from datetime import datetime
-from core.optimizer import optimizer_for_tickers, optimizer_for_assets, optimizer_for_portfolio
+from core.optimizer import optimizer_for_portfolio
+from utils.result_cache import result_cache
+from core.covariance import check_risk_model, DEFAULT_RISK_MODEL
 
 optimize_bp = Blueprint('optimize', __name__)
 
@@ -23,12 +25,22 @@ def optimize():
     l2_reg = data.get("l2_reg", False)
     gamma = data.get("gamma", 1.0)
     frequency = data.get("frequency", 252)
+    risk_model = data.get("risk_model", DEFAULT_RISK_MODEL)
 
+    try:
+        check_risk_model(risk_model)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    result = optimizer_for_portfolio(
-        tickers, rf, start_date, end_date, objective,
-        risk_aversion, target_volatility, target_return,
-        short_positions, l2_reg, gamma, frequency=frequency, mode=mode
+    # Одинаковые запросы (с точностью до порядка тикеров и формата дат) берутся из кэша
+    params = dict(
+        tickers=tickers, rf=rf, start_date=start_date, end_date=end_date, objective=objective,
+        risk_aversion=risk_aversion, target_volatility=target_volatility, target_return=target_return,
+        short_positions=short_positions, l2_reg=l2_reg, gamma=gamma, frequency=frequency, mode=mode,
+        risk_model=risk_model
+    )
+    result = result_cache.get_or_compute(
+        "optimizer_for_portfolio", params, lambda: optimizer_for_portfolio(**params)
     )
 
     return jsonify(result)
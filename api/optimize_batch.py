@@ -0,0 +1,27 @@
+from flask import Blueprint, request, jsonify
+from flasgger import swag_from
+from datetime import datetime
+from core.batch import optimize_batch
+
+optimize_batch_bp = Blueprint('optimize_batch', __name__)
+
+@optimize_batch_bp.route('/api/optimize_batch', methods=['POST'])
+@swag_from('../docs/optimize_batch.yml')
+def optimize_many():
+    data = request.get_json()
+
+    items = data.get("items", [])
+    defaults = data.get("defaults", {})
+
+    if not items or not isinstance(items, list):
+        return jsonify({"error": "Список наборов параметров (items) обязателен"}), 400
+
+    # Общая дата окончания по умолчанию, как в /api/optimize
+    defaults.setdefault("end_date", datetime.today().strftime("%Y-%m-%d"))
+
+    try:
+        results = optimize_batch(items, defaults)
+    except Exception as e:
+        return jsonify({"error": f"Ошибка на сервере: {str(e)}"}), 500
+
+    return jsonify({"results": results})
@@ -1,7 +1,12 @@
 from flask import Blueprint, request, jsonify
 from flasgger import swag_from
 from datetime import datetime
-from core.history import get_portfolio_history, calculate_max_drawdown_and_recovery
+from core.history import get_portfolios_history
+from core.drawdown import drawdown_analytics, DEFAULT_MAX_EPISODES
+from core.downsample import downsample_history, get_downsample_options
+from core.backtest import get_rebalance_options
+from core.risk_metrics import risk_metrics, get_risk_options
+from utils.json_stream import History, get_history_options, json_response
 import logging
 
 #logger = logging.getLogger(__name__)
@@ -17,32 +22,45 @@ def portfolio_history():
     start_date = data.get("start_date", "1995-01-01")
     end_date = data.get("end_date", datetime.today().strftime("%Y-%m-%d"))
     frequency = data.get("frequency", 252)
+    rf = data.get("rf", 0.0)
+    history_format, stream = get_history_options(data)
 
     if not weights:
         return jsonify({"error": "Отсутствуют веса портфеля"}), 400
 
+    if history_format is None:
+        return jsonify({"error": "Неизвестный формат истории (history_format)"}), 400
+
     try:
-        df_history, message = get_portfolio_history(
-            weights, start_date=start_date, end_date=end_date,
-            frequency=252, mode=mode
-        )
+        max_points, resample = get_downsample_options(data)
+        rebalance = get_rebalance_options(data)
+        risk = get_risk_options(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        max_dd, dd_dates, recovery_days = calculate_max_drawdown_and_recovery(df_history)
+    try:
+        # Бенчмарк считается тем же проходом по панели цен, что и портфель
+        benchmark = risk.pop("benchmark")
+        histories = get_portfolios_history(
+            [weights] + ([{benchmark: 1.0}] if benchmark else []), start_date=start_date, end_date=end_date,
+            frequency=252, mode=mode, rebalance=rebalance
+        )
+        df_history, message = histories[0]
+        benchmark_df = histories[1][0] if benchmark else None
 
-        metrics = {
-            "max_drawdown": max_dd,
-            "max_drawdown_date": dd_dates[0],
-            "recovery_date": dd_dates[1],
-            "recovery_days": recovery_days
-        }
+        # Просадки, эпизоды, время под водой и индекс Ульцера - за один проход (по полной истории)
+        metrics = drawdown_analytics(df_history, max_episodes=DEFAULT_MAX_EPISODES)
+        if metrics is not None:
+            # VaR/CVaR, Сортино, Кальмар, скользящая волатильность и бета - одним векторным проходом
+            metrics.update(risk_metrics(df_history, benchmark_df, rf=rf, **risk) or {})
 
     except Exception as e:
         return jsonify({"error": f"Ошибка при получении данных: {str(e)}"}), 500
 
 
-    return jsonify({
-        "history": df_history.to_dict(orient="records"),
+    return json_response({
+        "history": History(downsample_history(df_history, max_points, resample), history_format),
         "history_message": message,
         "metrics": metrics
-    })
+    }, history_format, stream)
 
@@ -0,0 +1,34 @@
+from flask import Blueprint, request, jsonify
+from flasgger import swag_from
+from core.simulation import simulate_portfolio, get_simulation_options
+
+simulate_bp = Blueprint('simulate', __name__)
+
+@simulate_bp.route('/api/simulate', methods=['POST'])
+@swag_from('../docs/simulate.yml')
+def simulate():
+    data = request.get_json()
+    weights = data.get("weights_dict")
+
+    if not weights:
+        return jsonify({"error": "Отсутствуют веса портфеля"}), 400
+
+    try:
+        options = get_simulation_options(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        result = simulate_portfolio(
+            weights,
+            start_date=data.get("start_date", "1995-01-01"),
+            end_date=data.get("end_date"),
+            initial_portfolio_value=data.get("initial_portfolio_value", 1000000),
+            **options
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Ошибка на сервере: {str(e)}"}), 500
+
+    return jsonify(result)
@@ -0,0 +1,71 @@
+from flask import Blueprint, request, jsonify
+from flasgger import swag_from
+from datetime import datetime
+from core.walk_forward import walk_forward, DEFAULT_LOOKBACK
+from core.drawdown import drawdown_analytics, DEFAULT_MAX_EPISODES
+from core.history import get_portfolios_history
+from core.risk_metrics import risk_metrics, get_risk_options
+from core.covariance import DEFAULT_RISK_MODEL
+from core.downsample import downsample_history, get_downsample_options
+from utils.json_stream import History, get_history_options, json_response
+
+walk_forward_bp = Blueprint('walk_forward', __name__)
+
+@walk_forward_bp.route('/api/walk_forward', methods=['POST'])
+@swag_from('../docs/walk_forward.yml')
+def walk_forward_backtest():
+    data = request.get_json()
+    tickers = data.get("tickers", [])
+    history_format, stream = get_history_options(data)
+
+    if not tickers:
+        return jsonify({"error": "Список активов (tickers) обязателен"}), 400
+
+    if history_format is None:
+        return jsonify({"error": "Неизвестный формат истории (history_format)"}), 400
+
+    try:
+        max_points, resample = get_downsample_options(data)
+        risk = get_risk_options(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    start_date = data.get("start_date", "1995-01-01")
+    end_date = data.get("end_date", datetime.today().strftime("%Y-%m-%d"))
+    rf = data.get("rf", 0.0)
+    benchmark = risk.pop("benchmark")
+
+    try:
+        result = walk_forward(
+            tickers,
+            start_date=start_date,
+            end_date=end_date,
+            lookback=data.get("lookback", DEFAULT_LOOKBACK),
+            window=data.get("window", "rolling"),
+            rebalance=data.get("rebalance", "monthly"),
+            commission=data.get("commission", 0.0),
+            slippage=data.get("slippage", 0.0),
+            rf=rf,
+            objective=data.get("objective", "max_sharpe"),
+            risk_aversion=data.get("risk_aversion", 1.0),
+            target_volatility=data.get("target_volatility"),
+            target_return=data.get("target_return"),
+            short_positions=data.get("short_positions", False),
+            l2_reg=data.get("l2_reg", False),
+            gamma=data.get("gamma", 1.0),
+            risk_model=data.get("risk_model", DEFAULT_RISK_MODEL),
+        )
+        benchmark_df = get_portfolios_history([{benchmark: 1.0}], start_date, end_date)[0][0] if benchmark else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Ошибка на сервере: {str(e)}"}), 500
+
+    # Просадки и метрики риска - по полной кривой капитала вне выборки
+    df_history = result.pop("history")
+    result["metrics"] = drawdown_analytics(df_history, max_episodes=DEFAULT_MAX_EPISODES)
+    if result["metrics"] is not None:
+        result["metrics"].update(risk_metrics(df_history, benchmark_df, rf=rf, **risk) or {})
+    result["history"] = History(downsample_history(df_history, max_points, resample), history_format)
+
+    return json_response(result, history_format, stream)
@@ -0,0 +1,38 @@
+# Rebalancing backtest: 30 years x 100 assets of synthetic daily prices
+# Run from the project root: python -m benchmarks.bench_backtest
+import time
+import numpy as np
+import pandas as pd
+
+from core.backtest import backtest
+
+N_DAYS, N_ASSETS = 30 * 252, 100
+REPEATS = 20
+MODES = [
+    ("none", {}),
+    ("monthly", {}),
+    ("quarterly", {}),
+    ("annual", {}),
+    ("threshold", {"threshold": 0.01}),
+    ("threshold", {"threshold": 0.05}),
+]
+
+
+def main():
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range("1995-01-02", periods=N_DAYS)
+    prices = np.exp(np.cumsum(rng.normal(0.0003, 0.02, (N_DAYS, N_ASSETS)), axis=0))
+    weights = rng.dirichlet(np.ones(N_ASSETS))
+
+    for mode, options in MODES:
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            values, stats = backtest(prices, weights, dates, mode=mode, commission=0.0005, slippage=0.0005, **options)
+        elapsed = (time.perf_counter() - start) / REPEATS
+        label = f"{mode} {options.get('threshold', '')}".strip()
+        print(f"{label:<16} {elapsed * 1000:7.2f} ms  rebalances: {stats['rebalances']:4d}  "
+              f"costs: {stats['costs']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+# Frontier sweep vs N separate efficient_risk optimizations
+# Run from the project root: python -m benchmarks.bench_frontier
+import time
+import numpy as np
+
+from core.optimizer import optimizer_for_portfolio
+from core.frontier import frontier_for_portfolio
+
+TICKERS = ["SBER", "GAZP", "LKOH", "MGNT", "MOEX", "GMKN", "ROSN", "NVTK", "TATN", "CHMF"]
+START_DATE, END_DATE = "2015-01-01", "2024-01-01"
+N_POINTS = 50
+
+
+def main():
+    start = time.perf_counter()
+    points = frontier_for_portfolio(TICKERS, start_date=START_DATE, end_date=END_DATE, n_points=N_POINTS)
+    sweep_time = time.perf_counter() - start
+
+    # Baseline: one /api/optimize-style call per volatility level of the sweep
+    levels = np.linspace(points[0]["volatility"] * 1.001, points[-1]["volatility"], N_POINTS)
+    start = time.perf_counter()
+    for level in levels:
+        try:
+            optimizer_for_portfolio(TICKERS, start_date=START_DATE, end_date=END_DATE,
+                                    objective="efficient_risk", target_volatility=float(level))
+        except Exception as e:
+            print(f"{level:.4f}: {e}")
+    baseline_time = time.perf_counter() - start
+
+    print(f"Frontier sweep, {N_POINTS} points: {sweep_time:.3f} s")
+    print(f"{N_POINTS} x efficient_risk:        {baseline_time:.3f} s")
+    print(f"Speed-up: {baseline_time / sweep_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
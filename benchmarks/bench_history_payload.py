@@ -0,0 +1,48 @@
+# Payload size and latency of /api/compare_portfolios: records (jsonify) vs columnar vs streamed
+# Run from the project root: python -m benchmarks.bench_history_payload
+import time
+
+from main import app
+
+BODY = {
+    "tickers": ["SBER", "GAZP", "LKOH", "MGNT", "GMKN"],
+    "weights": {"SBER": 0.2, "GAZP": 0.2, "LKOH": 0.2, "MGNT": 0.2, "GMKN": 0.2},
+    "benchmark": "IMOEX",
+    "start_date": "1995-01-01",
+    "end_date": "2025-01-01",
+}
+VARIANTS = [
+    ("records (jsonify)", {}),
+    ("columnar", {"history_format": "columnar"}),
+    ("records, stream", {"stream": True}),
+    ("columnar, stream", {"history_format": "columnar", "stream": True}),
+]
+REPEATS = 5
+
+
+def measure(client, options):
+    first_byte, total, size = [], [], 0
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        response = client.post("/api/compare_portfolios", json={**BODY, **options}, buffered=False)
+        chunks = iter(response.response)
+        first = next(chunks)
+        first_byte.append(time.perf_counter() - start)
+        size = len(first) + sum(len(chunk) for chunk in chunks)
+        total.append(time.perf_counter() - start)
+        response.close()
+    return min(first_byte), min(total), size
+
+
+def main():
+    client = app.test_client()
+    client.post("/api/compare_portfolios", json=BODY)  # warm-up: price cache, compiled problems
+
+    print(f"{'variant':<20} {'first byte, ms':>15} {'total, ms':>10} {'bytes':>10}")
+    for name, options in VARIANTS:
+        first_byte, total, size = measure(client, options)
+        print(f"{name:<20} {first_byte * 1000:>15.1f} {total * 1000:>10.1f} {size:>10}")
+
+
+if __name__ == "__main__":
+    main()
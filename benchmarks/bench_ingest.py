@@ -0,0 +1,125 @@
+# Concurrent ingestion vs the serial updater against a local stub ISS server
+# Run from the project root: python -m benchmarks.bench_ingest
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+import pandas as pd
+
+import utils.data_update as data_update
+from utils.ingest import ingest_all, IngestStats
+
+STOCKS = [f"STK{i:02d}" for i in range(20)]
+INDEXES = [f"IDX{i}" for i in range(4)]
+CURRENCIES = ["GLDRUB_TOM"]
+LAST_STORED_DATE = "2022-12-30"
+STUB_LATENCY = 0.02  # seconds per response, imitates the network round trip
+
+TABLES = {
+    "stock_values": ("ticker", ["tradedate", "open", "high", "low", "close", "volume", "ticker"], STOCKS),
+    "index_values": ("secid", ["tradedate", "open", "close", "low", "high", "capitalization", "secid"], INDEXES),
+    "currency_values": ("secid", ["tradedate", "secid", "boardid", "open", "close", "low", "high", "volrur"], CURRENCIES),
+}
+
+
+class StubISSHandler(BaseHTTPRequestHandler):
+    """Ответы в формате ISS: дневные свечи акций и история индексов/валют с постраничной выдачей."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        ticker = url.path.rsplit("/", 1)[-1].split(".")[0]
+        if ticker == "candles":
+            ticker = url.path.rsplit("/", 2)[-2]
+
+        dates = pd.bdate_range(query["from"], query["till"])
+        start = int(query.get("start", 0))
+        rng = np.random.default_rng(abs(hash(ticker)) % 2 ** 32)
+        prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(dates))))
+
+        if url.path.endswith("candles.json"):
+            page = [{"begin": f"{d.date()} 00:00:00", "open": p, "high": p, "low": p, "close": p, "volume": 1000}
+                    for d, p in list(zip(dates, prices))[start:start + 500]]
+            body = [{"charsetinfo": {"name": "utf-8"}}, {"candles": page}]
+        elif "/index/" in url.path:
+            columns = ["TRADEDATE", "OPEN", "CLOSE", "LOW", "HIGH", "CAPITALIZATION"]
+            page = [[str(d.date()), p, p, p, p, 0] for d, p in list(zip(dates, prices))[start:start + 100]]
+            body = {"history": {"columns": columns, "data": page}}
+        else:
+            columns = ["TRADEDATE", "SECID", "BOARDID", "OPEN", "CLOSE", "LOW", "HIGH", "VOLRUR"]
+            page = [[str(d.date()), ticker, "CETS", p, p, p, p, 0] for d, p in list(zip(dates, prices))[start:start + 100]]
+            body = {"history": {"columns": columns, "data": page}}
+
+        time.sleep(STUB_LATENCY)
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def make_database(path):
+    conn = sqlite3.connect(path)
+    for table_name, (id_column, columns, tickers) in TABLES.items():
+        conn.execute(f"CREATE TABLE {table_name} ({', '.join(columns)})")
+        for ticker in tickers:
+            row = {column: 0 for column in columns}
+            row.update({"tradedate": LAST_STORED_DATE, id_column: ticker, "close": 100.0})
+            conn.execute(f"INSERT INTO {table_name} VALUES ({', '.join('?' * len(columns))})",
+                         [row[column] for column in columns])
+    conn.commit()
+    conn.close()
+
+
+def run(workdir, concurrent, base_url):
+    db_path = os.path.join(workdir, "concurrent.db" if concurrent else "serial.db")
+    make_database(db_path)
+    tables = []
+    for table_name in TABLES:
+        csv_dir = os.path.join(workdir, ("concurrent_" if concurrent else "serial_") + table_name)
+        os.makedirs(csv_dir)
+        tables.append((table_name, csv_dir))
+
+    if concurrent:
+        return ingest_all(db_path=db_path, tables=tables, base_url=base_url, update_moments=False)
+
+    # Baseline: the serial updater (one ticker at a time, sleep(0.2) between pages)
+    data_update.ISS_BASE_URL = base_url
+    stats = IngestStats()
+    for table_name, csv_dir in tables:
+        for ticker in data_update.get_all_tickers(db_path=db_path, table_name=table_name):
+            data_update.update_data(ticker, db_path=db_path, table_name=table_name, csv_dir=csv_dir)
+    conn = sqlite3.connect(db_path)
+    stats.rows = sum(conn.execute(f"SELECT COUNT(*) - {len(TABLES[t][2])} FROM {t}").fetchone()[0] for t in TABLES)
+    conn.close()
+    return stats.summary()
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubISSHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}/iss"
+
+    with tempfile.TemporaryDirectory() as workdir:
+        serial = run(workdir, False, base_url)
+        concurrent = run(workdir, True, base_url)
+
+    server.shutdown()
+    print(f"Serial updater:      {serial['seconds']:.2f} s, {serial['rows_per_sec']:.0f} rows/s")
+    print(f"Concurrent ingestion: {concurrent['seconds']:.2f} s, {concurrent['pages_per_sec']:.1f} pages/s, "
+          f"{concurrent['rows_per_sec']:.0f} rows/s")
+    print(f"Speed-up: {serial['seconds'] / concurrent['seconds']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
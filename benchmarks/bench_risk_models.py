@@ -0,0 +1,67 @@
+# Covariance estimators on a short window of many stocks: conditioning and solve times
+# Run from the project root: python -m benchmarks.bench_risk_models
+import time
+import sqlite3
+import numpy as np
+
+from core.covariance import RISK_MODELS, factorization_cache_stats
+from core.optimizer import estimate_mu_cov, optimize_from_moments
+from utils.db import DATABASE_PATH
+
+N_TICKERS = 50
+START_DATE, END_DATE = "2023-06-01", "2024-01-01"
+OBJECTIVES = [
+    ("max_sharpe", {}),
+    ("min_volatility", {}),
+    ("efficient_risk", {"target_volatility": 0.3}),
+    ("max_quadratic_utility", {"risk_aversion": 2.0}),
+    ("min_volatility", {"short_positions": True}),
+]
+REPEATS = 3
+
+
+def pick_tickers():
+    # Stocks with the most trading days in the window
+    conn = sqlite3.connect(DATABASE_PATH)
+    rows = conn.execute("""
+        SELECT ticker FROM asset_returns WHERE tradedate BETWEEN ? AND ?
+        GROUP BY ticker ORDER BY COUNT(*) DESC, ticker LIMIT ?
+    """, (START_DATE, END_DATE, N_TICKERS)).fetchall()
+    conn.close()
+    return [row[0] for row in rows]
+
+
+def main():
+    tickers = pick_tickers()
+    print(f"{len(tickers)} tickers, {START_DATE} - {END_DATE}")
+
+    # Compiling the problems once, so that the first estimator is not charged for it
+    mu, S = estimate_mu_cov(tickers, START_DATE, END_DATE)
+    for objective, options in OBJECTIVES:
+        try:
+            optimize_from_moments(mu, S, objective=objective, **options)
+        except Exception:
+            pass
+
+    for risk_model in RISK_MODELS:
+        start = time.perf_counter()
+        mu, S = estimate_mu_cov(tickers, START_DATE, END_DATE, risk_model=risk_model)
+        estimate = time.perf_counter() - start
+
+        solve, failures = 0.0, 0
+        for objective, options in OBJECTIVES:
+            start = time.perf_counter()
+            for _ in range(REPEATS):
+                try:
+                    optimize_from_moments(mu, S, objective=objective, **options)
+                except Exception:
+                    failures += 1
+            solve += (time.perf_counter() - start) / REPEATS
+
+        print(f"{risk_model:<12} cond: {np.linalg.cond(S.values):12.1f}  estimate: {estimate * 1000:7.1f} ms  "
+              f"solves: {solve * 1000:8.1f} ms  failures: {failures // REPEATS}")
+    print("factorizations:", factorization_cache_stats())
+
+
+if __name__ == "__main__":
+    main()
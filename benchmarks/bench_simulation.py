@@ -0,0 +1,30 @@
+# Monte Carlo projection: paths x horizon, time and peak memory
+# Run from the project root: python -m benchmarks.bench_simulation
+import time
+import resource
+
+from core.simulation import simulate_portfolio
+
+WEIGHTS = {"SBER": 0.4, "LKOH": 0.3, "TATN": 0.3}
+CASES = [
+    ("parametric", 10_000, 10),
+    ("bootstrap", 10_000, 10),
+    ("parametric", 100_000, 10),
+    ("bootstrap", 100_000, 10),
+]
+
+
+def main():
+    for method, n_paths, years in CASES:
+        start = time.perf_counter()
+        result = simulate_portfolio(WEIGHTS, start_date="2012-01-01", end_date="2024-01-01", method=method,
+                                    n_paths=n_paths, horizon_years=years, seed=0)
+        elapsed = time.perf_counter() - start
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        terminal = result["terminal"]
+        print(f"{method:<11} {n_paths:7d} x {years:2d}y  {elapsed:6.2f} s  peak RSS: {peak_mb:6.0f} MB  "
+              f"median: {terminal['median']:12.0f}  CVaR {terminal['cvar_level']:.0%}: {terminal['cvar']:.3f}")
+
+
+if __name__ == "__main__":
+    main()
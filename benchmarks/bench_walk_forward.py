@@ -0,0 +1,27 @@
+# Walk-forward re-optimization on the real database
+# Run from the project root: python -m benchmarks.bench_walk_forward
+import time
+
+from core.walk_forward import walk_forward
+
+TICKERS = ["SBER", "LKOH", "GMKN", "ROSN", "NVTK", "MTSS", "MGNT", "TATN", "CHMF", "PLZL"]
+CASES = [
+    ("rolling", "monthly", 252),
+    ("rolling", "quarterly", 756),
+    ("expanding", "monthly", 252),
+]
+
+
+def main():
+    for window, rebalance, lookback in CASES:
+        start = time.perf_counter()
+        result = walk_forward(TICKERS, start_date="2010-01-01", lookback=lookback, window=window,
+                              rebalance=rebalance, commission=0.0005, objective="max_sharpe")
+        elapsed = time.perf_counter() - start
+        failed = sum("error" in entry for entry in result["rebalances"])
+        print(f"{window:<10} {rebalance:<10} {lookback:4d}  {elapsed:6.2f} s  windows: {len(result['rebalances']):4d}  "
+              f"failed: {failed:3d}  turnover: {result['turnover']:.2f}  sharpe: {result['performance']['sharpe_ratio']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
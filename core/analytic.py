@@ -0,0 +1,96 @@
+#Importing libraries
+import numpy as np
+from scipy.linalg import cho_solve
+
+from core.covariance import get_factorization
+
+# Objectives with a closed-form answer when only sum(w) = 1 is imposed
+ANALYTIC_OBJECTIVES = ("max_sharpe", "min_volatility", "efficient_return")
+
+# Weight bounds for short positions (as in EfficientFrontier)
+SHORT_WEIGHT_BOUNDS = (-2, 1)
+
+# Tolerance for checking that the unconstrained answer respects the bounds
+BOUNDS_TOLERANCE = 1e-9
+
+
+def analytic_weights(mu, S, objective, rf=0.0, target_return=None, weight_bounds=SHORT_WEIGHT_BOUNDS):
+    """
+    Веса портфеля в замкнутой форме (одно разложение Холецкого S, общее для всех целей).
+
+    Решается задача только с ограничением sum(w) = 1; если ответ выходит
+    за границы весов (ограничения активны) или задача вырождена, возвращается None,
+    и оптимизация должна выполняться солвером.
+    """
+    if objective not in ANALYTIC_OBJECTIVES:
+        return None
+
+    mu = np.asarray(mu, dtype=np.float64)
+    factor = get_factorization(S).cholesky
+    if factor is None:
+        return None
+
+    ones = np.ones(len(mu))
+    inv_ones = cho_solve(factor, ones)
+
+    if objective == "max_sharpe":
+        # Tangency portfolio: w ∝ S⁻¹(mu - rf)
+        x = cho_solve(factor, mu - rf)
+        if x.sum() <= 0:
+            return None
+        weights = x / x.sum()
+
+    elif objective == "min_volatility":
+        weights = inv_ones / inv_ones.sum()
+
+    else:
+        if target_return is None or not mu.min() <= target_return <= mu.max():
+            return None
+        weights = inv_ones / inv_ones.sum()
+
+        # The return constraint binds only above the minimum volatility portfolio
+        if weights @ mu < target_return:
+            inv_mu = cho_solve(factor, mu)
+            a, b, c = ones @ inv_ones, ones @ inv_mu, mu @ inv_mu
+            d = a * c - b * b
+            if d <= 0:
+                return None
+            weights = ((c - b * target_return) * inv_ones + (a * target_return - b) * inv_mu) / d
+
+    lower, upper = weight_bounds
+    if np.any(weights < lower - BOUNDS_TOLERANCE) or np.any(weights > upper + BOUNDS_TOLERANCE):
+        return None
+
+    return weights
+
+
+def analytic_result(mu, S, objective, rf=0.0, target_return=None, short_positions=False, l2_reg=False):
+    """
+    Результат оптимизации в формате optimizer_for_portfolio без вызова солвера.
+
+    Применяется только для коротких позиций без L2-регуляризации; None - нужен солвер.
+    """
+    if not short_positions or l2_reg:
+        return None
+
+    weights = analytic_weights(mu, S, objective, rf=rf, target_return=target_return)
+    if weights is None:
+        return None
+
+    S_values = np.asarray(S, dtype=np.float64)
+    ret = float(weights @ np.asarray(mu, dtype=np.float64))
+    vol = float(np.sqrt(weights @ S_values @ weights))
+
+    # Like EfficientFrontier, the risk-free rate enters the Sharpe ratio only for max_sharpe
+    risk_free_rate = rf if objective == "max_sharpe" else 0.0
+
+    # Rounding as in EfficientFrontier.clean_weights
+    clean = np.where(np.abs(weights) < 1e-4, 0.0, np.round(weights, 5))
+
+    return {
+        "weights_dict": {ticker: round(float(weight), 4) for ticker, weight in zip(mu.index, clean)},
+        "performance": {"return": ret,
+                        "volatility": vol,
+                        "sharpe_ratio": (ret - risk_free_rate) / vol},
+        "engine": "analytic",
+    }
@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+
+# "continuous" - constant weights without costs (the previous history), "none" - buy and hold,
+# "monthly"/"quarterly"/"annual" - calendar rebalancing, "threshold" - when a weight drifts off the band
+REBALANCE_MODES = ("continuous", "none", "monthly", "quarterly", "annual", "threshold")
+CALENDAR_PERIODS = {"monthly": "M", "quarterly": "Q", "annual": "Y"}
+DEFAULT_THRESHOLD = 0.05
+
+# Days of drifting weights checked at once while looking for a threshold breach
+# (the window doubles up to the maximum while there is no breach)
+THRESHOLD_WINDOW = 16
+THRESHOLD_MAX_WINDOW = 1024
+
+
+def get_rebalance_options(data):
+    """
+    Параметры ребалансировки из тела запроса.
+
+    Returns:
+        None или словарь {"mode", "threshold", "commission", "slippage"}.
+        None и режим "continuous" - прежняя история с постоянными весами без издержек.
+
+    Raises:
+        ValueError: неизвестный режим или отрицательные параметры.
+    """
+    mode = data.get("rebalance")
+    if mode is None:
+        return None
+    if mode not in REBALANCE_MODES:
+        raise ValueError(f"rebalance должен быть одним из: {', '.join(REBALANCE_MODES)}")
+
+    options = {
+        "mode": mode,
+        "threshold": data.get("rebalance_threshold", DEFAULT_THRESHOLD),
+        "commission": data.get("commission", 0.0),
+        "slippage": data.get("slippage", 0.0),
+    }
+    for name in ("threshold", "commission", "slippage"):
+        value = options[name]
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            raise ValueError(f"{name} должен быть неотрицательным числом")
+        options[name] = float(value)
+    if mode == "threshold" and options["threshold"] == 0:
+        raise ValueError("rebalance_threshold должен быть больше 0")
+    return options
+
+
+def calendar_rebalance_rows(dates, mode):
+    """Строки ребалансировки: последний торговый день каждого месяца, квартала или года (кроме последнего)."""
+    if mode not in CALENDAR_PERIODS or len(dates) < 2:
+        return np.array([], dtype=int)
+    periods = pd.DatetimeIndex(dates).to_period(CALENDAR_PERIODS[mode]).asi8
+    return np.flatnonzero(periods[:-1] != periods[1:])
+
+
+def backtest(prices, weights, dates, mode="monthly", threshold=DEFAULT_THRESHOLD,
+             commission=0.0, slippage=0.0, initial_value=1.0):
+    """
+    Стоимость портфеля с ребалансировкой к целевым весам и издержками.
+
+    Между ребалансировками портфель держит количества бумаг, поэтому стоимость
+    на всём отрезке - одно произведение матрицы цен на вектор количеств;
+    цикл Python идёт только по отрезкам. Издержки (commission + slippage)
+    списываются с доли оборота: V' = V * (1 - (commission + slippage) * Σ|w - w_drift|),
+    включая первоначальную покупку. Недостающая до 1 сумма весов - деньги без доходности.
+
+    Args:
+        prices: матрица T×N цен (без пропусков).
+        weights: целевые веса N.
+        dates: даты строк (для календарной ребалансировки).
+
+    Returns:
+        values: стоимость T на конец каждого дня (после ребалансировки),
+        stats: {"rebalances", "turnover", "costs"}.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    n_rows = len(prices)
+    cost_rate = commission + slippage
+    values = np.empty(n_rows)
+    stats = {"rebalances": 0, "turnover": float(np.abs(weights).sum()), "costs": 0.0}
+    if n_rows == 0:
+        return values, stats
+
+    # Initial purchase at the close of the first day
+    value = initial_value * (1 - cost_rate * np.abs(weights).sum())
+    stats["costs"] += initial_value - value
+    values[0] = value
+    units = value * weights / prices[0]
+    cash = value * (1 - weights.sum())
+
+    def rebalance_at(row, drift):
+        nonlocal units, cash
+        turnover = np.abs(weights - drift).sum()
+        before = values[row]
+        values[row] = before * (1 - cost_rate * turnover)
+        units = values[row] * weights / prices[row]
+        cash = values[row] * (1 - weights.sum())
+        stats["rebalances"] += 1
+        stats["turnover"] += float(turnover)
+        stats["costs"] += float(before - values[row])
+
+    if mode == "threshold":
+        start = 0
+        while start < n_rows - 1:
+            breach_row = None
+            lo = start + 1
+            window = THRESHOLD_WINDOW
+            while lo < n_rows and breach_row is None:
+                hi = min(n_rows, lo + window)
+                holdings = prices[lo:hi] * units
+                totals = holdings.sum(axis=1) + cash
+                values[lo:hi] = totals
+                drift = holdings / totals[:, None]
+                breach = np.abs(drift - weights).max(axis=1) > threshold
+                if breach.any():
+                    i = int(breach.argmax())
+                    breach_row = lo + i
+                    drift_at_breach = drift[i]
+                lo = hi
+                window = min(2 * window, THRESHOLD_MAX_WINDOW)
+            if breach_row is None:
+                break
+            rebalance_at(breach_row, drift_at_breach)
+            start = breach_row
+        return values, stats
+
+    # Buy and hold and calendar periods: segment ends are known in advance
+    rows = calendar_rebalance_rows(dates, mode)
+
+    bounds = np.append(rows, n_rows - 1)
+    start = 0
+    for end in bounds:
+        if end > start:
+            values[start + 1:end + 1] = prices[start + 1:end + 1] @ units + cash
+        if end < n_rows - 1:
+            rebalance_at(end, units * prices[end] / values[end])
+        start = end
+
+    return values, stats
@@ -0,0 +1,119 @@
+#Importing libraries
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from core.optimizer import estimate_mu_cov, optimize_from_moments
+
+# Number of worker processes for the solves (None - number of CPUs)
+BATCH_MAX_WORKERS = None
+
+# Batches of this size and smaller are solved in the request process
+BATCH_INLINE_LIMIT = 2
+
+# Request parameters with their defaults (the same as in /api/optimize)
+BATCH_DEFAULTS = {
+    "mode": "tickers",
+    "tickers": [],
+    "rf": 0.0,
+    "start_date": "1995-01-01",
+    "end_date": None,
+    "objective": "max_sharpe",
+    "risk_aversion": 1.0,
+    "target_volatility": None,
+    "target_return": None,
+    "short_positions": False,
+    "l2_reg": False,
+    "gamma": 1.0,
+    "frequency": 252,
+    "risk_model": "sample_cov",
+}
+
+_pool = {"executor": None}
+_pool_lock = threading.Lock()
+
+
+def get_executor():
+    """Общий пул процессов для тяжёлых вычислений (пакетные решения, симуляции)."""
+    with _pool_lock:
+        if _pool["executor"] is None:
+            _pool["executor"] = ProcessPoolExecutor(max_workers=BATCH_MAX_WORKERS or os.cpu_count())
+        return _pool["executor"]
+
+
+# Solving a single item in a worker process
+def _solve(mu, S, params):
+    return optimize_from_moments(
+        mu, S, params["rf"], params["objective"], params["risk_aversion"],
+        params["target_volatility"], params["target_return"],
+        params["short_positions"], params["l2_reg"], params["gamma"],
+    )
+
+
+def _data_key(params):
+    return (
+        params["mode"], tuple(sorted(set(params["tickers"]))),
+        params["start_date"], params["end_date"], params["frequency"], params["risk_model"],
+    )
+
+
+def optimize_batch(items, defaults=None):
+    """
+    Оптимизация набора портфелей за один запрос.
+
+    mu/S оцениваются один раз на каждую уникальную комбинацию
+    (mode, tickers, start_date, end_date, frequency, risk_model), а сами решения
+    распределяются по пулу процессов.
+
+    Args:
+        items: список наборов параметров (как в /api/optimize).
+        defaults: общие параметры, которые дополняют каждый набор.
+
+    Returns:
+        Список результатов в порядке items; для неуспешных элементов - {"error": ...}.
+    """
+    params_list = [{**BATCH_DEFAULTS, **(defaults or {}), **item} for item in items]
+
+    # Estimating mu/S once per distinct data window
+    moments = {}
+    for params in params_list:
+        key = _data_key(params)
+        if key in moments:
+            continue
+        try:
+            if not params["tickers"]:
+                raise ValueError("Список активов (tickers) обязателен")
+            moments[key] = estimate_mu_cov(
+                params["tickers"], start_date=params["start_date"],
+                end_date=params["end_date"], frequency=params["frequency"],
+                risk_model=params["risk_model"],
+            )
+        except Exception as e:
+            moments[key] = e
+
+    results = [None] * len(params_list)
+    pending = []
+    for i, params in enumerate(params_list):
+        estimate = moments[_data_key(params)]
+        if isinstance(estimate, Exception):
+            results[i] = {"error": str(estimate)}
+        else:
+            pending.append((i, estimate, params))
+
+    if len(pending) <= BATCH_INLINE_LIMIT:
+        for i, (mu, S), params in pending:
+            try:
+                results[i] = _solve(mu, S, params)
+            except Exception as e:
+                results[i] = {"error": str(e)}
+        return results
+
+    executor = get_executor()
+    futures = [(i, executor.submit(_solve, mu, S, params)) for i, (mu, S), params in pending]
+    for i, future in futures:
+        try:
+            results[i] = future.result()
+        except Exception as e:
+            results[i] = {"error": str(e)}
+
+    return results
@@ -0,0 +1,216 @@
+#Importing libraries
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from scipy.linalg import cho_factor, LinAlgError
+from pypfopt.risk_models import fix_nonpositive_semidefinite
+
+from utils.returns_store import get_simple_returns
+
+# "sample_cov" - sample covariance (as before), "ledoit_wolf"/"oas" - shrinkage to a scaled identity,
+# "exp_cov" - exponentially weighted covariance, "factor" - PCA factor model with specific risk
+RISK_MODELS = ("sample_cov", "ledoit_wolf", "oas", "exp_cov", "factor")
+DEFAULT_RISK_MODEL = "sample_cov"
+EXP_COV_SPAN = 180
+FACTOR_COUNT = 3
+
+# Factorizations kept in the process (one per distinct covariance matrix)
+FACTORIZATION_CACHE_SIZE = 256
+
+
+def check_risk_model(risk_model):
+    if risk_model not in RISK_MODELS:
+        raise ValueError(f"risk_model должен быть одним из: {', '.join(RISK_MODELS)}")
+
+
+def _shrink(emp_cov, shrinkage):
+    """(1 - δ)·S + δ·(tr S / N)·I."""
+    n_features = len(emp_cov)
+    shrunk = (1.0 - shrinkage) * emp_cov
+    shrunk.flat[::n_features + 1] += shrinkage * np.trace(emp_cov) / n_features
+    return shrunk
+
+
+def ledoit_wolf_cov(X):
+    """
+    Ковариация Ледуа-Вольфа с целью - масштабированной единичной матрицей.
+
+    Формулы sklearn.covariance.ledoit_wolf (на котором основан pypfopt
+    CovarianceShrinkage.ledoit_wolf); пропуски, как в pypfopt, заменяются нулями.
+    """
+    X = np.nan_to_num(np.asarray(X, dtype=np.float64))
+    X = X - X.mean(axis=0)
+    n_samples, n_features = X.shape
+    emp_cov = X.T @ X / n_samples
+
+    X2 = X ** 2
+    emp_cov_trace = X2.sum(axis=0) / n_samples
+    mu = emp_cov_trace.sum() / n_features
+    beta_ = np.sum(X2.T @ X2)
+    delta_ = np.sum(emp_cov ** 2)
+    beta = (beta_ / n_samples - delta_) / (n_features * n_samples)
+    delta = (delta_ - 2.0 * mu * emp_cov_trace.sum() + n_features * mu ** 2) / n_features
+    beta = min(beta, delta)
+    shrinkage = 0.0 if beta == 0 else beta / delta
+    return _shrink(emp_cov, shrinkage)
+
+
+def oas_cov(X):
+    """Ковариация Oracle Approximating Shrinkage (формулы sklearn.covariance.oas)."""
+    X = np.nan_to_num(np.asarray(X, dtype=np.float64))
+    X = X - X.mean(axis=0)
+    n_samples, n_features = X.shape
+    emp_cov = X.T @ X / n_samples
+
+    alpha = np.mean(emp_cov ** 2)
+    mu = np.trace(emp_cov) / n_features
+    mu_squared = mu ** 2
+    numerator = alpha + mu_squared
+    denominator = (n_samples + 1) * (alpha - mu_squared / n_features)
+    shrinkage = 1.0 if denominator == 0 else min(numerator / denominator, 1.0)
+    return _shrink(emp_cov, shrinkage)
+
+
+def exp_cov(X, span=EXP_COV_SPAN):
+    """
+    Экспоненциально взвешенная ковариация (как pypfopt.risk_models.exp_cov).
+
+    Вместо попарного цикла по ewm для каждой пары бумаг - два произведения
+    матриц: взвешенные суммы произведений отклонений и суммы весов дат,
+    где есть доходности обеих бумаг.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    present = ~np.isnan(X)
+    centered = np.where(present, X - np.nanmean(X, axis=0), 0.0)
+
+    alpha = 2.0 / (span + 1.0)
+    weights = (1.0 - alpha) ** np.arange(len(X) - 1, -1, -1, dtype=np.float64)
+    weighted = centered * weights[:, None]
+    mask = present.astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (weighted.T @ centered) / ((mask * weights[:, None]).T @ mask)
+
+
+def factor_cov(S, n_factors=FACTOR_COUNT):
+    """
+    Факторная модель главных компонент: S ≈ B·Bᵀ + D.
+
+    B - первые n_factors собственных векторов S, масштабированные корнями
+    собственных значений, D - диагональ остаточных (специфических) дисперсий.
+    Шум в малых собственных значениях отбрасывается, и матрица хорошо обусловлена.
+    """
+    S = np.asarray(S, dtype=np.float64)
+    n_features = len(S)
+    if n_features <= n_factors:
+        return S
+
+    values, vectors = np.linalg.eigh((S + S.T) / 2)
+    top = np.argsort(values)[::-1][:n_factors]
+    B = vectors[:, top] * np.sqrt(np.clip(values[top], 0, None))
+    common = B @ B.T
+    floor = 1e-8 * np.trace(S) / n_features
+    specific = np.maximum(np.diag(S) - np.diag(common), floor)
+    return common + np.diag(specific)
+
+
+def estimate_cov(risk_model, S, start_date=None, end_date=None, frequency=252):
+    """
+    Ковариация выбранной модели риска для тикеров S.index за окно.
+
+    Args:
+        S: выборочная годовая ковариация окна (из хранилища моментов).
+
+    Returns:
+        DataFrame годовой ковариации с теми же тикерами, что и S.
+    """
+    check_risk_model(risk_model)
+    if risk_model == "sample_cov":
+        return S
+
+    tickers = list(S.index)
+    if risk_model == "factor":
+        cov = factor_cov(S.to_numpy(dtype=np.float64))
+    else:
+        # Shrinkage and weighting need the returns themselves (shared matrix / returns store)
+        returns = get_simple_returns(tickers, start_date=start_date, end_date=end_date, frequency=frequency)
+        X = returns.reindex(columns=tickers).to_numpy(dtype=np.float64)
+        if risk_model == "ledoit_wolf":
+            cov = ledoit_wolf_cov(X)
+        elif risk_model == "oas":
+            cov = oas_cov(X)
+        else:
+            cov = exp_cov(X)
+        cov = cov * frequency
+
+    cov = pd.DataFrame(cov, index=tickers, columns=tickers)
+    return fix_nonpositive_semidefinite(cov, fix_method="spectral")
+
+
+class Factorization:
+    """
+    Разложения одной ковариационной матрицы, общие для всех целей оптимизации.
+
+    cholesky - для аналитических формул (cho_solve), factor - F с S = F·Fᵀ
+    для скомпилированных задач, min_volatility - волатильность портфеля
+    минимального риска без ограничений (проверка target_volatility).
+    """
+
+    def __init__(self, S):
+        try:
+            self.cholesky = cho_factor(S)
+        except LinAlgError:
+            self.cholesky = None
+
+        try:
+            self.factor = np.linalg.cholesky(S)
+        except np.linalg.LinAlgError:
+            q, V = np.linalg.eigh(S)
+            self.factor = V * np.sqrt(np.clip(q, 0, None))
+
+        self._S = S
+        self._min_volatility = None
+
+    @property
+    def min_volatility(self):
+        if self._min_volatility is None:
+            self._min_volatility = np.sqrt(1 / np.sum(np.linalg.pinv(self._S)))
+        return self._min_volatility
+
+
+_factorizations = OrderedDict()
+_factorizations_lock = threading.Lock()
+_factorization_stats = {"hits": 0, "misses": 0}
+
+
+def get_factorization(S):
+    """
+    Разложения (симметризованной) матрицы S из кэша процесса.
+
+    Ключ - хэш содержимого S, поэтому разложение одного окна переиспользуется
+    всеми целями оптимизации и повторными запросами (в том числе в воркерах пула).
+    """
+    S = np.asarray(S, dtype=np.float64)
+    S = np.ascontiguousarray((S + S.T) / 2)
+    key = (S.shape, hashlib.sha1(S.tobytes()).hexdigest())
+    with _factorizations_lock:
+        factorization = _factorizations.get(key)
+        if factorization is not None:
+            _factorizations.move_to_end(key)
+            _factorization_stats["hits"] += 1
+            return factorization
+        _factorization_stats["misses"] += 1
+
+    factorization = Factorization(S)
+    with _factorizations_lock:
+        _factorizations[key] = factorization
+        while len(_factorizations) > FACTORIZATION_CACHE_SIZE:
+            _factorizations.popitem(last=False)
+    return factorization
+
+
+def factorization_cache_stats():
+    with _factorizations_lock:
+        return {"entries": len(_factorizations), "max_entries": FACTORIZATION_CACHE_SIZE, **_factorization_stats}
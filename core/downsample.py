@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+# Period aggregation (last trading day of the period): weekly and monthly
+RESAMPLE_RULES = {"W": "W", "M": "M"}
+MIN_POINTS = 3
+
+
+def lttb_indices(x, y, max_points):
+    """
+    Largest-Triangle-Three-Buckets: индексы точек, сохраняющих форму ряда.
+
+    Первая и последняя точки сохраняются, остальные делятся на max_points - 2
+    корзин; из каждой выбирается точка, образующая наибольший треугольник с
+    уже выбранной точкой и средним следующей корзины.
+    """
+    n = len(y)
+    if max_points >= n or max_points < MIN_POINTS:
+        return np.arange(n)
+
+    edges = np.floor(np.linspace(1, n - 1, max_points - 1)).astype(int)
+    selected = np.empty(max_points, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+
+    a = 0
+    for i in range(max_points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (the last point for the last bucket)
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return selected
+
+
+def downsample_history(df, max_points=None, resample=None):
+    """
+    Прореживание истории (tradedate, portfolio_value) для графика.
+
+    Сначала агрегация по периодам (последнее значение недели/месяца), затем,
+    если точек больше max_points, отбор LTTB. Метрики считаются по полной
+    истории до вызова этой функции.
+    """
+    if df.empty or (max_points is None and resample is None):
+        return df
+
+    if resample is not None:
+        # The last row of every period keeps its real trading date
+        periods = pd.DatetimeIndex(df["tradedate"]).to_period(RESAMPLE_RULES[resample])
+        df = df.groupby(np.asarray(periods), sort=False).tail(1).reset_index(drop=True)
+
+    if max_points is not None and len(df) > max_points:
+        x = pd.DatetimeIndex(df["tradedate"]).asi8.astype(np.float64)
+        y = df["portfolio_value"].to_numpy(dtype=np.float64)
+        df = df.iloc[lttb_indices(x, y, max_points)].reset_index(drop=True)
+
+    return df
+
+
+def get_downsample_options(data):
+    """
+    Параметры прореживания из тела запроса: max_points и resample.
+
+    Raises:
+        ValueError: неверное значение max_points или resample.
+    """
+    max_points = data.get("max_points")
+    resample = data.get("resample")
+
+    if max_points is not None:
+        if isinstance(max_points, bool) or not isinstance(max_points, int) or max_points < MIN_POINTS:
+            raise ValueError(f"max_points должен быть целым числом не меньше {MIN_POINTS}")
+    if resample is not None and resample not in RESAMPLE_RULES:
+        raise ValueError(f"resample должен быть одним из: {', '.join(RESAMPLE_RULES)}")
+
+    return max_points, resample
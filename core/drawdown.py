@@ -0,0 +1,152 @@
+#Importing libraries
+import numpy as np
+import pandas as pd
+
+# Number of the deepest episodes returned by the endpoints
+DEFAULT_MAX_EPISODES = 10
+
+
+def _episodes(drawdown):
+    """
+    Эпизоды просадки одной траектории (без пропусков).
+
+    Эпизод начинается на последнем максимуме перед падением и заканчивается
+    на первой дате, где стоимость снова не ниже этого максимума.
+    """
+    under = drawdown < 0
+    change = np.diff(np.concatenate(([0], under.astype(np.int8), [0])))
+    starts = np.flatnonzero(change == 1)
+    ends = np.flatnonzero(change == -1)
+
+    if len(starts) == 0:
+        return starts, starts, starts
+
+    # Trough of every episode: sort by (episode, depth, position) and take the first row of each group
+    lengths = ends - starts
+    under_rows = np.flatnonzero(under)
+    episode = np.repeat(np.arange(len(starts)), lengths)
+    order = np.lexsort((under_rows, drawdown[under_rows], episode))
+    troughs = under_rows[order[np.concatenate(([0], np.cumsum(lengths)[:-1]))]]
+
+    # Episode starts at the previous peak; ends == len(dates) means it is not recovered yet
+    return starts - 1, troughs, ends
+
+
+def drawdown_analytics_batch(dates, values, max_episodes=None):
+    """
+    Аналитика просадок для каждой траектории матрицы T×K за один проход.
+
+    Args:
+        dates: DatetimeIndex длины T.
+        values: матрица T×K стоимостей (NaN - дата не входит в историю траектории).
+        max_episodes: сколько самых глубоких эпизодов возвращать (None - все).
+
+    Returns:
+        Список словарей (None для траекторий без данных):
+        max_drawdown, max_drawdown_date, recovery_date, recovery_days,
+        drawdown_start_date, time_under_water, max_underwater_days,
+        ulcer_index, drawdown_episodes.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return [None] * values.shape[1]
+
+    present = ~np.isnan(values)
+
+    # Накопительный максимум и просадка для всех траекторий (пропуски не влияют на peak)
+    peak = np.maximum.accumulate(np.where(present, values, -np.inf), axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        drawdown = np.where(present, (values - peak) / peak, np.nan)
+
+    counts = present.sum(axis=0)
+    with np.errstate(invalid='ignore'):
+        ulcer_index = np.sqrt(np.nansum(drawdown ** 2, axis=0) / counts)
+        time_under_water = (drawdown < 0).sum(axis=0) / counts
+
+    results = []
+    for k in range(values.shape[1]):
+        if counts[k] == 0:
+            results.append(None)
+            continue
+
+        rows = present[:, k]
+        series_dates = dates[rows]
+        series_dd = drawdown[rows, k]
+        peaks, troughs, ends = _episodes(series_dd)
+        last = len(series_dd)
+
+        # Episode durations in days (not recovered - up to the last date)
+        end_dates = series_dates[np.minimum(ends, last - 1)]
+        durations = (end_dates - series_dates[peaks]).days if len(peaks) else np.array([], dtype=int)
+
+        if len(troughs):
+            deepest = int(np.argmin(series_dd[troughs]))
+            start_row, trough_row, end_row = peaks[deepest], troughs[deepest], ends[deepest]
+        else:
+            # No drawdown: the next date already restores the (only) peak
+            start_row, trough_row, end_row = 0, 0, 1
+
+        max_dd_date = series_dates[trough_row]
+        if end_row < last:
+            recovery_date = series_dates[end_row]
+            recovery_days = (recovery_date - max_dd_date).days
+        else:
+            recovery_date = "Not Available"
+            recovery_days = "Not Available"
+
+        # Самые глубокие эпизоды в хронологическом порядке
+        selected = np.arange(len(troughs))
+        if max_episodes is not None and len(selected) > max_episodes:
+            selected = np.sort(np.argsort(series_dd[troughs], kind='stable')[:max_episodes])
+
+        episodes = []
+        for i in selected:
+            recovered = ends[i] < last
+            episodes.append({
+                "start_date": series_dates[peaks[i]],
+                "trough_date": series_dates[troughs[i]],
+                "recovery_date": series_dates[ends[i]] if recovered else "Not Available",
+                "depth": float(-series_dd[troughs[i]]),
+                "duration_days": int(durations[i]),
+                "recovered": bool(recovered),
+            })
+
+        results.append({
+            "max_drawdown": abs(series_dd[trough_row]),
+            "max_drawdown_date": max_dd_date,
+            "recovery_date": recovery_date,
+            "recovery_days": recovery_days,
+            "drawdown_start_date": series_dates[start_row],
+            "time_under_water": float(time_under_water[k]),
+            "max_underwater_days": int(durations.max()) if len(durations) else 0,
+            "ulcer_index": float(ulcer_index[k]),
+            "drawdown_episodes": episodes,
+        })
+
+    return results
+
+
+def drawdown_analytics(portfolio_history_df, max_episodes=None):
+    """
+    Аналитика просадок одной истории портфеля.
+
+    Args:
+        portfolio_history_df: DataFrame с колонками tradedate/portfolio_value (или индексом datetime).
+    """
+    df = portfolio_history_df
+    if 'tradedate' in df.columns:
+        df = df.set_index(pd.to_datetime(df['tradedate']))
+    df = df.sort_index()
+
+    return drawdown_analytics_batch(
+        pd.DatetimeIndex(df.index), df['portfolio_value'].to_numpy()[:, None], max_episodes=max_episodes
+    )[0]
+
+
+def drawdown_analytics_for_histories(history_dfs, max_episodes=None):
+    """Аналитика просадок для нескольких историй (даты выравниваются по общей оси)."""
+    dates = pd.DatetimeIndex(sorted(set().union(*(pd.to_datetime(df['tradedate']) for df in history_dfs))))
+    values = np.full((len(dates), len(history_dfs)), np.nan)
+    for k, df in enumerate(history_dfs):
+        values[dates.get_indexer(pd.to_datetime(df['tradedate'])), k] = df['portfolio_value'].to_numpy()
+    return drawdown_analytics_batch(dates, values, max_episodes=max_episodes)
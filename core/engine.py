@@ -0,0 +1,147 @@
+#Importing libraries
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import cvxpy as cp
+from pypfopt.exceptions import OptimizationError
+
+from core.covariance import get_factorization
+
+# Solver used for all objectives (as in EfficientFrontier before)
+ENGINE_SOLVER = "ECOS"
+
+# Maximal number of compiled problems kept in the process
+ENGINE_CACHE_SIZE = 128
+
+
+class CompiledProblem:
+    """
+    Параметризованная задача cvxpy для одной комбинации (N, objective, bounds, l2_reg).
+
+    mu, фактор ковариации, rf и целевые значения - параметры cvxpy, поэтому при
+    повторных вызовах пересчитываются только их значения, а канонизация задачи
+    выполняется один раз.
+    """
+
+    def __init__(self, n, objective, weight_bounds, l2_reg):
+        self.objective = objective
+        self.lock = threading.Lock()
+
+        lower, upper = weight_bounds
+        self.w = cp.Variable(n)
+        self.mu = cp.Parameter(n)
+        self.factor = cp.Parameter((n, n))
+        self.gamma = cp.Parameter(nonneg=True)
+        self.target = cp.Parameter()
+
+        risk = cp.sum_squares(self.factor.T @ self.w)
+        penalty = self.gamma * cp.sum_squares(self.w) if l2_reg else 0
+        constraints = [cp.sum(self.w) == 1, self.w >= lower, self.w <= upper]
+
+        if objective == "max_sharpe":
+            # Variable transformation w = y / k (mu here holds mu - rf)
+            self.k = cp.Variable()
+            constraints = [
+                self.mu @ self.w == 1,
+                cp.sum(self.w) == self.k,
+                self.k >= 0,
+                self.w >= lower * self.k,
+                self.w <= upper * self.k,
+            ]
+            cost = risk + penalty
+        elif objective == "min_volatility":
+            cost = risk + penalty
+        elif objective == "max_quadratic_utility":
+            # The factor is scaled by sqrt(risk_aversion / 2) when bound
+            cost = risk - self.mu @ self.w + penalty
+        elif objective == "efficient_risk":
+            constraints.append(risk <= self.target)
+            cost = -self.mu @ self.w + penalty
+        elif objective == "efficient_return":
+            constraints.append(self.mu @ self.w >= self.target)
+            cost = risk + penalty
+        else:
+            raise ValueError(f"Неизвестный метод оптимизации: {objective}")
+
+        self.problem = cp.Problem(cp.Minimize(cost), constraints)
+
+    def solve(self, mu, factor, gamma=1.0, target=None):
+        with self.lock:
+            self.mu.value = mu
+            self.factor.value = factor
+            self.gamma.value = gamma
+            self.target.value = 0.0 if target is None else target
+            self.problem.solve(solver=ENGINE_SOLVER)
+
+            if self.problem.status not in {"optimal", "optimal_inaccurate"}:
+                raise OptimizationError(f"Solver status: {self.problem.status}")
+
+            weights = self.w.value
+            if self.objective == "max_sharpe":
+                weights = weights / self.k.value
+            return weights.round(16) + 0.0
+
+
+_compiled = OrderedDict()
+_compiled_lock = threading.Lock()
+
+
+def get_compiled_problem(n, objective, weight_bounds, l2_reg):
+    key = (n, objective, tuple(weight_bounds), bool(l2_reg))
+    with _compiled_lock:
+        problem = _compiled.get(key)
+        if problem is None:
+            problem = CompiledProblem(n, objective, weight_bounds, l2_reg)
+            _compiled[key] = problem
+            while len(_compiled) > ENGINE_CACHE_SIZE:
+                _compiled.popitem(last=False)
+        _compiled.move_to_end(key)
+        return problem
+
+
+def solve_weights(mu, S, objective, weight_bounds=(0, 1), rf=0.0, risk_aversion=1.0,
+                  target_volatility=None, target_return=None, l2_reg=False, gamma=1):
+    """
+    Оптимальные веса для заданных mu (вектор) и S (матрица) через кэш скомпилированных задач.
+
+    Проверки и сообщения об ошибках повторяют EfficientFrontier.
+    """
+    mu = np.asarray(mu, dtype=np.float64)
+    S = np.asarray(S, dtype=np.float64)
+
+    # Factor F with S = F·Fᵀ (portfolio variance is ||Fᵀw||²), shared by all objectives of the window
+    factorization = get_factorization(S)
+    factor = factorization.factor
+    target = None
+
+    if objective == "max_sharpe":
+        if max(mu) <= rf:
+            raise ValueError(
+                "at least one of the assets must have an expected return exceeding the risk-free rate"
+            )
+        mu = mu - rf
+    elif objective == "max_quadratic_utility":
+        if risk_aversion <= 0:
+            raise ValueError("risk aversion coefficient must be greater than zero")
+        factor = factor * np.sqrt(risk_aversion / 2)
+    elif objective == "efficient_risk":
+        if target_volatility is None:
+            raise ValueError("Для 'efficient_risk' необходимо указать target_volatility.")
+        if target_volatility < 0:
+            raise ValueError("target_volatility should be a positive float")
+        global_min_volatility = factorization.min_volatility
+        if target_volatility < global_min_volatility:
+            raise ValueError(
+                "The minimum volatility is {:.3f}. Please use a higher target_volatility".format(
+                    global_min_volatility
+                )
+            )
+        target = target_volatility ** 2
+    elif objective == "efficient_return":
+        if target_return is None:
+            raise ValueError("Для 'efficient_return' необходимо указать target_return.")
+        target = target_return
+
+    problem = get_compiled_problem(len(mu), objective, weight_bounds, l2_reg)
+    return problem.solve(mu, factor, gamma=gamma, target=target)
@@ -0,0 +1,73 @@
+#Importing libraries
+import numpy as np
+import cvxpy as cp
+
+from core.optimizer import estimate_mu_cov
+from core.covariance import DEFAULT_RISK_MODEL
+
+# Solver settings for the parametric sweep (OSQP supports warm starts)
+FRONTIER_SOLVER = "OSQP"
+FRONTIER_SOLVER_OPTIONS = {"eps_abs": 1e-9, "eps_rel": 1e-9, "max_iter": 100000}
+
+
+def compute_frontier(mu, S, n_points=50, short_positions=False, rf=0.0):
+    """
+    Эффективная граница для заданных mu и S.
+
+    Задача min wᵀSw при sum(w) = 1, границах весов и wᵀmu >= target
+    компилируется один раз, а для каждой точки меняется только параметр target;
+    каждое решение стартует с решения предыдущей точки (warm start).
+
+    Returns:
+        Список точек от портфеля минимальной волатильности до портфеля
+        максимальной доходности: weights_dict, return, volatility, sharpe_ratio.
+    """
+    tickers = list(mu.index)
+    mu_values = mu.values
+    S_values = (S.values + S.values.T) / 2
+    lower, upper = (-2, 1) if short_positions else (0, 1)
+
+    w = cp.Variable(len(tickers))
+    target = cp.Parameter()
+    constraints = [cp.sum(w) == 1, w >= lower, w <= upper]
+
+    # Maximal attainable return within the bounds (LP, solved once)
+    max_problem = cp.Problem(cp.Maximize(mu_values @ w), constraints)
+    max_problem.solve()
+    max_return = max_problem.value
+
+    # Parametric problem for all points of the frontier
+    problem = cp.Problem(cp.Minimize(cp.quad_form(w, S_values)), constraints + [mu_values @ w >= target])
+
+    # The return constraint is inactive at the minimum volatility portfolio
+    target.value = float(mu_values.min()) - 1.0
+    problem.solve(solver=FRONTIER_SOLVER, **FRONTIER_SOLVER_OPTIONS)
+    min_return = float(mu_values @ w.value)
+
+    points = []
+    for level in np.linspace(min_return, max_return, n_points):
+        target.value = float(level)
+        problem.solve(solver=FRONTIER_SOLVER, warm_start=True, **FRONTIER_SOLVER_OPTIONS)
+        if w.value is None:
+            continue
+
+        weights = w.value
+        ret = float(mu_values @ weights)
+        vol = float(np.sqrt(max(weights @ S_values @ weights, 0.0)))
+        points.append({
+            "weights_dict": {ticker: round(float(weight), 4) for ticker, weight in zip(tickers, weights)},
+            "return": ret,
+            "volatility": vol,
+            "sharpe_ratio": (ret - rf) / vol if vol > 0 else None,
+        })
+
+    return points
+
+
+# Efficient frontier for a set of tickers
+def frontier_for_portfolio(tickers, rf=0.0, start_date="1995-01-01", end_date=None,
+              n_points=50, short_positions=False, frequency=252, risk_model=DEFAULT_RISK_MODEL):
+
+    mu, S = estimate_mu_cov(tickers, start_date=start_date, end_date=end_date, frequency=frequency,
+                            risk_model=risk_model)
+    return compute_frontier(mu, S, n_points=n_points, short_positions=short_positions, rf=rf)
@@ -1,7 +1,9 @@
 import sqlite3
 import pandas as pd
 import numpy as np
-from utils.get_prices_sql import get_prices_orm
+from utils.returns_store import get_log_close_panel
+from core.drawdown import drawdown_analytics
+from core.backtest import backtest
 
 #The function makes the appropriate queries to the correct tables depending on the asset type
 def get_asset_data(tickers, start_date, end_date, asset_type):
@@ -48,49 +50,8 @@ def calculate_max_drawdown_and_recovery(portfolio_history_df):
         max_dd_period: кортеж (дата максимальной просадки, дата восстановления)
         recovery_days: количество дней, потребовавшихся на восстановление
     """
-
-    df = portfolio_history_df.copy()
-
-    if 'tradedate' in df.columns:
-        df['tradedate'] = pd.to_datetime(df['tradedate'])
-        df.set_index('tradedate', inplace=True)
-
-    df.sort_index(inplace=True)
-
-
-    
-    # Вычисляем накопительный максимум (peak)
-    df['peak'] = df['portfolio_value'].cummax()
-    
-    # Вычисляем просадку
-    df['drawdown'] = (df['portfolio_value'] - df['peak']) / df['peak']
-    
-    # Находим индекс максимальной просадки
-    max_dd_idx = df['drawdown'].idxmin()
-    max_dd = abs(df.loc[max_dd_idx, 'drawdown'])  # Просадка в процентах (положительное значение)
-    
-    # Дата максимальной просадки
-    max_dd_date = max_dd_idx  # Дата из datetime индекса
-    
-    # Дата восстановления (первая дата после max_dd_date, где стоимость >= peak)
-    recovery_df = df[df.index > max_dd_date]  # Учитываем только даты после максимальной просадки
-    recovery_date = recovery_df[recovery_df['portfolio_value'] >= df.loc[max_dd_idx, 'peak']].index.min()
-
-    # Количество дней на восстановление
-    if pd.notna(recovery_date) and recovery_date > max_dd_date:  # Проверяем, что recovery_date существует и позже max_dd_date
-        recovery_days = (recovery_date - max_dd_date).days
-    else:
-        recovery_days = None  # Если восстановление не произошло, возвращаем None
-
-    # Возвращаем None как null или строку "Not Available", если необходимо
-    if recovery_days is None:
-        recovery_days = "Not Available"  # Или просто recovery_days = None, если хотите возвращать null
-
-    # Если recovery_date None, то можно также вернуть строку вместо NaT
-    if pd.isna(recovery_date):
-        recovery_date = "Not Available"  # Можно использовать "Not Available" или просто None
-
-    return max_dd, (max_dd_date, recovery_date), recovery_days
+    analytics = drawdown_analytics(portfolio_history_df, max_episodes=0)
+    return analytics["max_drawdown"], (analytics["max_drawdown_date"], analytics["recovery_date"]), analytics["recovery_days"]
 
 #Creating an investment portfolio history
 # def get_portfolio_history(weights_dict, start_date, end_date, initial_portfolio_value=1000000, mode='tickers', frequency=252):
@@ -183,53 +144,124 @@ def calculate_max_drawdown_and_recovery(portfolio_history_df):
 #     # Returns df and message
 #     return result_df.reset_index(), message
 
-#Creating an investment portfolio history
-def get_portfolio_history(weights_dict, start_date, end_date, initial_portfolio_value=1000000, mode='tickers', frequency=252):
-    
-    item_list = []
-    date_ranges = {}
+# Value paths of K portfolios over a shared matrix of log prices
+def get_portfolio_paths(weights_list, start_date, end_date, initial_portfolio_value=1000000, frequency=252,
+                        rebalance=None):
+    """
+    Стоимость K портфелей по общей панели цен.
 
-    # Formation of a list of tickers from a dictionary, depending on the type of optimization
-    for item in weights_dict:
-        item_list.append(item)
-    
-    price_pivot = get_prices_orm(item_list, start_date=start_date, end_date=end_date, frequency= frequency, mode=mode)
+    Веса собираются в матрицу K×N, и все траектории считаются одним
+    умножением матриц: сумма лог-доходностей портфеля с первой даты равна
+    (log P(t) - log P(t0))·w, где t0 - первая дата, когда торгуются все его бумаги.
+    Для каждого портфеля учитываются только даты, когда есть цены всех его бумаг
+    (как dropna(how='any') для одного портфеля).
 
-    # Calculating returns
-    price_pivot = price_pivot.replace(0, method='ffill')
-    price_pivot = price_pivot.replace(0, method='bfill') #!!!!
-    price_pivot = price_pivot.dropna(how='any')
+    С rebalance (см. core.backtest.get_rebalance_options) стоимость каждого
+    портфеля считается бэктестом: покупка и удержание, календарная или
+    пороговая ребалансировка с издержками.
 
-    returns = np.log(price_pivot / price_pivot.shift(1)).dropna()
+    Returns:
+        dates: DatetimeIndex общей панели
+        values: матрица T×K стоимостей (NaN - дата не входит в историю портфеля)
+        first_dates, last_dates: границы периода, в котором торгуются все бумаги портфеля (None - нет данных)
+    """
+    tickers = list(dict.fromkeys(ticker for weights in weights_list for ticker in weights))
+    position = {ticker: i for i, ticker in enumerate(tickers)}
 
-    # Applying weights
-    weighted_returns = pd.DataFrame()
-    for col in returns.columns:
-        if col in weights_dict:
-            weighted_returns[col] = returns[col] * weights_dict[col]
-    
-    # Sum of total portfolio return by dates
-    portfolio_return = weighted_returns.sum(axis=1)
-    
-    # Calculating the value of the portfolio
-    portfolio_value = initial_portfolio_value * np.exp(portfolio_return.cumsum())
-    result_df = pd.DataFrame({'portfolio_value': portfolio_value})
- 
-    # Define a date range for a message
-    for ticker in weights_dict:
-        ticker_data = price_pivot[ticker].dropna()
-        if not ticker_data.empty:
-            date_ranges[ticker] = (ticker_data.index.min().date(), ticker_data.index.max().date())
-    
-    if date_ranges:
-        min_date = max(start for start, _ in date_ranges.values())
-        max_date = min(end for _, end in date_ranges.values())
-        message = (
-            f"История портфеля отображается с {min_date} по {max_date}, "
-            f"так как некоторые бумаги имеют ограниченные данные."
-        )
+    # Log prices are already cleaned of zeros (ffill/bfill) in the returns store
+    price_pivot = get_log_close_panel(tickers, start_date=start_date, end_date=end_date, frequency=frequency)
+    price_pivot = price_pivot.reindex(columns=tickers)
+
+    if price_pivot.empty:
+        no_dates = [None] * len(weights_list)
+        return pd.DatetimeIndex([], name='tradedate'), np.empty((0, len(weights_list))), no_dates, no_dates
+
+    log_prices = price_pivot.to_numpy(dtype=np.float64)
+    present = ~np.isnan(log_prices)
+
+    # K×N weights and membership (a zero weight still requires prices of the asset)
+    weights = np.zeros((len(weights_list), len(tickers)))
+    members = np.zeros((len(weights_list), len(tickers)))
+    for k, weights_dict in enumerate(weights_list):
+        for ticker, weight in weights_dict.items():
+            weights[k, position[ticker]] = weight
+            members[k, position[ticker]] = 1
+
+    # Dates on which all assets of a portfolio are traded
+    valid = (present @ members.T) == members.sum(axis=1)
+    has_data = valid.any(axis=0)
+    first = valid.argmax(axis=0)
+    last = len(valid) - 1 - valid[::-1].argmax(axis=0)
+
+    columns = np.arange(len(weights_list))
+    if rebalance is None or rebalance["mode"] == "continuous":
+        # All K paths with one matrix multiply
+        log_growth = np.where(present, log_prices, 0.0) @ weights.T
+        log_growth = log_growth - log_growth[first, columns]
+        values = np.where(valid, initial_portfolio_value * np.exp(log_growth), np.nan)
     else:
-        message = "Нет данных по выбранным бумагам."
-    
-    # Returns df and message
-    return result_df.reset_index(), message
+        values = np.full(valid.shape, np.nan)
+        for k in columns[has_data]:
+            rows = np.flatnonzero(valid[:, k])
+            assets = np.flatnonzero(members[k])
+            # Prices relative to the first date (log prices are cleaned of zeros)
+            prices = np.exp(log_prices[np.ix_(rows, assets)] - log_prices[rows[0], assets])
+            values[rows, k], _ = backtest(
+                prices, weights[k, assets], price_pivot.index[rows],
+                mode=rebalance["mode"], threshold=rebalance["threshold"],
+                commission=rebalance["commission"], slippage=rebalance["slippage"],
+                initial_value=initial_portfolio_value,
+            )
+
+    # The first date has no return (like diff().dropna())
+    values[first[has_data], columns[has_data]] = np.nan
+
+    dates = price_pivot.index
+    first_dates = [dates[i].date() if ok else None for i, ok in zip(first, has_data)]
+    last_dates = [dates[i].date() if ok else None for i, ok in zip(last, has_data)]
+    return dates, values, first_dates, last_dates
+
+
+# DataFrames and messages for the columns of a value matrix
+def get_history_frames(dates, values, first_dates, last_dates):
+    histories = []
+    for k in range(values.shape[1]):
+        rows = ~np.isnan(values[:, k])
+        result_df = pd.DataFrame({'portfolio_value': values[rows, k]}, index=dates[rows])
+
+        # Define a date range for a message
+        if first_dates[k] is not None:
+            message = (
+                f"История портфеля отображается с {first_dates[k]} по {last_dates[k]}, "
+                f"так как некоторые бумаги имеют ограниченные данные."
+            )
+        else:
+            message = "Нет данных по выбранным бумагам."
+
+        histories.append((result_df.reset_index(), message))
+
+    return histories
+
+
+# Histories of several portfolios from one read of the prices
+def get_portfolios_history(weights_list, start_date, end_date, initial_portfolio_value=1000000, mode='tickers', frequency=252,
+                           rebalance=None):
+    """
+    История нескольких портфелей за один проход.
+
+    Returns:
+        Список кортежей (DataFrame tradedate/portfolio_value, сообщение) в порядке weights_list.
+    """
+    return get_history_frames(*get_portfolio_paths(
+        weights_list, start_date, end_date,
+        initial_portfolio_value=initial_portfolio_value, frequency=frequency, rebalance=rebalance
+    ))
+
+
+#Creating an investment portfolio history
+def get_portfolio_history(weights_dict, start_date, end_date, initial_portfolio_value=1000000, mode='tickers', frequency=252,
+                          rebalance=None):
+    return get_portfolios_history(
+        [weights_dict], start_date, end_date,
+        initial_portfolio_value=initial_portfolio_value, mode=mode, frequency=frequency, rebalance=rebalance
+    )[0]
@@ -3,100 +3,42 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 
-from utils.get_prices_sql import get_stock_prices_sql, get_assets_prices_sql, get_prices_orm
-from pypfopt import expected_returns, risk_models, EfficientFrontier, objective_functions
+from utils.returns_store import get_simple_returns
+from utils.moment_store import get_moment_store
+from core.analytic import analytic_result, SHORT_WEIGHT_BOUNDS
+from core.engine import solve_weights
+from core.covariance import estimate_cov, DEFAULT_RISK_MODEL
+from pypfopt import expected_returns, risk_models
 
 import warnings
 warnings.filterwarnings('ignore')
 
 
-# Portfolio optimization function for a set of tickers
-def optimizer_for_tickers(tickers, rf=0.0, start_date="1995-01-01", end_date=None, 
-              objective="max_sharpe", risk_aversion=1.0, 
-              target_volatility=None, target_return=None, 
-              short_positions=False, l2_reg=False, gamma=1, frequency=252):
-
-    # Getting data from the database
-    df = get_stock_prices_sql(tickers, start_date=start_date, end_date=end_date, frequency=frequency)
+# Expected returns and covariance matrix for a window
+def estimate_mu_cov(tickers, start_date=None, end_date=None, frequency=252, risk_model=DEFAULT_RISK_MODEL):
+    # Daily windows are answered from the prefix sums in O(N²)
+    store = get_moment_store() if frequency == 252 else None
+    if store is not None and store.covers(tickers, end_date):
+        mu, S = store.mean_cov(sorted(set(tickers)), start_date, end_date, frequency=frequency)
+    else:
+        # Getting returns from the store (zero prices are already cleaned)
+        returns = get_simple_returns(tickers, start_date=start_date, end_date=end_date, frequency=frequency)
+        mu = expected_returns.mean_historical_return(returns, returns_data=True, frequency=frequency)
+        S = risk_models.sample_cov(returns, returns_data=True, frequency=frequency)
 
-    # Ожидаемые доходности и ковариационная матрица
-    mu = expected_returns.mean_historical_return(df, frequency=frequency)
-    S = risk_models.sample_cov(df, frequency=frequency)
+    # Shrinkage, exponential weighting or a factor model instead of the sample covariance
+    return mu, estimate_cov(risk_model, S, start_date=start_date, end_date=end_date, frequency=frequency)
 
-    # Создание объекта EfficientFrontier для оптимизации с возможностью шортов
-    ef = EfficientFrontier(mu, S, weight_bounds=(-2, 1) if short_positions else (0, 1), solver="ECOS")
 
-    # Добавляем регуляризацию L2, если включена
-    if l2_reg:
-        ef.add_objective(objective_functions.L2_reg, gamma=gamma)  # Регуляризация L2 с параметром gamma
+# Portfolio optimization for already estimated mu and S
+def optimize_from_moments(mu, S, rf=0.0, objective="max_sharpe", risk_aversion=1.0,
+              target_volatility=None, target_return=None,
+              short_positions=False, l2_reg=False, gamma=1):
 
-     # Проверка на допустимость целевой доходности для efficient_return
+    # Проверка на допустимость целевой доходности для efficient_return
     if objective == "efficient_return":
-        min_return = mu.min()  # Минимальная возможная доходность
-        max_return = mu.max()  # Максимальная возможная доходность
-        if target_return < min_return or target_return > max_return:
-            raise ValueError(f"Целевая доходность выходит за пределы допустимого диапазона: "
-                             f"Минимальная возможная доходность: {min_return:.8f}, "
-                             f"Максимальная возможная доходность: {max_return:.8f}.")
-
-    # Выбор метода оптимизации
-    if objective == "max_sharpe":
-        # Оптимизация для максимизации Sharpe Ratio
-        ef.max_sharpe(risk_free_rate=rf)
-    elif objective == "max_quadratic_utility":
-        # Оптимизация для максимизации квадратичной полезности
-        ef.max_quadratic_utility(risk_aversion=risk_aversion)
-    elif objective == "efficient_risk":
-        # Оптимизация для достижения определенного уровня риска
-        if target_volatility is None:
-            raise ValueError("Для 'efficient_risk' необходимо указать target_volatility.")
-        ef.efficient_risk(target_volatility=target_volatility)
-    elif objective == "efficient_return":
-        # Оптимизация для достижения определенного уровня доходности
         if target_return is None:
             raise ValueError("Для 'efficient_return' необходимо указать target_return.")
-        ef.efficient_return(target_return=target_return)
-    elif objective == "min_volatility":
-        ef.min_volatility()
-    else:
-        raise ValueError(f"Неизвестный метод оптимизации: {objective}")
-
-    # Получение оптимальных весов активов
-    weights = ef.clean_weights()
-
-    # Оценка производительности портфеля
-    performance = ef.portfolio_performance(verbose=True)
-
-    return {
-        "weights_dict": {ticker: round(weight, 4) for ticker, weight in weights.items()},
-        "performance": {"return": performance[0], 
-                        "volatility": performance[1], 
-                        "sharpe_ratio": performance[2]}
-    }
-
-
-# Portfolio optimization function for a set of assets
-def optimizer_for_assets(secids, rf=0.0, start_date="1995-01-01", end_date=None, 
-              objective="max_sharpe", risk_aversion=1.0, 
-              target_volatility=None, target_return=None, 
-              short_positions=False, l2_reg=False, gamma=1, frequency=252):
-
-    df = get_assets_prices_sql(secids, start_date=start_date, end_date=end_date, frequency=frequency)
-    df = df.replace(0, np.nan)  # Replace 0 values with NaN
-
-    # Ожидаемые доходности и ковариационная матрица
-    mu = expected_returns.mean_historical_return(df, frequency=frequency)
-    S = risk_models.sample_cov(df, frequency=frequency)
-
-    # Создание объекта EfficientFrontier для оптимизации с возможностью шортов
-    ef = EfficientFrontier(mu, S, weight_bounds=(-2, 1) if short_positions else (0, 1), solver="ECOS")
-
-    # Добавляем регуляризацию L2, если включена
-    if l2_reg:
-        ef.add_objective(objective_functions.L2_reg, gamma=gamma)  # Регуляризация L2 с параметром gamma
-
-     # Проверка на допустимость целевой доходности для efficient_return
-    if objective == "efficient_return":
         min_return = mu.min()  # Минимальная возможная доходность
         max_return = mu.max()  # Максимальная возможная доходность
         if target_return < min_return or target_return > max_return:
@@ -104,103 +46,50 @@ def optimizer_for_assets(secids, rf=0.0, start_date="1995-01-01", end_date=None,
                              f"Минимальная возможная доходность: {min_return:.8f}, "
                              f"Максимальная возможная доходность: {max_return:.8f}.")
 
-    # Выбор метода оптимизации
-    if objective == "max_sharpe":
-        # Оптимизация для максимизации Sharpe Ratio
-        ef.max_sharpe(risk_free_rate=rf)
-    elif objective == "max_quadratic_utility":
-        # Оптимизация для максимизации квадратичной полезности
-        ef.max_quadratic_utility(risk_aversion=risk_aversion)
-    elif objective == "efficient_risk":
-        # Оптимизация для достижения определенного уровня риска
-        if target_volatility is None:
-            raise ValueError("Для 'efficient_risk' необходимо указать target_volatility.")
-        ef.efficient_risk(target_volatility=target_volatility)
-    elif objective == "efficient_return":
-        # Оптимизация для достижения определенного уровня доходности
-        if target_return is None:
-            raise ValueError("Для 'efficient_return' необходимо указать target_return.")
-        ef.efficient_return(target_return=target_return)
-    elif objective == "min_volatility":
-        ef.min_volatility()
-    else:
-        raise ValueError(f"Неизвестный метод оптимизации: {objective}")
+    # Замкнутая форма для коротких позиций без регуляризации (солвер - если ограничения активны)
+    result = analytic_result(mu, S, objective, rf, target_return, short_positions, l2_reg)
+    if result is not None:
+        return result
 
-    # Получение оптимальных весов активов
-    weights = ef.clean_weights()
+    # Решение скомпилированной задачи (для той же размерности и цели - только новые параметры)
+    weights = solve_weights(
+        mu.values, S.values, objective,
+        weight_bounds=SHORT_WEIGHT_BOUNDS if short_positions else (0, 1),
+        rf=rf, risk_aversion=risk_aversion,
+        target_volatility=target_volatility, target_return=target_return,
+        l2_reg=l2_reg, gamma=gamma,
+    )
 
-    # Оценка производительности портфеля
-    performance = ef.portfolio_performance(verbose=True)
+    # Оценка производительности портфеля (безрисковая ставка - только для max_sharpe, как в EfficientFrontier)
+    ret = float(weights @ mu.values)
+    vol = float(np.sqrt(weights @ S.values @ weights))
+    risk_free_rate = rf if objective == "max_sharpe" else 0.0
+
+    # Округление весов как в EfficientFrontier.clean_weights
+    clean = np.where(np.abs(weights) < 1e-4, 0.0, np.round(weights, 5))
 
     return {
-        "weights_dict": {ticker: round(weight, 4) for ticker, weight in weights.items()},
-        "performance": {"return": performance[0], 
-                        "volatility": performance[1], 
-                        "sharpe_ratio": performance[2]},
+        "weights_dict": {ticker: round(float(weight), 4) for ticker, weight in zip(mu.index, clean)},
+        "performance": {"return": ret,
+                        "volatility": vol,
+                        "sharpe_ratio": (ret - risk_free_rate) / vol},
+        "engine": "solver"
     }
 
 
-# Portfolio optimization function for a set of tickers
+# Portfolio optimization function for a set of tickers or assets
 def optimizer_for_portfolio(tickers, rf=0.0, start_date="1995-01-01", end_date=None, 
               objective="max_sharpe", risk_aversion=1.0, 
               target_volatility=None, target_return=None, 
-              short_positions=False, l2_reg=False, gamma=1, frequency=252, mode='tickers'):
-
-    # Getting data from the database
-    df = get_prices_orm(tickers, start_date=start_date, end_date=end_date, frequency=frequency, mode=mode)
-    df = df.replace(0, np.nan) # For GLDRUB_TOM
-
-    # Ожидаемые доходности и ковариационная матрица
-    mu = expected_returns.mean_historical_return(df, frequency=frequency)
-    S = risk_models.sample_cov(df, frequency=frequency)
-
-    # Создание объекта EfficientFrontier для оптимизации с возможностью шортов
-    ef = EfficientFrontier(mu, S, weight_bounds=(-2, 1) if short_positions else (0, 1), solver="ECOS")
-
-    # Добавляем регуляризацию L2, если включена
-    if l2_reg:
-        ef.add_objective(objective_functions.L2_reg, gamma=gamma)  # Регуляризация L2 с параметром gamma
-
-     # Проверка на допустимость целевой доходности для efficient_return
-    if objective == "efficient_return":
-        min_return = mu.min()  # Минимальная возможная доходность
-        max_return = mu.max()  # Максимальная возможная доходность
-        if target_return < min_return or target_return > max_return:
-            raise ValueError(f"Целевая доходность выходит за пределы допустимого диапазона: "
-                             f"Минимальная возможная доходность: {min_return:.8f}, "
-                             f"Максимальная возможная доходность: {max_return:.8f}.")
-
-    # Выбор метода оптимизации
-    if objective == "max_sharpe":
-        # Оптимизация для максимизации Sharpe Ratio
-        ef.max_sharpe(risk_free_rate=rf)
-    elif objective == "max_quadratic_utility":
-        # Оптимизация для максимизации квадратичной полезности
-        ef.max_quadratic_utility(risk_aversion=risk_aversion)
-    elif objective == "efficient_risk":
-        # Оптимизация для достижения определенного уровня риска
-        if target_volatility is None:
-            raise ValueError("Для 'efficient_risk' необходимо указать target_volatility.")
-        ef.efficient_risk(target_volatility=target_volatility)
-    elif objective == "efficient_return":
-        # Оптимизация для достижения определенного уровня доходности
-        if target_return is None:
-            raise ValueError("Для 'efficient_return' необходимо указать target_return.")
-        ef.efficient_return(target_return=target_return)
-    elif objective == "min_volatility":
-        ef.min_volatility()
-    else:
-        raise ValueError(f"Неизвестный метод оптимизации: {objective}")
-
-    # Получение оптимальных весов активов
-    weights = ef.clean_weights()
-
-    # Оценка производительности портфеля
-    performance = ef.portfolio_performance(verbose=True)
-
-    return {
-        "weights_dict": {ticker: round(weight, 4) for ticker, weight in weights.items()},
-        "performance": {"return": performance[0], 
-                        "volatility": performance[1], 
-                        "sharpe_ratio": performance[2]}
-    }
\ No newline at end of file
+              short_positions=False, l2_reg=False, gamma=1, frequency=252, mode='tickers',
+              risk_model=DEFAULT_RISK_MODEL):
+
+    # Ожидаемые доходности и ковариационная матрица (акции, индексы и валюты - из одного хранилища)
+    mu, S = estimate_mu_cov(tickers, start_date=start_date, end_date=end_date, frequency=frequency,
+                            risk_model=risk_model)
+
+    return optimize_from_moments(
+        mu, S, rf, objective, risk_aversion,
+        target_volatility, target_return,
+        short_positions, l2_reg, gamma,
+    )
@@ -0,0 +1,238 @@
+#Importing libraries
+import warnings
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+# Confidence level of VaR/CVaR and the window of the rolling volatility (periods)
+DEFAULT_VAR_LEVEL = 0.95
+DEFAULT_ROLLING_WINDOW = 63
+
+
+def get_risk_options(data):
+    """
+    Параметры метрик риска из тела запроса.
+
+    Returns:
+        Словарь {"benchmark", "var_level", "rolling_window"}.
+
+    Raises:
+        ValueError: параметры вне допустимых границ.
+    """
+    benchmark = data.get("benchmark")
+    if benchmark is not None and (not isinstance(benchmark, str) or not benchmark):
+        raise ValueError("benchmark должен быть тикером")
+
+    var_level = data.get("var_level", DEFAULT_VAR_LEVEL)
+    if isinstance(var_level, bool) or not isinstance(var_level, (int, float)) or not 0 < var_level < 1:
+        raise ValueError("var_level должен быть между 0 и 1")
+
+    rolling_window = data.get("rolling_window", DEFAULT_ROLLING_WINDOW)
+    if isinstance(rolling_window, bool) or not isinstance(rolling_window, int) or rolling_window < 2:
+        raise ValueError("rolling_window должен быть целым числом не меньше 2")
+
+    return {"benchmark": benchmark, "var_level": float(var_level), "rolling_window": rolling_window}
+
+
+def _previous_rows(present):
+    """Для каждой строки и траектории - предыдущая строка с данными (-1, если её нет)."""
+    rows = np.where(present, np.arange(len(present))[:, None], -1)
+    previous = np.maximum.accumulate(rows, axis=0)
+    return np.vstack([np.full((1, present.shape[1]), -1), previous[:-1]])
+
+
+def _compact(returns, valid):
+    """Доходности каждой траектории подряд с начала матрицы (пропуски - в конце, NaN)."""
+    order = np.argsort(~valid, axis=0, kind='stable')
+    return np.take_along_axis(np.where(valid, returns, np.nan), order, axis=0)
+
+
+def _rolling_volatility(returns, valid, counts, window, frequency):
+    """Последняя, минимальная и максимальная скользящая волатильность по окну из window доходностей."""
+    compact = _compact(returns, valid)
+    filled = np.nan_to_num(compact)
+    zero = np.zeros((1, compact.shape[1]))
+    s1 = np.vstack([zero, np.cumsum(filled, axis=0)])
+    s2 = np.vstack([zero, np.cumsum(filled ** 2, axis=0)])
+
+    if len(compact) < window:
+        return [None] * compact.shape[1]
+
+    sums = s1[window:] - s1[:-window]
+    squares = s2[window:] - s2[:-window]
+    variance = np.maximum((squares - sums ** 2 / window) / (window - 1), 0.0)
+    rolling = np.sqrt(variance * frequency)
+
+    results = []
+    for k in range(compact.shape[1]):
+        n_windows = counts[k] - window + 1
+        if n_windows < 1:
+            results.append(None)
+            continue
+        series = rolling[:n_windows, k]
+        results.append({
+            "window": window,
+            "last": float(series[-1]),
+            "min": float(series.min()),
+            "max": float(series.max()),
+        })
+    return results
+
+
+def _none_if_nan(value):
+    value = float(value)
+    return None if np.isnan(value) or np.isinf(value) else value
+
+
+def risk_metrics_batch(values, benchmark=None, rf=0.0, frequency=252, var_level=DEFAULT_VAR_LEVEL,
+                       rolling_window=DEFAULT_ROLLING_WINDOW):
+    """
+    Метрики риска и доходности для каждой траектории матрицы T×K за один проход.
+
+    Доходность траектории считается от её предыдущей даты с данными, поэтому
+    пропуски (даты вне истории портфеля, разная частота) не рвут ряд. Доходности
+    бенчмарка берутся за те же промежутки, что и у портфеля, - бета и ошибка
+    слежения сопоставимы и для месячных историй против дневного бенчмарка.
+    VaR и CVaR - потери за один период (положительная доля): исторические -
+    по выборке, параметрические - по нормальному распределению.
+
+    Args:
+        values: матрица T×K стоимостей (NaN - дата не входит в историю траектории).
+        benchmark: стоимость бенчмарка T (NaN - нет данных) или None.
+        frequency: периодов в году - число или по одному на траекторию.
+
+    Returns:
+        Список словарей (None для траекторий меньше чем с двумя точками):
+        return, volatility, sharpe_ratio, cagr, sortino_ratio, calmar_ratio,
+        var_historical, cvar_historical, var_parametric, cvar_parametric, var_level,
+        rolling_volatility, а с бенчмарком - beta, correlation, tracking_error, information_ratio.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n_columns = values.shape[1]
+    frequency = np.broadcast_to(np.asarray(frequency, dtype=np.float64), (n_columns,))
+    if len(values) == 0:
+        return [None] * n_columns
+
+    present = ~np.isnan(values)
+    previous = _previous_rows(present)
+    valid = present & (previous >= 0)
+    from_rows = np.maximum(previous, 0)
+    columns = np.arange(n_columns)
+
+    # Paths without data give NaN here and None in the result
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        returns = np.where(valid, values / values[from_rows, columns] - 1.0, np.nan)
+
+        counts = valid.sum(axis=0)
+        filled = np.where(valid, returns, 0.0)
+        mean = filled.sum(axis=0) / counts
+        deviation = np.where(valid, returns - mean, 0.0)
+        std = np.sqrt((deviation ** 2).sum(axis=0) / (counts - 1))
+
+        annual_return = mean * frequency
+        volatility = std * np.sqrt(frequency)
+
+        # Downside deviation below the risk-free rate of one period
+        downside = np.where(valid, np.minimum(returns - rf / frequency, 0.0), 0.0)
+        downside_deviation = np.sqrt((downside ** 2).sum(axis=0) / counts * frequency)
+
+        # CAGR and maximum drawdown of each path
+        first_rows = present.argmax(axis=0)
+        last_rows = len(values) - 1 - present[::-1].argmax(axis=0)
+        growth = values[last_rows, columns] / values[first_rows, columns]
+        cagr = np.power(growth, frequency / counts) - 1.0
+        peak = np.fmax.accumulate(np.where(present, values, -np.inf), axis=0)
+        max_drawdown = np.nanmax(np.where(present, 1.0 - values / peak, np.nan), axis=0)
+
+        # Historical VaR/CVaR: the (1 - level) quantile and the mean of the tail beyond it
+        quantile = np.nanquantile(np.where(valid, returns, np.nan), 1.0 - var_level, axis=0)
+        tail = valid & (returns <= quantile)
+        cvar = -np.where(tail, returns, 0.0).sum(axis=0) / tail.sum(axis=0)
+
+        normal = NormalDist()
+        z = normal.inv_cdf(var_level)
+        var_parametric = -(mean - z * std)
+        cvar_parametric = -(mean - std * normal.pdf(z) / (1.0 - var_level))
+
+        if benchmark is not None:
+            benchmark = pd.Series(np.asarray(benchmark, dtype=np.float64)).ffill().to_numpy()
+            bench = benchmark[:, None] / benchmark[from_rows] - 1.0
+            paired = valid & ~np.isnan(bench)
+            pairs = paired.sum(axis=0)
+            r = np.where(paired, returns, 0.0)
+            b = np.where(paired, bench, 0.0)
+            r_mean = r.sum(axis=0) / pairs
+            b_mean = b.sum(axis=0) / pairs
+            r_dev = np.where(paired, r - r_mean, 0.0)
+            b_dev = np.where(paired, b - b_mean, 0.0)
+            covariance = (r_dev * b_dev).sum(axis=0) / (pairs - 1)
+            r_var = (r_dev ** 2).sum(axis=0) / (pairs - 1)
+            b_var = (b_dev ** 2).sum(axis=0) / (pairs - 1)
+            beta = covariance / b_var
+            correlation = covariance / np.sqrt(r_var * b_var)
+            active = np.where(paired, r - b, 0.0)
+            active_mean = active.sum(axis=0) / pairs
+            active_std = np.sqrt((np.where(paired, active - active_mean, 0.0) ** 2).sum(axis=0) / (pairs - 1))
+            tracking_error = active_std * np.sqrt(frequency)
+            information_ratio = active_mean * frequency / tracking_error
+
+    rolling = _rolling_volatility(returns, valid, counts, rolling_window, frequency)
+
+    results = []
+    for k in range(n_columns):
+        if counts[k] < 2:
+            results.append(None)
+            continue
+
+        metrics = {
+            "return": float(annual_return[k]),
+            "volatility": float(volatility[k]),
+            "sharpe_ratio": (float(annual_return[k]) - rf) / float(volatility[k]) if volatility[k] > 0 else None,
+            "cagr": _none_if_nan(cagr[k]),
+            "sortino_ratio": (
+                (float(annual_return[k]) - rf) / float(downside_deviation[k]) if downside_deviation[k] > 0 else None
+            ),
+            "calmar_ratio": float(cagr[k] / max_drawdown[k]) if max_drawdown[k] > 0 else None,
+            "var_historical": float(-quantile[k]),
+            "cvar_historical": float(cvar[k]),
+            "var_parametric": float(var_parametric[k]),
+            "cvar_parametric": float(cvar_parametric[k]),
+            "var_level": var_level,
+            "rolling_volatility": rolling[k],
+        }
+        if benchmark is not None:
+            metrics.update({
+                "beta": _none_if_nan(beta[k]) if pairs[k] > 1 else None,
+                "correlation": _none_if_nan(correlation[k]) if pairs[k] > 1 else None,
+                "tracking_error": _none_if_nan(tracking_error[k]) if pairs[k] > 1 else None,
+                "information_ratio": _none_if_nan(information_ratio[k]) if pairs[k] > 1 else None,
+            })
+        results.append(metrics)
+
+    return results
+
+
+def _history_matrix(history_dfs):
+    """Стоимости нескольких историй на общей оси дат."""
+    dates = pd.DatetimeIndex(sorted(set().union(*(pd.to_datetime(df['tradedate']) for df in history_dfs))))
+    values = np.full((len(dates), len(history_dfs)), np.nan)
+    for k, df in enumerate(history_dfs):
+        values[dates.get_indexer(pd.to_datetime(df['tradedate'])), k] = df['portfolio_value'].to_numpy()
+    return dates, values
+
+
+def risk_metrics_for_histories(history_dfs, benchmark_df=None, **options):
+    """Метрики риска для нескольких историй tradedate/portfolio_value (и бенчмарка) одним проходом."""
+    if benchmark_df is None:
+        _, values = _history_matrix(history_dfs)
+        return risk_metrics_batch(values, **options)
+
+    _, values = _history_matrix(list(history_dfs) + [benchmark_df])
+    return risk_metrics_batch(values[:, :-1], benchmark=values[:, -1], **options)
+
+
+def risk_metrics(portfolio_history_df, benchmark_df=None, **options):
+    """Метрики риска одной истории портфеля."""
+    return risk_metrics_for_histories([portfolio_history_df], benchmark_df, **options)[0]
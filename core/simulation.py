@@ -0,0 +1,292 @@
+import numpy as np
+import pandas as pd
+
+from core.optimizer import estimate_mu_cov
+from core.batch import get_executor
+from core.covariance import check_risk_model, DEFAULT_RISK_MODEL
+from utils.returns_store import get_simple_returns
+
+# "parametric" - multivariate normal daily returns from mu/S,
+# "bootstrap" - blocks of consecutive historical days (keeps volatility clustering and fat tails)
+SIMULATION_METHODS = ("parametric", "bootstrap")
+DEFAULT_PATHS = 10_000
+MAX_PATHS = 200_000
+DEFAULT_HORIZON_YEARS = 10
+MAX_HORIZON_YEARS = 50
+DEFAULT_BLOCK_SIZE = 21
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+DEFAULT_CVAR_LEVEL = 0.95
+TRADING_DAYS = 252
+
+# Fan band points per year of the horizon (monthly)
+FAN_POINTS_PER_YEAR = 12
+
+# Paths per task and random numbers generated at once inside a task:
+# the memory of a task does not depend on the number of paths or the horizon
+CHUNK_PATHS = 5_000
+CHUNK_ELEMENTS = 1_000_000
+
+
+def get_simulation_options(data):
+    """
+    Параметры симуляции из тела запроса.
+
+    Returns:
+        Словарь {"method", "n_paths", "horizon_years", "block_size",
+        "percentiles", "cvar_level", "seed", "risk_model"}.
+
+    Raises:
+        ValueError: неизвестный метод или параметры вне допустимых границ.
+    """
+    def number(name, default, integer=False):
+        value = data.get(name, default)
+        allowed = (int,) if integer else (int, float)
+        if isinstance(value, bool) or not isinstance(value, allowed):
+            raise ValueError(f"{name} должен быть {'целым ' if integer else ''}числом")
+        return value
+
+    method = data.get("method", "bootstrap")
+    if method not in SIMULATION_METHODS:
+        raise ValueError(f"method должен быть одним из: {', '.join(SIMULATION_METHODS)}")
+
+    n_paths = number("n_paths", DEFAULT_PATHS, integer=True)
+    if not 1 <= n_paths <= MAX_PATHS:
+        raise ValueError(f"n_paths должен быть от 1 до {MAX_PATHS}")
+
+    horizon_years = number("horizon_years", DEFAULT_HORIZON_YEARS)
+    if not 0 < horizon_years <= MAX_HORIZON_YEARS or round(horizon_years * TRADING_DAYS) < 1:
+        raise ValueError(f"horizon_years должен быть больше 0 и не больше {MAX_HORIZON_YEARS}")
+
+    block_size = number("block_size", DEFAULT_BLOCK_SIZE, integer=True)
+    if block_size < 1:
+        raise ValueError("block_size должен быть не меньше 1")
+
+    percentiles = data.get("percentiles", list(DEFAULT_PERCENTILES))
+    if (not isinstance(percentiles, list) or not percentiles
+            or any(isinstance(p, bool) or not isinstance(p, (int, float)) or not 0 < p < 100 for p in percentiles)):
+        raise ValueError("percentiles должен быть списком чисел от 0 до 100")
+
+    cvar_level = number("cvar_level", DEFAULT_CVAR_LEVEL)
+    if not 0 < cvar_level < 1:
+        raise ValueError("cvar_level должен быть между 0 и 1")
+
+    seed = data.get("seed")
+    if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int) or seed < 0):
+        raise ValueError("seed должен быть неотрицательным целым числом")
+
+    risk_model = data.get("risk_model", DEFAULT_RISK_MODEL)
+    check_risk_model(risk_model)
+
+    return {
+        "method": method,
+        "n_paths": n_paths,
+        "horizon_years": float(horizon_years),
+        "block_size": block_size,
+        "percentiles": sorted(set(float(p) for p in percentiles)),
+        "cvar_level": float(cvar_level),
+        "seed": seed,
+        "risk_model": risk_model,
+    }
+
+
+def _portfolio_model(weights, method, start_date=None, end_date=None, block_size=DEFAULT_BLOCK_SIZE,
+                     risk_model=DEFAULT_RISK_MODEL):
+    """
+    Модель дневной доходности портфеля с постоянными весами.
+
+    Для parametric доходности бумаг - N(m, S/252), где m подобрано так, чтобы
+    медианный рост каждой бумаги совпадал с её mu (среднегодовой рост). Линейная
+    комбинация многомерного нормального вектора нормальна, поэтому доходность
+    портфеля моделируется одномерным N(w·m, wᵀSw/252) без генерации N рядов.
+    Для bootstrap - исторические дневные доходности портфеля за период, где
+    торговались все бумаги. Недостающая до 1 сумма весов - деньги без доходности.
+    """
+    tickers = list(weights)
+    w = np.array([weights[t] for t in tickers], dtype=np.float64)
+
+    if method == "parametric":
+        mu, S = estimate_mu_cov(tickers, start_date=start_date, end_date=end_date, risk_model=risk_model)
+        mu = mu.reindex(tickers).to_numpy(dtype=np.float64)
+        S = S.reindex(index=tickers, columns=tickers).to_numpy(dtype=np.float64)
+        if np.isnan(mu).any() or np.isnan(S).any():
+            raise ValueError("Недостаточно данных для оценки mu/S по выбранным бумагам.")
+        daily_mean = np.log1p(mu) / TRADING_DAYS + np.diag(S) / (2 * TRADING_DAYS)
+        sd = float(np.sqrt(max(w @ S @ w, 0.0) / TRADING_DAYS))
+        return ("parametric", float(w @ daily_mean), sd)
+
+    returns = get_simple_returns(tickers, start_date=start_date, end_date=end_date)
+    if returns.empty:
+        raise ValueError("Нет данных по выбранным бумагам.")
+    returns = returns.reindex(columns=tickers).dropna()
+    if len(returns) < max(block_size, 2):
+        raise ValueError(
+            f"Недостаточно общей истории для bootstrap: {len(returns)} дней при block_size={block_size}."
+        )
+    return ("bootstrap", returns.to_numpy(dtype=np.float64) @ w, block_size)
+
+
+def _simulate_chunk(model, n_paths, n_steps, record_steps, seed):
+    """
+    Траектории стоимости (начальная стоимость 1) для одной части путей.
+
+    Доходности генерируются блоками по времени не больше CHUNK_ELEMENTS чисел,
+    стоимость, её максимум и максимальная просадка переносятся между блоками.
+
+    Returns:
+        points: float32 n_paths×len(record_steps) - стоимость в шагах record_steps,
+        terminal: стоимость в конце горизонта,
+        max_drawdown: максимальная просадка каждого пути (от 0 до 1).
+    """
+    rng = np.random.default_rng(seed)
+    kind = model[0]
+    if kind == "bootstrap":
+        history, block_size = model[1], model[2]
+        # Time blocks are whole multiples of the bootstrap block
+        block_steps = max(block_size, CHUNK_ELEMENTS // n_paths // block_size * block_size)
+    else:
+        mean, sd = model[1], model[2]
+        block_steps = max(1, CHUNK_ELEMENTS // n_paths)
+
+    points = np.empty((n_paths, len(record_steps)), dtype=np.float32)
+    wealth = np.ones(n_paths)
+    peak = np.ones(n_paths)
+    max_drawdown = np.zeros(n_paths)
+    record_steps = np.asarray(record_steps)
+    points[:, record_steps == 0] = 1.0
+
+    for start in range(0, n_steps, block_steps):
+        steps = min(block_steps, n_steps - start)
+        if kind == "bootstrap":
+            n_blocks = -(-steps // block_size)
+            starts = rng.integers(0, len(history) - block_size + 1, size=(n_paths, n_blocks))
+            rows = (starts[:, :, None] + np.arange(block_size)).reshape(n_paths, -1)[:, :steps]
+            returns = history[rows]
+        else:
+            returns = rng.normal(mean, sd, size=(n_paths, steps))
+            np.maximum(returns, -1.0, out=returns)
+
+        # In place: returns -> growth factors -> path of the value
+        path = returns
+        path += 1.0
+        np.cumprod(path, axis=1, out=path)
+        path *= wealth[:, None]
+        running_peak = np.maximum.accumulate(path, axis=1)
+        np.maximum(running_peak, peak[:, None], out=running_peak)
+        wealth = path[:, -1].copy()
+        peak = running_peak[:, -1].copy()
+
+        np.divide(path, running_peak, out=running_peak)
+        np.maximum(max_drawdown, 1.0 - running_peak.min(axis=1), out=max_drawdown)
+
+        # Recorded steps are counted after the step: step k is column k - 1 - start
+        inside = (record_steps > start) & (record_steps <= start + steps)
+        if inside.any():
+            points[:, inside] = path[:, record_steps[inside] - 1 - start]
+
+    return points, wealth, max_drawdown
+
+
+def _fan_steps(n_steps, horizon_years):
+    n_points = max(1, int(np.ceil(horizon_years * FAN_POINTS_PER_YEAR)))
+    return np.unique(np.round(np.linspace(0, n_steps, n_points + 1)).astype(int))
+
+
+def _tail_stats(terminal_returns, level):
+    """VaR и CVaR (ожидаемые потери за порогом VaR) доходности за горизонт, как положительные потери."""
+    var = float(np.quantile(terminal_returns, 1 - level))
+    tail = terminal_returns[terminal_returns <= var]
+    return -var, -float(tail.mean())
+
+
+def simulate_portfolio(weights_dict, start_date=None, end_date=None, method="bootstrap", n_paths=DEFAULT_PATHS,
+                       horizon_years=DEFAULT_HORIZON_YEARS, block_size=DEFAULT_BLOCK_SIZE,
+                       percentiles=DEFAULT_PERCENTILES, cvar_level=DEFAULT_CVAR_LEVEL, seed=None,
+                       initial_portfolio_value=1000000, parallel=True, risk_model=DEFAULT_RISK_MODEL):
+    """
+    Прогноз стоимости портфеля методом Монте-Карло.
+
+    Пути генерируются частями по CHUNK_PATHS: у каждой части своё независимое
+    зерно (SeedSequence.spawn), поэтому результат при заданном seed не зависит
+    от того, считаются части в пуле процессов или последовательно. Память
+    одной части ограничена, а хранится только стоимость в точках веера
+    (FAN_POINTS_PER_YEAR в год), конечная стоимость и просадка каждого пути.
+
+    Args:
+        weights_dict: веса портфеля (например, от /api/optimize).
+        start_date, end_date: период данных для оценки модели.
+        method: "parametric" или "bootstrap".
+        block_size: длина блока в днях для bootstrap.
+        risk_model: оценка S для parametric (см. core.covariance.RISK_MODELS).
+        parallel: распределять части по пулу процессов.
+
+    Returns:
+        {"fan": {"dates", "years", "bands"}, "terminal": {...}, "drawdown": {...}}
+    """
+    if method not in SIMULATION_METHODS:
+        raise ValueError(f"method должен быть одним из: {', '.join(SIMULATION_METHODS)}")
+
+    weights = {t: float(w) for t, w in weights_dict.items() if w}
+    if not weights:
+        raise ValueError("Отсутствуют веса портфеля")
+
+    model = _portfolio_model(weights, method, start_date, end_date, block_size, risk_model)
+    n_steps = int(round(horizon_years * TRADING_DAYS))
+    record_steps = _fan_steps(n_steps, horizon_years)
+
+    sizes = [min(CHUNK_PATHS, n_paths - i) for i in range(0, n_paths, CHUNK_PATHS)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    if parallel and len(sizes) > 1:
+        executor = get_executor()
+        futures = [
+            executor.submit(_simulate_chunk, model, size, n_steps, record_steps, chunk_seed)
+            for size, chunk_seed in zip(sizes, seeds)
+        ]
+        chunks = [future.result() for future in futures]
+    else:
+        chunks = [
+            _simulate_chunk(model, size, n_steps, record_steps, chunk_seed)
+            for size, chunk_seed in zip(sizes, seeds)
+        ]
+
+    points = np.concatenate([chunk[0] for chunk in chunks])
+    terminal = np.concatenate([chunk[1] for chunk in chunks])
+    max_drawdown = np.concatenate([chunk[2] for chunk in chunks])
+    del chunks
+
+    # Fan bands: percentiles of the value at every recorded step
+    bands = np.percentile(points, percentiles, axis=0) * initial_portfolio_value
+    origin = pd.Timestamp(end_date) if end_date else pd.Timestamp.today().normalize()
+    years = record_steps / TRADING_DAYS
+    fan_dates = [(origin + pd.Timedelta(days=round(y * 365.25))).strftime("%Y-%m-%d") for y in years]
+
+    terminal_returns = terminal - 1.0
+    cagr = np.power(np.maximum(terminal, 0.0), 1.0 / horizon_years) - 1.0
+    var, cvar = _tail_stats(terminal_returns, cvar_level)
+
+    def by_percentile(values, scale=1.0):
+        return {f"{p:g}": float(v) * scale for p, v in zip(percentiles, np.percentile(values, percentiles))}
+
+    return {
+        "fan": {
+            "dates": fan_dates,
+            "years": years.tolist(),
+            "bands": {f"{p:g}": band.tolist() for p, band in zip(percentiles, bands)},
+        },
+        "terminal": {
+            "mean": float(terminal.mean()) * initial_portfolio_value,
+            "median": float(np.median(terminal)) * initial_portfolio_value,
+            "percentiles": by_percentile(terminal, initial_portfolio_value),
+            "annual_return_percentiles": by_percentile(cagr),
+            "probability_of_loss": float((terminal < 1.0).mean()),
+            "var": var,
+            "cvar": cvar,
+            "cvar_level": cvar_level,
+        },
+        "drawdown": {
+            "mean": float(max_drawdown.mean()),
+            "percentiles": by_percentile(max_drawdown),
+        },
+        "n_paths": n_paths,
+        "horizon_days": n_steps,
+    }
@@ -0,0 +1,162 @@
+import numpy as np
+import pandas as pd
+
+from utils.returns_store import get_log_close_panel
+from core.batch import optimize_batch
+from core.backtest import calendar_rebalance_rows, CALENDAR_PERIODS
+from core.risk_metrics import risk_metrics_batch
+from core.covariance import check_risk_model, DEFAULT_RISK_MODEL
+
+WINDOW_TYPES = ("rolling", "expanding")
+DEFAULT_LOOKBACK = 252 * 3
+MIN_LOOKBACK = 20
+
+
+def walk_forward_schedule(dates, lookback=DEFAULT_LOOKBACK, window="rolling", rebalance="monthly"):
+    """
+    Окна оценки для каждой даты пересмотра весов.
+
+    Веса пересматриваются в последний торговый день периода rebalance, если до
+    него накоплено не меньше lookback дней истории. Скользящее окно - последние
+    lookback дней, расширяющееся - вся история с начала панели.
+
+    Returns:
+        Список (строка пересмотра, строка начала окна).
+    """
+    rows = calendar_rebalance_rows(dates, rebalance)
+    rows = rows[rows + 1 >= lookback]
+    if window == "expanding":
+        return [(int(row), 0) for row in rows]
+    return [(int(row), int(row) - lookback + 1) for row in rows]
+
+
+def _apply_weights(prices, rows, weights, cost_rate):
+    """
+    Кривая капитала вне выборки: веса строки rows[i] держатся до rows[i + 1].
+
+    В каждой точке пересмотра портфель переходит от сдрейфовавших весов к новым
+    с издержками cost_rate от оборота; недостающая до 1 сумма весов - деньги.
+    """
+    values = np.full(len(prices), np.nan)
+    turnovers = []
+    value, units, cash = 1.0, np.zeros(prices.shape[1]), 1.0
+
+    def holdings(block):
+        # Assets that are not held may have no price yet
+        return np.where(units != 0, block, 0.0) * units
+
+    bounds = list(rows[1:]) + [len(prices) - 1]
+    for row, end, target in zip(rows, bounds, weights):
+        drift = holdings(prices[row]) / value
+        turnover = float(np.abs(target - drift).sum())
+        value *= 1 - cost_rate * turnover
+        units = value * target / np.where(target != 0, prices[row], 1.0)
+        cash = value * (1 - target.sum())
+        turnovers.append(turnover)
+
+        values[row] = value
+        if end > row:
+            values[row + 1:end + 1] = holdings(prices[row + 1:end + 1]).sum(axis=1) + cash
+        value = values[end]
+
+    return values, turnovers
+
+
+def walk_forward(tickers, start_date=None, end_date=None, lookback=DEFAULT_LOOKBACK, window="rolling",
+                 rebalance="monthly", commission=0.0, slippage=0.0, rf=0.0, initial_portfolio_value=1000000,
+                 **optimizer_params):
+    """
+    Walk-forward проверка стратегии оптимизации вне выборки.
+
+    Для каждой даты пересмотра mu/S оцениваются по окну, которое заканчивается
+    этой датой (из хранилища моментов за O(N²) по префиксным суммам, без
+    пересчёта по всей истории), а задачи решаются через optimize_batch: окна
+    независимы и распределяются по пулу процессов, где скомпилированные
+    задачи cvxpy переиспользуются от окна к окну. Полученные веса применяются
+    к следующему периоду.
+
+    Args:
+        optimizer_params: objective, risk_aversion, target_volatility,
+            target_return, short_positions, l2_reg, gamma, risk_model (как в /api/optimize).
+
+    Returns:
+        {"history": DataFrame tradedate/portfolio_value, "rebalances": [...],
+         "turnover", "costs", "performance"}
+    """
+    if window not in WINDOW_TYPES:
+        raise ValueError(f"window должен быть одним из: {', '.join(WINDOW_TYPES)}")
+    if rebalance not in CALENDAR_PERIODS:
+        raise ValueError(f"rebalance должен быть одним из: {', '.join(CALENDAR_PERIODS)}")
+    if isinstance(lookback, bool) or not isinstance(lookback, int) or lookback < MIN_LOOKBACK:
+        raise ValueError(f"lookback должен быть целым числом не меньше {MIN_LOOKBACK} дней")
+    check_risk_model(optimizer_params.get("risk_model", DEFAULT_RISK_MODEL))
+    for name, value in (("commission", commission), ("slippage", slippage)):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            raise ValueError(f"{name} должен быть неотрицательным числом")
+
+    tickers = list(dict.fromkeys(tickers))
+    log_close = get_log_close_panel(tickers, start_date=start_date, end_date=end_date)
+    if log_close.empty:
+        raise ValueError("Нет данных по выбранным бумагам.")
+    log_close = log_close.reindex(columns=tickers)
+
+    dates = log_close.index
+    schedule = walk_forward_schedule(dates, lookback=lookback, window=window, rebalance=rebalance)
+    if not schedule:
+        raise ValueError("Недостаточно истории: ни одно окно оценки не помещается в период.")
+
+    # One optimization item per window; windows are solved in parallel
+    def day(row):
+        return dates[row].strftime("%Y-%m-%d")
+
+    items = [
+        {"start_date": day(window_start), "end_date": day(row)}
+        for row, window_start in schedule
+    ]
+    results = optimize_batch(items, {**optimizer_params, "tickers": tickers, "rf": rf, "frequency": 252})
+
+    # Target weights per rebalance; a failed window keeps the previous weights
+    position = {ticker: i for i, ticker in enumerate(tickers)}
+    rows, targets, rebalances = [], [], []
+    previous = None
+    for (row, window_start), item, result in zip(schedule, items, results):
+        entry = {"date": item["end_date"], "window_start": item["start_date"]}
+        if "error" in result:
+            entry["error"] = result["error"]
+            if previous is None:
+                rebalances.append(entry)
+                continue
+            target = previous
+        else:
+            target = np.zeros(len(tickers))
+            for ticker, weight in result["weights_dict"].items():
+                target[position[ticker]] = weight
+            entry["weights_dict"] = result["weights_dict"]
+        rows.append(row)
+        targets.append(target)
+        rebalances.append(entry)
+        previous = target
+
+    if not rows:
+        raise ValueError("Ни одно окно не удалось оптимизировать: " + rebalances[0]["error"])
+
+    # Delisted assets keep their last price; not yet listed ones are never held
+    prices = np.exp(log_close.ffill().to_numpy(dtype=np.float64))
+    values, turnovers = _apply_weights(prices, rows, targets, commission + slippage)
+
+    turnover_by_date = dict(zip((day(row) for row in rows), turnovers))
+    for entry in rebalances:
+        if entry["date"] in turnover_by_date:
+            entry["turnover"] = turnover_by_date[entry["date"]]
+
+    curve = pd.Series(values[rows[0]:] * initial_portfolio_value, index=dates[rows[0]:])
+    metrics = risk_metrics_batch(curve.to_numpy()[:, None], rf=rf)[0] or {}
+    gross = np.prod([1 - (commission + slippage) * t for t in turnovers])
+
+    return {
+        "history": curve.rename("portfolio_value").rename_axis("tradedate").reset_index(),
+        "rebalances": rebalances,
+        "turnover": float(sum(turnovers)),
+        "costs": float(1 - gross),
+        "performance": {name: metrics.get(name) for name in ("return", "volatility", "sharpe_ratio")},
+    }
@@ -5,11 +5,21 @@ from api.portfolio_history import history_bp
 from api.combined_opt_hist import combined_bp
 from api.compare_portfolios import compare_bp
 from api.asset_list_po import asset_list_bp
+from api.optimize_batch import optimize_batch_bp
+from api.frontier import frontier_bp
+from api.history_multi import history_multi_bp
+from api.cache_stats import cache_stats_bp
+from api.walk_forward import walk_forward_bp
+from api.simulate import simulate_bp
+from utils.shared_matrix import get_shared_matrix
 
 
 app = Flask(__name__)
 swagger = Swagger(app)
 
+# Каждый воркер подключает общую матрицу цен (если она построена) при старте
+get_shared_matrix()
+
 @app.route('/')
 def index():
     return render_template('index_6.html')  # HTML-шаблон
@@ -20,6 +30,12 @@ app.register_blueprint(history_bp)
 app.register_blueprint(combined_bp)
 app.register_blueprint(compare_bp)
 app.register_blueprint(asset_list_bp)
+app.register_blueprint(optimize_batch_bp)
+app.register_blueprint(frontier_bp)
+app.register_blueprint(history_multi_bp)
+app.register_blueprint(cache_stats_bp)
+app.register_blueprint(walk_forward_bp)
+app.register_blueprint(simulate_bp)
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,144 @@
+# Import libraries
+import os
+from datetime import datetime, date
+
+import pandas as pd
+
+from utils.returns_store import update_returns, ID_COLUMNS
+from utils.columnar_export import export_instrument
+from utils.schema import refresh_asset_prices
+
+# Rows collected by BulkWriter before one write transaction
+BULK_BATCH_ROWS = 50_000
+
+
+def enable_wal(conn):
+    """WAL: читатели (Flask) не блокируются, пока идёт запись котировок."""
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+
+def ensure_unique_index(conn, table_name):
+    """
+    Уникальный индекс (id, tradedate) для upsert.
+
+    Дубликаты, оставшиеся от дозаписи через to_sql, удаляются (остаётся последняя запись).
+    """
+    id_column = ID_COLUMNS[table_name]
+    index_name = f"ux_{table_name}_{id_column}_tradedate"
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name=?", (index_name,)).fetchone():
+        return
+
+    with conn:
+        conn.execute(f"""
+            DELETE FROM {table_name}
+            WHERE rowid NOT IN (
+                SELECT MAX(rowid) FROM {table_name} GROUP BY {id_column}, tradedate
+            )
+        """)
+        conn.execute(f"""
+            CREATE UNIQUE INDEX IF NOT EXISTS {index_name}
+            ON {table_name} ({id_column}, tradedate)
+        """)
+
+
+def get_last_dates(conn, table_name):
+    """Последняя дата каждого тикера таблицы одним сгруппированным запросом."""
+    id_column = ID_COLUMNS[table_name]
+    rows = conn.execute(f"SELECT {id_column}, MAX(tradedate) FROM {table_name} GROUP BY {id_column}")
+    return dict(rows.fetchall())
+
+
+def _sql_value(value):
+    if isinstance(value, (datetime, pd.Timestamp)):
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, date):
+        return value.isoformat()
+    if pd.isna(value):
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+
+def upsert_rows(conn, table_name, df):
+    """
+    Запись строк с заменой существующих по (id, tradedate) в одной транзакции.
+
+    Повторная запись тех же дат (например, после сбоя) не создаёт дубликатов.
+    """
+    if df.empty:
+        return 0
+
+    with conn:
+        _insert_or_replace(conn, table_name, df)
+    return len(df)
+
+
+def _insert_or_replace(conn, table_name, df):
+    columns = list(df.columns)
+    records = [tuple(_sql_value(value) for value in row) for row in df.itertuples(index=False, name=None)]
+    conn.executemany(f"""
+        INSERT OR REPLACE INTO {table_name} ({', '.join(columns)})
+        VALUES ({', '.join('?' * len(columns))})
+    """, records)
+
+
+class BulkWriter:
+    """
+    Накопитель новых строк нескольких тикеров и таблиц.
+
+    Строки записываются крупными транзакциями (executemany upsert), после чего
+    для записанных тикеров обновляются таблица доходностей, колоночная копия и CSV.
+    """
+
+    def __init__(self, conn, batch_rows=BULK_BATCH_ROWS, save_csv=None):
+        self.conn = conn
+        self.batch_rows = batch_rows
+        self.save_csv = save_csv
+        self.pending = []
+        self.pending_rows = 0
+        self.written_rows = 0
+        self.last_date = None
+
+        enable_wal(conn)
+        for table_name in ID_COLUMNS:
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table_name,)).fetchone():
+                ensure_unique_index(conn, table_name)
+
+    def add(self, table_name, ticker, df, csv_dir=None):
+        if df.empty:
+            return
+        self.pending.append((table_name, ticker, df, csv_dir))
+        self.pending_rows += len(df)
+        if self.pending_rows >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+
+        # One transaction for all new rows of the batch
+        by_table = {}
+        for table_name, _, df, _ in self.pending:
+            by_table.setdefault(table_name, []).append(df)
+        with self.conn:
+            for table_name, frames in by_table.items():
+                df = pd.concat(frames, ignore_index=True)
+                _insert_or_replace(self.conn, table_name, df)
+                print(f"{len(df)} строк записано в таблицу {table_name}")
+
+        # Materialized all_assets, companion table of cleaned log returns, columnar copy and CSV mirrors
+        for table_name, ticker, df, csv_dir in self.pending:
+            since = pd.to_datetime(df["tradedate"]).min().strftime("%Y-%m-%d")
+            refresh_asset_prices(self.conn, ticker, table_name=table_name, since=since)
+            update_returns(self.conn, ticker, table_name=table_name)
+            export_instrument(self.conn, ticker, table_name=table_name)
+            if self.save_csv is not None and csv_dir is not None:
+                self.save_csv(os.path.join(csv_dir, f"{ticker}.csv"), df, [ID_COLUMNS[table_name], "tradedate"])
+
+        # Last written date: the caller bumps the data version once derived stores are rebuilt
+        last_date = max(pd.to_datetime(df["tradedate"]).max() for _, _, df, _ in self.pending).strftime("%Y-%m-%d")
+        self.last_date = last_date if self.last_date is None else max(self.last_date, last_date)
+
+        self.written_rows += self.pending_rows
+        self.pending = []
+        self.pending_rows = 0
@@ -0,0 +1,110 @@
+# Importing libraries
+import time
+import threading
+
+# Default lifetime of reference data (seconds) and the interval of data version checks
+DEFAULT_TTL = 24 * 60 * 60
+VERSION_CHECK_INTERVAL = 5.0
+
+
+class _Entry:
+    def __init__(self, value, version, expires):
+        self.value = value
+        self.version = version
+        self.expires = expires
+        self.loaded = time.monotonic()
+
+
+class VersionedCache:
+    """
+    Потокобезопасный кэш с TTL и инвалидацией по версии данных.
+
+    Запись устаревает, когда истёк её TTL или сменилась версия данных
+    (version_func, например версия из data_meta, которую меняет update_data).
+    Значение каждого ключа загружается одним потоком, остальные ждут его.
+    """
+
+    def __init__(self, name, ttl=DEFAULT_TTL, version_func=None, version_check_interval=VERSION_CHECK_INTERVAL):
+        self.name = name
+        self.ttl = ttl
+        self.version_func = version_func
+        self.version_check_interval = version_check_interval
+        self._entries = {}
+        self._key_locks = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked = None
+
+    def _current_version(self):
+        # The version source is asked at most once per version_check_interval
+        if self.version_func is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            if self._version_checked is not None and now - self._version_checked < self.version_check_interval:
+                return self._version
+        version = self.version_func()
+        with self._lock:
+            self._version, self._version_checked = version, now
+        return version
+
+    def _count(self, key, event):
+        stats = self._stats.setdefault(key, {"hits": 0, "misses": 0, "loads": 0, "load_seconds": 0.0})
+        stats[event] += 1
+        return stats
+
+    def _valid(self, entry, version):
+        return entry is not None and entry.version == version and (entry.expires is None or time.monotonic() < entry.expires)
+
+    def get_or_load(self, key, loader, ttl=None):
+        """Значение ключа из кэша или результат loader() (сохраняется в кэш)."""
+        version = self._current_version()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if self._valid(entry, version):
+                self._count(key, "hits")
+                return entry.value
+            self._count(key, "misses")
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # Another thread may have loaded the value meanwhile
+            with self._lock:
+                entry = self._entries.get(key)
+                if self._valid(entry, version):
+                    return entry.value
+
+            started = time.monotonic()
+            value = loader()
+            elapsed = time.monotonic() - started
+
+            ttl = self.ttl if ttl is None else ttl
+            with self._lock:
+                self._entries[key] = _Entry(value, version, None if ttl is None else started + ttl)
+                stats = self._count(key, "loads")
+                stats["load_seconds"] += elapsed
+            return value
+
+    def invalidate(self, key=None):
+        """Сброс одного ключа или всего кэша."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+            self._version_checked = None
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            keys = {}
+            for key, stats in self._stats.items():
+                entry = self._entries.get(key)
+                keys[str(key)] = {
+                    **stats,
+                    "cached": entry is not None,
+                    "age_seconds": now - entry.loaded if entry is not None else None,
+                }
+            return {"name": self.name, "ttl": self.ttl, "version": self._version, "keys": keys}
@@ -0,0 +1,160 @@
+# Import libraries
+import os
+import json
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from .db import BASE_DIR
+from .returns_store import ID_COLUMNS
+
+# Directory of the columnar copy: <table>/<ticker>/<column>.bin + meta.json
+COLUMNAR_DIR = os.path.join(BASE_DIR, "columnar_data")
+
+# Exported value columns of every table (OHLC + volume-like column)
+EXPORT_COLUMNS = {
+    "stock_values": ["open", "high", "low", "close", "volume"],
+    "index_values": ["open", "high", "low", "close", "capitalization"],
+    "currency_values": ["open", "high", "low", "close", "volrur"],
+}
+
+DATE_DTYPE = np.dtype("datetime64[D]")
+VALUE_DTYPE = np.dtype("float64")
+
+
+def _instrument_dir(table_name, ticker, path=COLUMNAR_DIR):
+    return os.path.join(path, table_name, ticker)
+
+
+def _read_meta(directory):
+    meta_path = os.path.join(directory, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def export_instrument(conn, ticker, table_name="stock_values", path=COLUMNAR_DIR):
+    """
+    Дозапись новых строк одной бумаги в колоночную копию.
+
+    Каждая колонка - сырой бинарный файл, в который строки только дописываются;
+    meta.json с числом строк обновляется атомарно после записи данных,
+    поэтому недописанный хвост после сбоя отбрасывается при следующем запуске.
+
+    Returns:
+        Количество дописанных строк.
+    """
+    directory = _instrument_dir(table_name, ticker, path)
+    columns = EXPORT_COLUMNS[table_name]
+    meta = _read_meta(directory) or {"rows": 0, "last_date": None, "columns": columns}
+
+    query = f"SELECT tradedate, {', '.join(columns)} FROM {table_name} WHERE {ID_COLUMNS[table_name]} = ?"
+    params = [ticker]
+    if meta["last_date"]:
+        query += " AND tradedate > ?"
+        params.append(meta["last_date"])
+    query += " GROUP BY tradedate ORDER BY tradedate"
+    rows = conn.execute(query, params).fetchall()
+
+    if not rows:
+        return 0
+
+    os.makedirs(directory, exist_ok=True)
+    values = list(zip(*rows))
+    arrays = {"tradedate": np.array([str(d)[:10] for d in values[0]], dtype=DATE_DTYPE)}
+    for column, column_values in zip(columns, values[1:]):
+        arrays[column] = np.array([np.nan if v is None else v for v in column_values], dtype=VALUE_DTYPE)
+
+    for column, array in arrays.items():
+        file_path = os.path.join(directory, f"{column}.bin")
+        with open(file_path, "ab") as f:
+            # Drop a tail written after the last successful meta update
+            f.truncate(meta["rows"] * array.itemsize)
+            f.write(array.tobytes())
+
+    meta = {"rows": meta["rows"] + len(rows), "last_date": str(arrays["tradedate"][-1]), "columns": columns}
+    tmp_path = os.path.join(directory, "meta.json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(directory, "meta.json"))
+    return len(rows)
+
+
+def export_all(db_path="moex_data.db", path=COLUMNAR_DIR):
+    """Построение (или дозапись) колоночной копии для всех бумаг всех таблиц."""
+    conn = sqlite3.connect(db_path)
+    for table_name, id_column in ID_COLUMNS.items():
+        tickers = [row[0] for row in conn.execute(f"SELECT DISTINCT {id_column} FROM {table_name}")]
+        for ticker in tickers:
+            count = export_instrument(conn, ticker, table_name=table_name, path=path)
+            print(f"{ticker}: {count} строк выгружено")
+    conn.close()
+
+
+def load_instrument(ticker, table_name="stock_values", path=COLUMNAR_DIR):
+    """
+    История бумаги как словарь memory-mapped массивов (без копирования и парсинга).
+
+    Returns:
+        {"tradedate": datetime64[D], "open": float64, ...} или None, если бумаги нет.
+    """
+    directory = _instrument_dir(table_name, ticker, path)
+    meta = _read_meta(directory)
+    if meta is None or meta["rows"] == 0:
+        return None
+
+    result = {}
+    for column in ["tradedate"] + meta["columns"]:
+        dtype = DATE_DTYPE if column == "tradedate" else VALUE_DTYPE
+        result[column] = np.memmap(os.path.join(directory, f"{column}.bin"), dtype=dtype,
+                                   mode="r", shape=(meta["rows"],))
+    return result
+
+
+def _find_instrument(ticker, path=COLUMNAR_DIR):
+    for table_name in EXPORT_COLUMNS:
+        data = load_instrument(ticker, table_name=table_name, path=path)
+        if data is not None:
+            return data
+    return None
+
+
+def load_close_panel(tickers, start_date=None, end_date=None, column="close", path=COLUMNAR_DIR):
+    """
+    Широкая панель цен (даты × тикеры) из колоночной копии.
+
+    Окно дат каждой бумаги - срез memory-mapped колонки (бинарный поиск по датам,
+    без копирования); единственная копия - раскладка срезов по общей оси дат.
+    """
+    start = np.datetime64(start_date, "D") if start_date else None
+    end = np.datetime64(end_date, "D") if end_date else None
+
+    slices = {}
+    for ticker in tickers:
+        data = _find_instrument(ticker, path)
+        if data is None:
+            continue
+        dates = data["tradedate"]
+        lo = np.searchsorted(dates, start, side="left") if start is not None else 0
+        hi = np.searchsorted(dates, end, side="right") if end is not None else len(dates)
+        if hi > lo:
+            slices[ticker] = (dates[lo:hi], data[column][lo:hi])
+
+    if not slices:
+        return pd.DataFrame()
+
+    all_dates = np.unique(np.concatenate([dates for dates, _ in slices.values()]))
+    panel = np.full((len(all_dates), len(slices)), np.nan)
+    for i, (dates, values) in enumerate(slices.values()):
+        panel[np.searchsorted(all_dates, dates), i] = values
+
+    df = pd.DataFrame(panel, index=pd.DatetimeIndex(all_dates.astype("datetime64[ns]"), name="tradedate"),
+                      columns=pd.Index(list(slices), name="ticker"))
+    return df
+
+
+# Run from the project root: python -m utils.columnar_export
+if __name__ == "__main__":
+    export_all(db_path="moex_data.db")
@@ -0,0 +1,126 @@
+# Import libraries
+import os
+import csv
+
+import pandas as pd
+
+# CSV mirrors of the price tables and their key columns
+CSV_DIRS = {
+    "csv_data/stock": ["ticker", "tradedate"],
+    "csv_data/indexes": ["secid", "tradedate"],
+    "csv_data/currency": ["secid", "tradedate"],
+}
+
+# "append" - append-only mirroring, "rewrite" - full rewrite on every update
+CSV_MIRROR_MODE = "append"
+
+# Bytes read from the end of a file to find its last row
+TAIL_BYTES = 4096
+
+
+def read_csv_tail(csv_path):
+    """
+    Заголовок и дата последней строки CSV без чтения всего файла.
+
+    Returns:
+        (header, tail_date) - список колонок и дата последней строки (None, если строк нет)
+    """
+    with open(csv_path, "rb") as f:
+        header = next(csv.reader([f.readline().decode("utf-8")]), [])
+
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - TAIL_BYTES))
+        lines = [line for line in f.read().decode("utf-8", errors="ignore").splitlines() if line.strip()]
+
+    # Only the header in the file
+    if "tradedate" not in header or size <= TAIL_BYTES and len(lines) < 2:
+        return header, None
+
+    row = next(csv.reader([lines[-1]]))
+    try:
+        return header, pd.Timestamp(row[header.index("tradedate")]).date()
+    except (ValueError, IndexError):
+        return header, None
+
+
+def merge_and_save_csv(csv_path, df_new, subset_cols):
+    """Полная перезапись: старый CSV + новые строки без дубликатов."""
+    if os.path.exists(csv_path):
+        df_existing = pd.read_csv(csv_path, parse_dates=["tradedate"])
+        df_combined = pd.concat([df_existing, df_new], ignore_index=True)
+        df_combined.drop_duplicates(subset=subset_cols, keep="last", inplace=True)
+    else:
+        df_combined = df_new
+    df_combined.to_csv(csv_path, index=False)
+
+
+def append_csv(csv_path, df_new, subset_cols):
+    """
+    Дозапись в конец CSV только строк новее последней даты файла.
+
+    Если в новых данных есть колонки, которых нет в файле, или дату последней
+    строки прочитать не удалось, файл перезаписывается целиком (merge_and_save_csv).
+
+    Returns:
+        Количество дописанных строк.
+    """
+    if not os.path.exists(csv_path):
+        df_new.to_csv(csv_path, index=False)
+        return len(df_new)
+
+    header, tail_date = read_csv_tail(csv_path)
+    if tail_date is None or not set(df_new.columns) <= set(header):
+        merge_and_save_csv(csv_path, df_new, subset_cols)
+        return len(df_new)
+
+    new_rows = df_new[pd.to_datetime(df_new["tradedate"]).dt.date > tail_date]
+    if new_rows.empty:
+        return 0
+
+    # A file without a trailing newline must not be glued to the first new row
+    with open(csv_path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        needs_newline = f.read(1) != b"\n"
+
+    with open(csv_path, "a", newline="") as f:
+        if needs_newline:
+            f.write("\n")
+        new_rows.reindex(columns=header).to_csv(f, index=False, header=False)
+    return len(new_rows)
+
+
+def mirror_csv(csv_path, df_new, subset_cols, mode=None):
+    """Обновление CSV-зеркала таблицы в режиме CSV_MIRROR_MODE."""
+    if (mode or CSV_MIRROR_MODE) == "append":
+        return append_csv(csv_path, df_new, subset_cols)
+    merge_and_save_csv(csv_path, df_new, subset_cols)
+    return len(df_new)
+
+
+def compact_csv(csv_path, subset_cols):
+    """Удаление дубликатов и сортировка по дате с атомарной перезаписью файла."""
+    df = pd.read_csv(csv_path, parse_dates=["tradedate"], date_format="mixed")
+    df.drop_duplicates(subset=subset_cols, keep="last", inplace=True)
+    df.sort_values("tradedate", kind="stable", inplace=True)
+
+    tmp_path = csv_path + ".tmp"
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, csv_path)
+    return len(df)
+
+
+def compact_csv_dirs(csv_dirs=None):
+    """Периодическое сжатие всех CSV (например, раз в неделю из cron)."""
+    for csv_dir, subset_cols in (csv_dirs or CSV_DIRS).items():
+        if not os.path.isdir(csv_dir):
+            continue
+        for name in sorted(os.listdir(csv_dir)):
+            if name.endswith(".csv"):
+                rows = compact_csv(os.path.join(csv_dir, name), subset_cols)
+                print(f"{csv_dir}/{name}: {rows} строк")
+
+
+# Run from the project root: python -m utils.csv_mirror
+if __name__ == "__main__":
+    compact_csv_dirs()
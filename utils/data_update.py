@@ -6,6 +6,15 @@ from datetime import datetime, timedelta, date
 import requests
 from time import sleep
 
+from utils.returns_store import update_returns, ID_COLUMNS
+from utils.moment_store import update_moment_store
+from utils.shared_matrix import build_shared_matrix
+from utils.bulk_write import enable_wal, ensure_unique_index, upsert_rows
+from utils.schema import refresh_asset_prices
+from utils.data_version import bump_data_version
+from utils.csv_mirror import mirror_csv
+from utils.columnar_export import export_instrument
+
 # Classify by table name
 def classify_by_table_name(table_name):
     table_name = table_name.lower()
@@ -18,18 +27,21 @@ def classify_by_table_name(table_name):
     else:
         raise ValueError(f"Неизвестное имя таблицы: {table_name}")
 
-# Merge new and existing CSVs
-def merge_and_save_csv(csv_path, df_new, subset_cols):
-    if os.path.exists(csv_path):
-        df_existing = pd.read_csv(csv_path, parse_dates=["tradedate"])
-        df_combined = pd.concat([df_existing, df_new], ignore_index=True)
-        df_combined.drop_duplicates(subset=subset_cols, keep="last", inplace=True)
-    else:
-        df_combined = df_new
-    df_combined.to_csv(csv_path, index=False)
+# Base URL of the MOEX ISS API (can be pointed to a local stub server)
+ISS_BASE_URL = os.environ.get("MOEX_ISS_URL", "https://iss.moex.com/iss")
+
+# One page request: shared session and rate limiter when ingesting concurrently
+def get_page(url, params, session=None, limiter=None):
+    if limiter is not None:
+        limiter.acquire()
+    r = (session or requests).get(url, params=params, timeout=15)
+    r.raise_for_status()
+    return r
 
 # Fetching data from MOEX's server
-def fetch_candles(ticker, board='TQBR', start_date="1995-01-01", end_date=None, instrument_type="stock"):
+def fetch_candles(ticker, board='TQBR', start_date="1995-01-01", end_date=None, instrument_type="stock",
+                  session=None, limiter=None, stats=None, base_url=None):
+    base_url = base_url or ISS_BASE_URL
     if end_date is None:
         end_date = (datetime.today() - timedelta(days=1)).strftime("%Y-%m-%d")
     
@@ -37,7 +49,7 @@ def fetch_candles(ticker, board='TQBR', start_date="1995-01-01", end_date=None,
     start = 0
 
     if instrument_type == "stock":
-        url = f"https://iss.moex.com/iss/engines/stock/markets/shares/boards/{board}/securities/{ticker}/candles.json"
+        url = f"{base_url}/engines/stock/markets/shares/boards/{board}/securities/{ticker}/candles.json"
         params = {
             "from": start_date,
             "till": end_date,
@@ -49,15 +61,17 @@ def fetch_candles(ticker, board='TQBR', start_date="1995-01-01", end_date=None,
 
         while True:
             try:
-                r = requests.get(url, params={**params, "start": start}, timeout=15)
-                r.raise_for_status()
+                r = get_page(url, {**params, "start": start}, session, limiter)
                 data = r.json()
                 candles = data[1].get("candles", [])
+                if stats is not None:
+                    stats.add_page(len(candles))
                 if not candles:
                     break
                 all_data.extend(candles)
                 start += 500
-                sleep(0.2)
+                if limiter is None:
+                    sleep(0.2)
             except Exception as e:
                 print(f"Error fetching {ticker} (stock): {e}")
                 break
@@ -71,7 +85,7 @@ def fetch_candles(ticker, board='TQBR', start_date="1995-01-01", end_date=None,
         df['ticker'] = ticker
 
     elif instrument_type == "index":
-        url = f"https://iss.moex.com/iss/history/engines/stock/markets/index/securities/{ticker}.json"
+        url = f"{base_url}/history/engines/stock/markets/index/securities/{ticker}.json"
         params = {
             'from': start_date,
             'till': end_date,
@@ -82,9 +96,10 @@ def fetch_candles(ticker, board='TQBR', start_date="1995-01-01", end_date=None,
 
         while True:
             try:
-                r = requests.get(url, params={**params, "start": start}, timeout=15)
-                r.raise_for_status()
+                r = get_page(url, {**params, "start": start}, session, limiter)
                 data = r.json()
+                if stats is not None:
+                    stats.add_page(len(data.get('history', {}).get('data', [])))
 
                 if 'history' not in data or not data['history'].get('data'):
                     print(f"Ошибка: нет данных для {ticker} на {start_date} - {end_date}")
@@ -96,7 +111,8 @@ def fetch_candles(ticker, board='TQBR', start_date="1995-01-01", end_date=None,
                     break
 
                 start += params['limit']
-                sleep(0.2)
+                if limiter is None:
+                    sleep(0.2)
             except Exception as e:
                 print(f"Error fetching {ticker} (index): {e}, URL: {r.url}")
                 break
@@ -125,7 +141,7 @@ def fetch_candles(ticker, board='TQBR', start_date="1995-01-01", end_date=None,
         df["tradedate"] = pd.to_datetime(df["tradedate"]).dt.date
 
     elif instrument_type == "currency":
-        url = f"https://iss.moex.com/iss/history/engines/currency/markets/selt/boards/{board}/securities/{ticker}.json"
+        url = f"{base_url}/history/engines/currency/markets/selt/boards/{board}/securities/{ticker}.json"
         params = {
             "from": start_date,
             "till": end_date,
@@ -137,16 +153,18 @@ def fetch_candles(ticker, board='TQBR', start_date="1995-01-01", end_date=None,
 
         while True:
             try:
-                r = requests.get(url, params=params, timeout=15)
-                r.raise_for_status()
+                r = get_page(url, params, session, limiter)
                 data = r.json()
                 rows = data.get("history", {}).get("data", [])
+                if stats is not None:
+                    stats.add_page(len(rows))
                 if not rows:
                     break
                 all_data.extend(rows)
                 start += 100
                 params["start"] = start
-                sleep(0.2)
+                if limiter is None:
+                    sleep(0.2)
             except Exception as e:
                 print(f"Error fetching {ticker} (gold): {e}")
                 break
@@ -179,73 +197,82 @@ def fetch_candles(ticker, board='TQBR', start_date="1995-01-01", end_date=None,
 
     return df
 
-# SQL base + CSV update
-def update_data(ticker, db_path="moex_data.db", table_name="stock_values", csv_dir="csv_data/stock"):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    # определяем тип инструмента по таблице
-    instrument_type, board = classify_by_table_name(table_name)
-
-    if instrument_type == 'stock':
-        cursor.execute(f"""
-            SELECT MAX(tradedate) FROM {table_name}
-            WHERE ticker = ?;
-        """, (ticker,))
-        result = cursor.fetchone()
-        last_date = result[0]
-    elif instrument_type == 'index':
-        cursor.execute(f"""
-            SELECT MAX(tradedate) FROM {table_name}
-            WHERE secid = ?;
-        """, (ticker,))
-        result = cursor.fetchone()
-        last_date = result[0]
-    elif instrument_type == 'currency':
-        cursor.execute(f"""
-            SELECT MAX(tradedate) FROM {table_name}
-            WHERE secid = ?;
-        """, (ticker,))
-        result = cursor.fetchone()
-        last_date = result[0]
-
-
+# Day after the last stored date (None - the stored date can not be parsed)
+def next_start_date(last_date):
     if last_date:
         if isinstance(last_date, str):
             try:
-                start_date = datetime.strptime(last_date, "%Y-%m-%d").date() + timedelta(days=1)
+                return datetime.strptime(last_date, "%Y-%m-%d").date() + timedelta(days=1)
             except ValueError:
                 print(f"Невозможно распарсить дату: {last_date}")
-                conn.close()
-                return
+                return None
         elif isinstance(last_date, datetime):
-            start_date = last_date.date() + timedelta(days=1)
+            return last_date.date() + timedelta(days=1)
         elif isinstance(last_date, date):
-            start_date = last_date + timedelta(days=1)
+            return last_date + timedelta(days=1)
         else:
             print(f"Неподдерживаемый тип даты: {type(last_date)}")
-            conn.close()
-            return
-    else:
-        start_date = datetime(1995, 1, 1).date()
-
-
-    print(f"Загружаем данные для {ticker} с {start_date}")
-    df_new = fetch_candles(ticker, board=board, start_date=start_date.isoformat(), instrument_type=instrument_type)
+            return None
+    return datetime(1995, 1, 1).date()
 
+# Date from which new data of one ticker has to be loaded
+def get_start_date(conn, ticker, table_name="stock_values"):
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT MAX(tradedate) FROM {table_name}
+        WHERE {ID_COLUMNS[table_name]} = ?;
+    """, (ticker,))
+    return next_start_date(cursor.fetchone()[0])
+
+# Writing new rows to SQL, the returns table and CSV
+def save_new_data(conn, ticker, df_new, table_name="stock_values", csv_dir="csv_data/stock"):
     if df_new.empty:
         print(f"Нет новых данных для {ticker}")
-        conn.close()
         return
 
-    df_new.to_sql(table_name, conn, if_exists="append", index=False)
-    print(f"{len(df_new)} строк добавлено в таблицу {table_name}")
+    # Upsert on (tradedate, ticker/secid): a re-run does not duplicate rows
+    count = upsert_rows(conn, table_name, df_new)
+    print(f"{count} строк записано в таблицу {table_name}")
+
+    # Materialized all_assets table read by the API
+    since = pd.to_datetime(df_new["tradedate"]).min().strftime("%Y-%m-%d")
+    refresh_asset_prices(conn, ticker, table_name=table_name, since=since)
+
+    # Companion table of cleaned log returns
+    count = update_returns(conn, ticker, table_name=table_name)
+    print(f"{count} строк добавлено в таблицу доходностей")
+
+    # Memory-mappable columnar copy for notebooks and offline jobs
+    count = export_instrument(conn, ticker, table_name=table_name)
+    print(f"{count} строк выгружено в колоночную копию")
 
     csv_path = os.path.join(csv_dir, f"{ticker}.csv")
-    merge_and_save_csv(csv_path, df_new, subset_cols=["ticker", "tradedate"])
+    mirror_csv(csv_path, df_new, subset_cols=[ID_COLUMNS[table_name], "tradedate"])
     print(f"CSV файл обновлён: {csv_path}")
 
+    # Last written date: the data version is bumped once derived stores are rebuilt
+    return pd.to_datetime(df_new["tradedate"]).max().strftime("%Y-%m-%d")
+
+# SQL base + CSV update
+def update_data(ticker, db_path="moex_data.db", table_name="stock_values", csv_dir="csv_data/stock"):
+    conn = sqlite3.connect(db_path)
+    enable_wal(conn)
+    ensure_unique_index(conn, table_name)
+
+    # определяем тип инструмента по таблице
+    instrument_type, board = classify_by_table_name(table_name)
+
+    start_date = get_start_date(conn, ticker, table_name=table_name)
+    if start_date is None:
+        conn.close()
+        return None
+
+    print(f"Загружаем данные для {ticker} с {start_date}")
+    df_new = fetch_candles(ticker, board=board, start_date=start_date.isoformat(), instrument_type=instrument_type)
+
+    last_date = save_new_data(conn, ticker, df_new, table_name=table_name, csv_dir=csv_dir)
     conn.close()
+    return last_date
 
 # Getting all tickers from data base
 def get_all_tickers(db_path="moex_data.db", table_name="stock_values"):
@@ -268,14 +295,48 @@ def get_all_tickers(db_path="moex_data.db", table_name="stock_values"):
     conn.close()
     return tickers
 
+# Derived stores and the new data version after quotes were written
+def publish_new_data(db_path="moex_data.db", last_date=None, rebuild_stores=True):
+    """
+    Пересборка производных хранилищ и одна новая версия данных в конце обновления.
+
+    Версия меняется только после пересборки: запросы, пришедшие раньше,
+    считаются и кэшируются под старой версией и сбрасываются этой сменой,
+    а не сохраняются под новой версией с устаревшими хранилищами. Если
+    хранилища не пересобраны (или сборка упала), они отстают от базы и не
+    используются для окон после своей последней даты (covers_window).
+    """
+    try:
+        if rebuild_stores:
+            # Prefix sums for window moments are extended with the new days
+            update_moment_store(db_path=db_path)
+
+            # New version of the shared price matrix, workers switch to it on the next lookup
+            build_shared_matrix(db_path=db_path)
+    finally:
+        # New data version: cached results computed on the old data are invalidated
+        if last_date is not None:
+            conn = sqlite3.connect(db_path)
+            try:
+                bump_data_version(conn, last_date=last_date)
+            finally:
+                conn.close()
+
 # Main function
 def update_all_tickers(db_path="moex_data.db", table_name="stock_values", csv_dir="csv_data/stock"):
     tickers = get_all_tickers(db_path=db_path, table_name=table_name)
+    last_dates = []
     for ticker in tickers:
         print(f"\n=== Обновление данных для {ticker} ===")
-        update_data(ticker, db_path=db_path, table_name=table_name, csv_dir=csv_dir)
+        last_date = update_data(ticker, db_path=db_path, table_name=table_name, csv_dir=csv_dir)
+        if last_date is not None:
+            last_dates.append(last_date)
+
+    publish_new_data(db_path=db_path, last_date=max(last_dates, default=None))
 
 
-update_all_tickers(db_path="moex_data.db", table_name="stock_values", csv_dir="csv_data/stock")
-update_all_tickers(db_path='moex_data.db', table_name='index_values', csv_dir="csv_data/indexes")
-update_all_tickers(db_path='moex_data.db', table_name='currency_values', csv_dir="csv_data/currency")
\ No newline at end of file
+# Run from the project root: python -m utils.data_update
+if __name__ == "__main__":
+    update_all_tickers(db_path="moex_data.db", table_name="stock_values", csv_dir="csv_data/stock")
+    update_all_tickers(db_path='moex_data.db', table_name='index_values', csv_dir="csv_data/indexes")
+    update_all_tickers(db_path='moex_data.db', table_name='currency_values', csv_dir="csv_data/currency")
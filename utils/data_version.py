@@ -0,0 +1,86 @@
+# Import libraries
+import time
+import sqlite3
+
+from .db import DATABASE_PATH
+from .table_models import AllAssetValue
+
+# Key-value table of the database state, updated by the data updater
+DATA_META_TABLE = "data_meta"
+
+
+def ensure_meta_table(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {DATA_META_TABLE} (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+
+
+def _read_meta(conn):
+    return dict(conn.execute(f"SELECT key, value FROM {DATA_META_TABLE}").fetchall())
+
+
+def bump_data_version(conn, last_date=None):
+    """
+    Новая версия данных после записи котировок.
+
+    Args:
+        last_date: последняя записанная дата ('YYYY-MM-DD'); last_tradedate
+            сдвигается, только если она новее сохранённой.
+
+    Returns:
+        {"version": ..., "last_tradedate": ...}
+    """
+    ensure_meta_table(conn)
+    meta = _read_meta(conn)
+    last_tradedate = meta.get("last_tradedate")
+    if last_date is not None and (last_tradedate is None or str(last_date) > last_tradedate):
+        last_tradedate = str(last_date)
+    if last_tradedate is None:
+        last_tradedate = conn.execute(f"SELECT MAX(tradedate) FROM {AllAssetValue.__tablename__}").fetchone()[0]
+
+    version = str(time.time_ns())
+    with conn:
+        conn.executemany(f"INSERT OR REPLACE INTO {DATA_META_TABLE} (key, value) VALUES (?, ?)", [
+            ("version", version),
+            ("last_tradedate", str(last_tradedate)[:10] if last_tradedate else None),
+        ])
+    return {"version": version, "last_tradedate": last_tradedate and str(last_tradedate)[:10]}
+
+
+def get_data_version(db_path=DATABASE_PATH):
+    """
+    Текущая версия данных: {"version", "last_tradedate"}.
+
+    Если обновление ещё не запускалось, версия создаётся при первом обращении.
+    """
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        try:
+            meta = _read_meta(conn)
+        except sqlite3.OperationalError:
+            meta = {}
+        if "version" not in meta:
+            return bump_data_version(conn)
+        return {"version": meta["version"], "last_tradedate": meta.get("last_tradedate")}
+    finally:
+        conn.close()
+
+
+def covers_window(last_date, end_date=None, db_path=DATABASE_PATH):
+    """
+    Покрывает ли копия данных (хранилище моментов, общая матрица) с последней
+    датой last_date окно, которое заканчивается end_date (None - последние данные).
+
+    Окно до last_date покрыто всегда; окно дальше - только если в базе нет
+    более поздних котировок (копия не отстала от обновления).
+    """
+    if last_date is None:
+        return False
+    last_date = str(last_date)[:10]
+    if end_date is not None and str(end_date)[:10] <= last_date:
+        return True
+    last_tradedate = get_data_version(db_path)["last_tradedate"]
+    return last_tradedate is None or last_tradedate <= last_date
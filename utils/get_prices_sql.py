@@ -1,9 +1,13 @@
 # Importing libraries
+import numpy as np
 import pandas as pd
 import sqlite3
 
-from .db import SessionLocal
+from .db import engine
 from .table_models import AllAssetValue, AssetClass
+from .price_cache import price_cache
+from .shared_matrix import get_shared_matrix
+from .reference_data import get_asset_class_members
 
 
 import warnings
@@ -160,50 +164,25 @@ def get_assets_prices_sql(
     
     # Формируем плейсхолдеры для тикеров
     tickers_placeholder = ", ".join(["?"] * len(tickers))
-    
-    # Формируем SQL-запрос с фильтрацией по дате
+
+    # Индексы и валюты из материализованной таблицы all_assets (поиск по ключу ticker, tradedate)
     query = f"""
-        SELECT tradedate, secid, close
-        FROM index_values
-        WHERE secid IN ({tickers_placeholder})
-    """
-    
-    # Добавляем фильтрацию по датам для первого подзапроса
-    if start_date:
-        query += " AND tradedate >= ?"
-    if end_date:
-        query += " AND tradedate <= ?"
-    
-    # Добавляем UNION ALL и второй подзапрос для валют
-    query += " UNION ALL "
-    
-    query += f"""
-        SELECT tradedate, secid, close
-        FROM currency_values
-        WHERE secid IN ({tickers_placeholder})
+        SELECT tradedate, ticker AS secid, close
+        FROM {AllAssetValue.__tablename__}
+        WHERE ticker IN ({tickers_placeholder})
+          AND asset_type IN ('index', 'currency')
     """
-    
-    # Добавляем фильтрацию по датам для второго подзапроса
+    params = list(tickers)
+
+    # Добавляем фильтрацию по датам
     if start_date:
         query += " AND tradedate >= ?"
+        params.append(start_date)
     if end_date:
         query += " AND tradedate <= ?"
-    
-    # Завершаем запрос
+        params.append(end_date)
+
     query += " ORDER BY tradedate"
-    
-    # Параметры для запроса: тикеры для обеих таблиц и даты (если есть)
-    params = tickers.copy()  # Копируем тикеры для обеих таблиц
-    if start_date:
-        params.append(start_date)  # Добавляем start_date
-    if end_date:
-        params.append(end_date)  # Добавляем end_date
-    
-    params += tickers  # Дублируем тикеры для второго подзапроса
-    if start_date:
-        params.append(start_date)  # Добавляем start_date для валют
-    if end_date:
-        params.append(end_date)  # Добавляем end_date для валют
 
     # Выполнение запроса
     df = pd.read_sql(query, conn, params=params)
@@ -223,46 +202,100 @@ def get_assets_prices_sql(
 
 
 def get_prices_orm(tickers, start_date=None, end_date=None, frequency=252, mode="tickers"):
-    session = SessionLocal()
-
-    # if mode == "assets":
-    #     # Находим тикеры, соответствующие переданным группам активов
-    #     tickers = (
-    #         session.query(AssetClass.ticker)
-    #         .filter(AssetClass.asset_ru.in_(items))
-    #         .all()
-    #     )
-    #     tickers = [t[0] for t in tickers]  # извлекаем тикеры из кортежей
-    # else:
-    #     tickers = items
-
-    query = session.query(AllAssetValue).filter(AllAssetValue.ticker.in_(tickers))
-
-    if start_date:
-        query = query.filter(AllAssetValue.tradedate >= start_date)
-    if end_date:
-        query = query.filter(AllAssetValue.tradedate <= end_date)
-
-    results = query.order_by(AllAssetValue.tradedate).all()
-    session.close()
-
-    # В DataFrame
-    df = pd.DataFrame([{
-        'tradedate': r.tradedate,
-        'ticker': r.ticker,
-        'close': r.close
-        } for r in results])
-
-    if df.empty:
+    if mode == "assets":
+        # Находим тикеры, соответствующие переданным группам активов (состав - из кэша справочников)
+        members = get_asset_class_members()
+        tickers = list(dict.fromkeys(ticker for asset_ru in tickers for ticker in members.get(asset_ru, [])))
+
+    # Slice of the shared memory-mapped matrix, otherwise the process-wide cache and the database
+    matrix = get_shared_matrix()
+    if matrix is not None and matrix.covers(tickers, end_date):
+        df_pivot = matrix.panels(("close",), tickers, start_date, end_date)["close"]
+    else:
+        df_pivot = price_cache.get(tickers, start_date, end_date)
+    if df_pivot is None:
+        df_pivot = read_price_panel(tickers, start_date=start_date, end_date=end_date)
+        price_cache.put(tickers, start_date, end_date, df_pivot)
+
+    if df_pivot.empty:
         return pd.DataFrame()
 
-    df['tradedate'] = pd.to_datetime(df['tradedate'])
-    df_pivot = df.pivot(index='tradedate', columns='ticker', values='close').sort_index()
-
     if frequency == 12:
         df_pivot = df_pivot.resample('M').last()
 
     return df_pivot
 
 
+# Parsing a chunk of tradedate strings into datetime64 values
+def _parse_dates(raw_dates):
+    try:
+        return np.array(raw_dates, dtype="datetime64[D]")
+    except ValueError:
+        return pd.to_datetime(pd.Series(raw_dates), format="mixed").values.astype("datetime64[D]")
+
+
+# Bulk read of a long (tradedate, ticker, value...) table straight into wide typed arrays
+def read_wide_panels(source, value_columns, tickers, start_date=None, end_date=None, chunk_size=100_000, db_path=None):
+    requested = np.array(sorted(set(tickers)))
+    if requested.size == 0:
+        return {column: pd.DataFrame() for column in value_columns}
+
+    query = f"""
+        SELECT tradedate, ticker, {", ".join(value_columns)}
+        FROM {source}
+        WHERE ticker IN ({", ".join(["?"] * len(requested))})
+    """
+    params = list(requested)
 
+    if start_date:
+        query += " AND tradedate >= ?"
+        params.append(str(start_date))
+    if end_date:
+        query += " AND tradedate <= ?"
+        params.append(str(end_date))
+
+    date_parts, ticker_parts = [], []
+    value_parts = [[] for _ in value_columns]
+
+    # Rows are streamed in chunks and converted column-wise
+    conn = sqlite3.connect(db_path) if db_path else engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            raw_dates, raw_tickers, *raw_values = zip(*rows)
+            date_parts.append(_parse_dates(raw_dates))
+            ticker_parts.append(np.searchsorted(requested, np.array(raw_tickers)).astype(np.int32))
+            for parts, raw in zip(value_parts, raw_values):
+                parts.append(np.array(raw, dtype=np.float64))
+        cursor.close()
+    finally:
+        conn.close()
+
+    if not date_parts:
+        return {column: pd.DataFrame() for column in value_columns}
+
+    # Integer codes for dates and tickers instead of DataFrame.pivot
+    unique_dates, date_codes = np.unique(np.concatenate(date_parts), return_inverse=True)
+    present, ticker_codes = np.unique(np.concatenate(ticker_parts), return_inverse=True)
+
+    index = pd.DatetimeIndex(unique_dates.astype("datetime64[ns]"), name="tradedate")
+    columns = pd.Index(requested[present].tolist(), name="ticker")
+
+    panels = {}
+    for column, parts in zip(value_columns, value_parts):
+        values = np.full((len(unique_dates), len(present)), np.nan)
+        values[date_codes, ticker_codes] = np.concatenate(parts)
+        panels[column] = pd.DataFrame(values, index=index, columns=columns)
+
+    return panels
+
+
+# Bulk read of close prices, bypassing ORM objects
+def read_price_panel(tickers, start_date=None, end_date=None):
+    return read_wide_panels(
+        AllAssetValue.__tablename__, ("close",), tickers, start_date=start_date, end_date=end_date
+    )["close"]
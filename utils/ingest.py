@@ -0,0 +1,160 @@
+# Import libraries
+import sqlite3
+import threading
+from time import monotonic, sleep
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.data_update import (
+    classify_by_table_name, fetch_candles,
+    next_start_date, publish_new_data, ISS_BASE_URL,
+)
+from utils.csv_mirror import mirror_csv
+from utils.bulk_write import BulkWriter, get_last_dates
+
+# Tables refreshed by a full ingestion and their CSV mirrors
+INGEST_TABLES = [
+    ("stock_values", "csv_data/stock"),
+    ("index_values", "csv_data/indexes"),
+    ("currency_values", "csv_data/currency"),
+]
+
+# Concurrent tickers and the global limit of ISS requests per second
+INGEST_MAX_WORKERS = 8
+INGEST_RATE = 10.0
+INGEST_BURST = 10
+
+
+class TokenBucket:
+    """Глобальный ограничитель частоты запросов (rate токенов в секунду, не больше capacity подряд)."""
+
+    def __init__(self, rate=INGEST_RATE, capacity=INGEST_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            sleep(wait)
+
+
+class IngestStats:
+    """Счётчики загрузки: страницы, строки и пропускная способность."""
+
+    def __init__(self):
+        self.pages = 0
+        self.rows = 0
+        self.tickers = 0
+        self.errors = 0
+        self.started = monotonic()
+        self.lock = threading.Lock()
+
+    def add_page(self, rows):
+        with self.lock:
+            self.pages += 1
+            self.rows += rows
+
+    def summary(self):
+        elapsed = max(monotonic() - self.started, 1e-9)
+        return {
+            "tickers": self.tickers,
+            "errors": self.errors,
+            "pages": self.pages,
+            "rows": self.rows,
+            "seconds": elapsed,
+            "pages_per_sec": self.pages / elapsed,
+            "rows_per_sec": self.rows / elapsed,
+        }
+
+
+def make_session(pool_size=INGEST_MAX_WORKERS):
+    """Общая HTTP-сессия с пулом соединений (keep-alive) и повторами на 429/5xx."""
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def ingest_all(db_path="moex_data.db", tables=None, max_workers=INGEST_MAX_WORKERS,
+               rate=INGEST_RATE, base_url=None, update_moments=True):
+    """
+    Параллельное обновление всех таблиц котировок.
+
+    Страницы ISS загружаются в пуле потоков через общую сессию, а частота
+    запросов всех потоков ограничена одним TokenBucket. Запись в SQLite
+    выполняется в вызывающем потоке крупными транзакциями (BulkWriter).
+
+    Returns:
+        Статистика загрузки (страницы/строки в секунду).
+    """
+    tables = tables or INGEST_TABLES
+    base_url = base_url or ISS_BASE_URL
+    session = make_session(max_workers)
+    limiter = TokenBucket(rate=rate, capacity=max(1, int(rate)))
+    stats = IngestStats()
+
+    conn = sqlite3.connect(db_path)
+    try:
+        # WAL, unique (id, tradedate) indexes and upserts in large transactions
+        writer = BulkWriter(conn, save_csv=mirror_csv)
+
+        # Start dates for all tickers: one grouped MAX(tradedate) query per table
+        jobs = []
+        for table_name, csv_dir in tables:
+            instrument_type, board = classify_by_table_name(table_name)
+            for ticker, last_date in get_last_dates(conn, table_name).items():
+                start_date = next_start_date(last_date)
+                if start_date is not None:
+                    jobs.append((ticker, table_name, csv_dir, instrument_type, board, start_date))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(
+                    fetch_candles, ticker, board=board, start_date=start_date.isoformat(),
+                    instrument_type=instrument_type, session=session, limiter=limiter,
+                    stats=stats, base_url=base_url,
+                ): (ticker, table_name, csv_dir)
+                for ticker, table_name, csv_dir, instrument_type, board, start_date in jobs
+            }
+
+            for future in as_completed(futures):
+                ticker, table_name, csv_dir = futures[future]
+                try:
+                    writer.add(table_name, ticker, future.result(), csv_dir=csv_dir)
+                    stats.tickers += 1
+                except Exception as e:
+                    stats.errors += 1
+                    print(f"Ошибка обновления {ticker} ({table_name}): {e}")
+
+            writer.flush()
+    finally:
+        conn.close()
+        session.close()
+
+    # Moment store and shared matrix, then one new data version
+    publish_new_data(db_path=db_path, last_date=writer.last_date, rebuild_stores=update_moments)
+
+    summary = stats.summary()
+    print(f"Загружено {summary['pages']} страниц и {summary['rows']} строк за {summary['seconds']:.1f} с: "
+          f"{summary['pages_per_sec']:.1f} страниц/с, {summary['rows_per_sec']:.0f} строк/с")
+    return summary
+
+
+# Run from the project root: python -m utils.ingest
+if __name__ == "__main__":
+    ingest_all(db_path="moex_data.db")
@@ -0,0 +1,194 @@
+# Import libraries
+import json
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from flask import Response, jsonify, stream_with_context
+from werkzeug.http import http_date
+
+# orjson is the serializer from requirements.txt; the standard json module
+# gives the same payload when it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# "records" - [{"tradedate": ..., "portfolio_value": ...}, ...] (as before),
+# "columnar" - {"dates": ["YYYY-MM-DD", ...], "values": [...]}
+HISTORY_FORMATS = ("records", "columnar")
+DEFAULT_HISTORY_FORMAT = "records"
+
+# Rows of a history serialized into one chunk of a streamed response
+STREAM_CHUNK_ROWS = 2000
+
+# Weekday/month names of an HTTP date (the format jsonify uses for dates)
+_WEEKDAYS = np.array(["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"], dtype=object)
+_MONTHS = np.array(["Jan", "Feb", "Mar", "Apr", "May", "Jun",
+                    "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"], dtype=object)
+
+
+def _finite(value):
+    # NaN and infinity are not valid JSON: null, as orjson writes them
+    if isinstance(value, float):
+        return value if np.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+
+def _default(value):
+    # The same conversions as Flask's default JSON provider
+    if isinstance(value, date):
+        return http_date(value)
+    if isinstance(value, (np.generic, np.ndarray)):
+        return _finite(value.tolist())
+    if isinstance(value, History):
+        return _finite(value.to_json_value())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value):
+    """
+    Сериализация в bytes: orjson, если установлен, иначе json.
+
+    Результат не зависит от сериализатора: даты - в формате HTTP, как у jsonify,
+    NaN и бесконечности - null.
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            value, default=_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME,
+        )
+    return json.dumps(
+        _finite(value), default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class History:
+    """
+    История портфеля (DataFrame tradedate/portfolio_value) в ответе API.
+
+    Даты и значения преобразуются в списки векторно, без DataFrame.to_dict
+    и словаря на каждую строку (кроме формата records, где он и нужен).
+    """
+
+    def __init__(self, df, history_format=DEFAULT_HISTORY_FORMAT):
+        self.df = df
+        self.history_format = history_format
+
+    def __len__(self):
+        return len(self.df)
+
+    def _dates(self, start, stop):
+        dates = pd.DatetimeIndex(self.df["tradedate"].iloc[start:stop])
+        if self.history_format == "columnar":
+            return list(dates.strftime("%Y-%m-%d"))
+        # RFC 822 date like jsonify ("Mon, 03 Jan 2022 00:00:00 GMT"), independent of the locale
+        return list(_WEEKDAYS[dates.dayofweek] + dates.strftime(", %d ") + _MONTHS[dates.month - 1]
+                    + dates.strftime(" %Y %H:%M:%S GMT"))
+
+    def _values(self, start, stop):
+        return self.df["portfolio_value"].iloc[start:stop].tolist()
+
+    def _rows(self, start, stop):
+        return [{"tradedate": d, "portfolio_value": v}
+                for d, v in zip(self._dates(start, stop), self._values(start, stop))]
+
+    def to_json_value(self):
+        if self.df.empty:
+            return {"dates": [], "values": []} if self.history_format == "columnar" else []
+        if self.history_format == "columnar":
+            return {"dates": self._dates(0, len(self)), "values": self._values(0, len(self))}
+        return self._rows(0, len(self))
+
+    def iter_chunks(self, chunk_rows=STREAM_CHUNK_ROWS):
+        """JSON истории по частям: по chunk_rows строк (или дат/значений) за раз."""
+        if self.df.empty:
+            yield dumps(self.to_json_value())
+            return
+
+        bounds = [(start, min(start + chunk_rows, len(self))) for start in range(0, len(self), chunk_rows)]
+        if self.history_format == "columnar":
+            for key, part in (("dates", self._dates), ("values", self._values)):
+                yield b'{"dates":[' if key == "dates" else b'],"values":['
+                for i, (start, stop) in enumerate(bounds):
+                    yield (b"," if i else b"") + dumps(part(start, stop))[1:-1]
+            yield b"]}"
+        else:
+            yield b"["
+            for i, (start, stop) in enumerate(bounds):
+                yield (b"," if i else b"") + dumps(self._rows(start, stop))[1:-1]
+            yield b"]"
+
+
+def _has_history(value):
+    if isinstance(value, History):
+        return True
+    if isinstance(value, dict):
+        return any(_has_history(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(_has_history(v) for v in value)
+    return False
+
+
+def iter_json(value):
+    """Потоковая сериализация: истории отдаются частями, остальное - целиком."""
+    if isinstance(value, History):
+        yield from value.iter_chunks()
+    elif isinstance(value, dict) and _has_history(value):
+        yield b"{"
+        for i, (key, item) in enumerate(value.items()):
+            yield (b"," if i else b"") + dumps(str(key)) + b":"
+            yield from iter_json(item)
+        yield b"}"
+    elif isinstance(value, (list, tuple)) and _has_history(value):
+        yield b"["
+        for i, item in enumerate(value):
+            if i:
+                yield b","
+            yield from iter_json(item)
+        yield b"]"
+    else:
+        yield dumps(value)
+
+
+def _to_records(value):
+    # The previous payload: list of per-row dicts serialized by jsonify
+    if isinstance(value, History):
+        return value.df.to_dict(orient="records")
+    if isinstance(value, dict):
+        return {key: _to_records(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_to_records(item) for item in value]
+    return value
+
+
+def get_history_options(data):
+    """
+    Параметры ответа из тела запроса: history_format и stream.
+
+    Returns:
+        (history_format, stream) или (None, None) для неизвестного формата.
+    """
+    history_format = data.get("history_format", DEFAULT_HISTORY_FORMAT)
+    if history_format not in HISTORY_FORMATS:
+        return None, None
+    return history_format, bool(data.get("stream", False))
+
+
+def json_response(payload, history_format=DEFAULT_HISTORY_FORMAT, stream=False):
+    """
+    Ответ с историями портфелей (объекты History внутри payload).
+
+    records без stream - прежний ответ jsonify; columnar - компактный ответ
+    быстрым сериализатором; stream - chunked-ответ, который начинает
+    отправляться до сериализации всей истории.
+    """
+    if stream:
+        return Response(stream_with_context(iter_json(payload)), mimetype="application/json")
+    if history_format == "records":
+        return jsonify(_to_records(payload))
+    return Response(dumps(payload), mimetype="application/json")
@@ -0,0 +1,294 @@
+# Importing libraries
+import json
+import os
+import shutil
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+from pypfopt.risk_models import fix_nonpositive_semidefinite
+
+from .db import BASE_DIR
+from .returns_store import RETURNS_TABLE
+from .data_version import covers_window
+
+# Directory with the persisted prefix sums of the whole universe
+MOMENT_STORE_DIR = os.path.join(BASE_DIR, "moment_store")
+
+# Rows between two stored checkpoints of the prefix sums
+DEFAULT_BLOCK = 252
+
+
+def _row_sums(returns):
+    """Суммы по строкам: Σr_i·r_j, Σr_i·m_j, Σm_i·m_j и Σlog(1+r_i) (m - признак наличия доходности)."""
+    present = ~np.isnan(returns)
+    r = np.where(present, returns, 0.0)
+    m = present.astype(np.float64)
+    return r.T @ r, r.T @ m, m.T @ m, np.log1p(r).sum(axis=0)
+
+
+class MomentStore:
+    """
+    Префиксные суммы доходностей (date x ticker) для оценки mu и S за любое окно.
+
+    Суммы хранятся в контрольных точках через каждые block строк, поэтому
+    ответ для окна [start_date, end_date] - это разность двух префиксов плюс
+    не более 2*block строк, т.е. O(N²) независимо от длины истории.
+    Ковариация считается по попарно доступным наблюдениям, как DataFrame.cov.
+    """
+
+    def __init__(self, dates, tickers, returns, listed, block=DEFAULT_BLOCK, checkpoints=None):
+        self.dates = np.asarray(dates, dtype="datetime64[ns]")
+        self.tickers = list(tickers)
+        self.returns = returns
+        self.listed = np.asarray(listed, dtype="datetime64[ns]")
+        self.block = block
+        self._positions = {ticker: i for i, ticker in enumerate(self.tickers)}
+        if checkpoints is None:
+            checkpoints = self._build_checkpoints(0, None)
+        self.ss, self.sm, self.cc, self.lg = checkpoints
+
+    @classmethod
+    def from_frame(cls, returns, listed, block=DEFAULT_BLOCK):
+        """
+        Строит хранилище из панели простых доходностей (NaN - доходности нет).
+
+        listed - дата первой цены каждой бумаги (Series по тикерам).
+        """
+        returns = returns.sort_index()
+        return cls(
+            returns.index.values, returns.columns, returns.to_numpy(dtype=np.float64, copy=True),
+            pd.to_datetime(listed.reindex(returns.columns)).values, block,
+        )
+
+    def _build_checkpoints(self, first_block, previous):
+        n_rows, n = self.returns.shape
+        n_blocks = n_rows // self.block + 1
+
+        ss = np.zeros((n_blocks, n, n))
+        sm = np.zeros((n_blocks, n, n))
+        cc = np.zeros((n_blocks, n, n))
+        lg = np.zeros((n_blocks, n))
+        if previous is not None:
+            for stored, new in zip(previous, (ss, sm, cc, lg)):
+                new[:first_block + 1] = stored[:first_block + 1]
+
+        for k in range(first_block, n_blocks - 1):
+            block_sums = _row_sums(self.returns[k * self.block:(k + 1) * self.block])
+            for cumulative, part in zip((ss, sm, cc, lg), block_sums):
+                cumulative[k + 1] = cumulative[k] + part
+
+        return ss, sm, cc, lg
+
+    def update(self, returns):
+        """
+        Дописывает новые строки (и новые значения для уже известных дат).
+
+        Пересчитываются только контрольные точки начиная с блока первой изменённой строки.
+        """
+        returns = returns.reindex(columns=self.tickers).sort_index()
+        dates = np.union1d(self.dates, returns.index.values.astype("datetime64[ns]"))
+
+        merged = np.full((len(dates), len(self.tickers)), np.nan)
+        merged[np.searchsorted(dates, self.dates)] = self.returns
+        rows = np.searchsorted(dates, returns.index.values.astype("datetime64[ns]"))
+        values = returns.to_numpy(dtype=np.float64)
+        merged[rows] = np.where(np.isnan(values), merged[rows], values)
+
+        # Checkpoints before the first changed row stay valid
+        if rows.size == 0:
+            return
+        first_block = int(rows.min()) // self.block
+
+        self.dates, self.returns = dates, merged
+        self.ss, self.sm, self.cc, self.lg = self._build_checkpoints(
+            first_block, (self.ss, self.sm, self.cc, self.lg)
+        )
+
+    def _prefix(self, idx, row):
+        k = row // self.block
+        sums = [
+            self.ss[k][np.ix_(idx, idx)], self.sm[k][np.ix_(idx, idx)],
+            self.cc[k][np.ix_(idx, idx)], self.lg[k][idx],
+        ]
+        if row > k * self.block:
+            for total, part in zip(sums, _row_sums(self.returns[k * self.block:row][:, idx])):
+                total += part
+        return sums
+
+    def window_sums(self, tickers, start_date=None, end_date=None):
+        """Суммы за окно; первая доходность бумаги в окне (от цены до start_date) исключается."""
+        idx = [self._positions[ticker] for ticker in tickers]
+        start = None if start_date is None else pd.Timestamp(start_date).to_datetime64()
+        lo = 0 if start is None else int(np.searchsorted(self.dates, start, side="left"))
+        hi = len(self.dates) if end_date is None else int(np.searchsorted(self.dates, pd.Timestamp(end_date).to_datetime64(), side="right"))
+        lo = min(lo, hi)
+
+        # First return in the window of every ticker listed before the window
+        window = self.returns[lo:hi][:, idx]
+        present = ~np.isnan(window)
+        excluded = present.any(axis=0)
+        if start is not None:
+            excluded &= self.listed[idx] < start
+        else:
+            excluded[:] = False
+        first = present.argmax(axis=0)
+
+        # Rows up to the last excluded return are summed directly
+        head_end = lo + (int(first[excluded].max()) + 1 if excluded.any() else 0)
+        head = window[:head_end - lo].copy()
+        head[first[excluded], np.flatnonzero(excluded)] = np.nan
+
+        end_sums = self._prefix(idx, hi)
+        start_sums = self._prefix(idx, head_end)
+        sums = [e - s for e, s in zip(end_sums, start_sums)]
+        for total, part in zip(sums, _row_sums(head)):
+            total += part
+        return sums
+
+    def mean_cov(self, tickers, start_date=None, end_date=None, frequency=252):
+        """Годовые mu (геометрическое среднее) и S (выборочная ковариация) за окно."""
+        ss, sm, cc, lg = self.window_sums(tickers, start_date, end_date)
+
+        counts = np.diag(cc)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mu = np.expm1(lg * frequency / counts)
+            cov = (ss - sm * sm.T / cc) / (cc - 1)
+        cov[cc < 2] = np.nan
+
+        # Tickers without returns in the window are left out, as in the price pivot
+        keep = counts > 0
+        tickers = [ticker for ticker, k in zip(tickers, keep) if k]
+        mu = pd.Series(mu[keep], index=tickers)
+        S = pd.DataFrame(cov[np.ix_(keep, keep)] * frequency, index=tickers, columns=tickers)
+        return mu, fix_nonpositive_semidefinite(S)
+
+    def has_tickers(self, tickers):
+        return all(ticker in self._positions for ticker in tickers)
+
+    def last_dates(self):
+        """Последняя дата доходности каждой бумаги в хранилище (дата первой цены, если доходностей нет)."""
+        last = self.listed.copy()
+        present = ~np.isnan(self.returns)
+        if len(self.dates):
+            last_rows = len(self.dates) - 1 - present[::-1].argmax(axis=0)
+            last = np.where(present.any(axis=0), self.dates[last_rows], last)
+        return pd.Series(pd.to_datetime(last), index=self.tickers)
+
+    def covers(self, tickers, end_date=None):
+        """Есть ли в хранилище все тикеры и все даты окна, заканчивающегося end_date."""
+        if not self.has_tickers(tickers) or not len(self.dates):
+            return False
+        return covers_window(np.datetime_as_string(self.dates[-1], unit="D"), end_date)
+
+    def save(self, path=MOMENT_STORE_DIR):
+        """Сохраняет хранилище в каталог .npy файлов (с заменой предыдущей версии)."""
+        tmp_path = path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        np.save(os.path.join(tmp_path, "dates.npy"), self.dates)
+        np.save(os.path.join(tmp_path, "returns.npy"), self.returns)
+        np.save(os.path.join(tmp_path, "listed.npy"), self.listed)
+        for name, array in zip(("ss", "sm", "cc", "lg"), (self.ss, self.sm, self.cc, self.lg)):
+            np.save(os.path.join(tmp_path, f"{name}.npy"), array)
+        with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"tickers": self.tickers, "block": self.block}, f)
+
+        old_path = path + ".old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(path):
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path=MOMENT_STORE_DIR, mmap_mode="r"):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in ("dates", "returns", "listed", "ss", "sm", "cc", "lg")
+        }
+        return cls(
+            arrays["dates"], meta["tickers"], arrays["returns"], arrays["listed"], meta["block"],
+            checkpoints=(arrays["ss"], arrays["sm"], arrays["cc"], arrays["lg"]),
+        )
+
+
+# Reading full-history daily returns of the universe from the returns store
+def _read_daily_returns(conn, since=None):
+    query = f"SELECT tradedate, ticker, log_return FROM {RETURNS_TABLE}"
+    params = []
+    if since is not None:
+        query += " WHERE tradedate > ?"
+        params.append(since)
+    df = pd.read_sql(query, conn, params=params)
+
+    if df.empty:
+        return pd.DataFrame()
+
+    df['tradedate'] = pd.to_datetime(df['tradedate'])
+    return np.expm1(df.pivot(index='tradedate', columns='ticker', values='log_return').sort_index())
+
+
+def _read_listing_dates(conn):
+    df = pd.read_sql(f"SELECT ticker, MIN(tradedate) AS listed FROM {RETURNS_TABLE} GROUP BY ticker", conn)
+    return pd.to_datetime(df.set_index('ticker')['listed'])
+
+
+def _read_last_dates(conn):
+    df = pd.read_sql(f"SELECT ticker, MAX(tradedate) AS last FROM {RETURNS_TABLE} GROUP BY ticker", conn)
+    return pd.to_datetime(df.set_index('ticker')['last'])
+
+
+# Extending (or building) the persisted prefix sums after new days were ingested
+def update_moment_store(db_path="moex_data.db", path=MOMENT_STORE_DIR, block=DEFAULT_BLOCK):
+    conn = sqlite3.connect(db_path)
+    try:
+        store = MomentStore.load(path, mmap_mode=None) if os.path.exists(path) else None
+        if store is not None:
+            db_last = _read_last_dates(conn)
+            if not store.has_tickers(db_last.index):
+                store = None
+        if store is not None:
+            # Tickers with rows after their own last stored date. Tables are updated one
+            # after another, so these rows may fall on dates the store already has
+            # (index and currency days after the stock pass): they are re-read from
+            # the earliest such date and update() fills the known dates too
+            stored_last = store.last_dates().reindex(db_last.index)
+            changed = db_last.index[db_last > stored_last]
+            if len(changed):
+                since = stored_last[changed].min().strftime("%Y-%m-%d")
+                new_returns = _read_daily_returns(conn, since=since)
+                new_returns = new_returns.reindex(columns=changed).dropna(how="all")
+                store.update(new_returns)
+
+        if store is None:
+            store = MomentStore.from_frame(_read_daily_returns(conn), _read_listing_dates(conn), block=block)
+    finally:
+        conn.close()
+
+    store.save(path)
+    print(f"Хранилище моментов обновлено: {len(store.dates)} дат, {len(store.tickers)} бумаг")
+    return store
+
+
+_loaded = {"store": None, "mtime": None}
+_load_lock = threading.Lock()
+
+
+def get_moment_store(path=MOMENT_STORE_DIR):
+    """Хранилище моментов текущего процесса (перечитывается после обновления на диске)."""
+    meta_path = os.path.join(path, "meta.json")
+    try:
+        mtime = os.path.getmtime(meta_path)
+    except OSError:
+        return None
+
+    with _load_lock:
+        if _loaded["store"] is None or _loaded["mtime"] != mtime:
+            _loaded["store"] = MomentStore.load(path)
+            _loaded["mtime"] = mtime
+        return _loaded["store"]
@@ -0,0 +1,221 @@
+# Importing libraries
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from .cache import VERSION_CHECK_INTERVAL
+from .data_version import get_data_version
+
+# Upper bound for the memory held by cached panels (bytes)
+PRICE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+def _to_bound(value):
+    """Приводит границу периода к Timestamp (None - граница не задана)."""
+    if value is None or value == "":
+        return None
+    return pd.Timestamp(value)
+
+
+class _Panel:
+    """
+    Широкие панели (date x ticker) с общими датами и тикерами в виде массивов NumPy.
+
+    Несколько панелей одной записи (например, логарифмы цен и доходности)
+    режутся по одной маске строк, поэтому их индексы всегда совпадают.
+    """
+
+    def __init__(self, namespace, requested, start, end, frames):
+        self.namespace = namespace
+        self.requested = frozenset(requested)
+        self.start = start
+        self.end = end
+        first = next(iter(frames.values()))
+        self.dates = first.index.values.astype("datetime64[ns]")
+        self.tickers = list(first.columns)
+        self.values = {
+            name: np.array(df.reindex(index=first.index, columns=first.columns).to_numpy(dtype=np.float64), order="C")
+            for name, df in frames.items()
+        }
+
+    @property
+    def nbytes(self):
+        return self.dates.nbytes + sum(values.nbytes for values in self.values.values())
+
+    def covers(self, namespace, requested, start, end):
+        if namespace != self.namespace:
+            return False
+        if not requested <= self.requested:
+            return False
+        if self.start is not None and (start is None or start < self.start):
+            return False
+        if self.end is not None and (end is None or end > self.end):
+            return False
+        return True
+
+    def slice(self, requested, start, end):
+        # Row range by binary search over the sorted dates
+        lo = 0 if start is None else np.searchsorted(self.dates, start.to_datetime64(), side="left")
+        hi = len(self.dates) if end is None else np.searchsorted(self.dates, end.to_datetime64(), side="right")
+
+        columns = [i for i, ticker in enumerate(self.tickers) if ticker in requested]
+        if not columns:
+            return {name: pd.DataFrame() for name in self.values}
+
+        blocks = {name: values[lo:hi, columns] for name, values in self.values.items()}
+        dates = self.dates[lo:hi]
+
+        # Dates where only the other tickers of the panel traded are dropped,
+        # as they would never be returned by the query for this subset.
+        # The mask comes from the first panel and is shared by all of them
+        if len(columns) < len(self.tickers):
+            mask = ~np.isnan(next(iter(blocks.values()))).all(axis=1)
+            blocks = {name: block[mask] for name, block in blocks.items()}
+            dates = dates[mask]
+
+        index = pd.DatetimeIndex(dates, name="tradedate")
+        labels = pd.Index([self.tickers[i] for i in columns], name="ticker")
+        return {
+            name: pd.DataFrame(block.copy(), index=index, columns=labels)
+            for name, block in blocks.items()
+        }
+
+
+class PriceCache:
+    """
+    Процессный LRU-кэш широких панелей (цены закрытия, логарифмы цен и доходности).
+
+    Панели хранятся массивами NumPy и вытесняются по мере превышения лимита памяти.
+    Запрос на подмножество тикеров или подпериод уже закэшированной панели
+    обслуживается срезом без обращения к базе данных. Когда меняется версия
+    данных (version_func, как в VersionedCache), кэш сбрасывается целиком.
+    """
+
+    def __init__(self, max_bytes=PRICE_CACHE_MAX_BYTES, version_func=None,
+                 version_check_interval=VERSION_CHECK_INTERVAL):
+        self.max_bytes = max_bytes
+        self.version_func = version_func
+        self.version_check_interval = version_check_interval
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked = None
+
+    def check_version(self, version=None):
+        """
+        Сброс кэша при смене версии данных.
+
+        Args:
+            version: версия, уже прочитанная вызывающим (кэш результатов);
+                без неё version_func опрашивается не чаще version_check_interval.
+        """
+        now = time.monotonic()
+        if version is None:
+            if self.version_func is None:
+                return
+            with self._lock:
+                if self._version_checked is not None and now - self._version_checked < self.version_check_interval:
+                    return
+            version = self.version_func()
+
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self.nbytes = 0
+                self._version = version
+            self._version_checked = now
+
+    @staticmethod
+    def _key(namespace, tickers, start, end):
+        return namespace, tuple(sorted(set(tickers))), start, end
+
+    def get(self, tickers, start_date=None, end_date=None, namespace="close"):
+        """Возвращает панель из кэша или None, если она не покрывается ни одной записью."""
+        panels = self.get_panels(tickers, start_date, end_date, namespace=namespace)
+        return None if panels is None else panels[namespace]
+
+    def get_panels(self, tickers, start_date=None, end_date=None, namespace="close"):
+        """Возвращает словарь панелей одной записи (с общими датами) или None."""
+        self.check_version()
+        try:
+            start, end = _to_bound(start_date), _to_bound(end_date)
+        except (TypeError, ValueError):
+            return None
+        requested = frozenset(tickers)
+
+        with self._lock:
+            key = self._key(namespace, tickers, start, end)
+            panel = self._entries.get(key)
+            if panel is None:
+                # Any cached superset (by tickers and by period) will do
+                for candidate_key, candidate in reversed(self._entries.items()):
+                    if candidate.covers(namespace, requested, start, end):
+                        key, panel = candidate_key, candidate
+                        break
+            if panel is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        return panel.slice(requested, start, end)
+
+    def put(self, tickers, start_date, end_date, df, namespace="close"):
+        """Сохраняет дневную панель, полученную из базы данных."""
+        self.put_panels(tickers, start_date, end_date, {namespace: df}, namespace=namespace)
+
+    def put_panels(self, tickers, start_date, end_date, frames, namespace="close"):
+        """
+        Сохраняет несколько панелей одной записью.
+
+        Args:
+            frames: словарь {имя: DataFrame}; даты и тикеры берутся из первой панели,
+                по её пропускам режутся все панели записи.
+        """
+        self.check_version()
+        try:
+            start, end = _to_bound(start_date), _to_bound(end_date)
+        except (TypeError, ValueError):
+            return
+        panel = _Panel(namespace, tickers, start, end, frames)
+        if panel.nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            key = self._key(namespace, tickers, start, end)
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.nbytes -= previous.nbytes
+            self._entries[key] = panel
+            self.nbytes += panel.nbytes
+
+            # LRU eviction until the memory limit is respected
+            while self.nbytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "version": self._version,
+                "entries": len(self._entries),
+                "nbytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# Process-wide cache shared by all endpoints, reset when the data version changes
+price_cache = PriceCache(version_func=lambda: get_data_version()["version"])
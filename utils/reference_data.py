@@ -0,0 +1,60 @@
+# Importing libraries
+from sqlalchemy import func
+
+from .db import SessionLocal
+from .table_models import AssetClass, AllAssetValue
+from .cache import VersionedCache, DEFAULT_TTL
+from .data_version import get_data_version
+
+# One cache of reference lookups for all endpoints, reset when the data version changes
+reference_cache = VersionedCache(
+    "reference", ttl=DEFAULT_TTL, version_func=lambda: get_data_version()["version"]
+)
+
+
+def _load_asset_list():
+    session = SessionLocal()
+    try:
+        assets = session.query(AssetClass.ticker, AssetClass.asset_ru).all()
+        return [{"ticker": asset.ticker, "asset_ru": asset.asset_ru} for asset in assets]
+    finally:
+        session.close()
+
+
+def _load_asset_class_members():
+    session = SessionLocal()
+    try:
+        members = {}
+        for asset_ru, ticker in session.query(AssetClass.asset_ru, AssetClass.ticker).order_by(AssetClass.id):
+            members.setdefault(asset_ru, []).append(ticker)
+        return members
+    finally:
+        session.close()
+
+
+def _load_ticker_date_ranges():
+    session = SessionLocal()
+    try:
+        rows = session.query(
+            AllAssetValue.ticker,
+            func.min(AllAssetValue.tradedate).label("first_date"),
+            func.max(AllAssetValue.tradedate).label("last_date"),
+        ).group_by(AllAssetValue.ticker)
+        return {row.ticker: (str(row.first_date)[:10], str(row.last_date)[:10]) for row in rows}
+    finally:
+        session.close()
+
+
+def get_asset_list():
+    """Список активов (ticker, asset_ru) из таблицы asset_classes."""
+    return reference_cache.get_or_load("asset_list", _load_asset_list)
+
+
+def get_asset_class_members():
+    """Состав классов активов: {asset_ru: [ticker, ...]}."""
+    return reference_cache.get_or_load("asset_class_members", _load_asset_class_members)
+
+
+def get_ticker_date_ranges():
+    """Первая и последняя даты котировок каждого тикера: {ticker: (first_date, last_date)}."""
+    return reference_cache.get_or_load("ticker_date_ranges", _load_ticker_date_ranges)
@@ -0,0 +1,285 @@
+# Import libraries
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .db import BASE_DIR
+from .data_version import get_data_version
+from .shared_matrix import get_shared_matrix
+from .price_cache import price_cache
+
+# Separate SQLite file: survives restarts and is shared by all workers
+RESULT_CACHE_PATH = os.path.join(BASE_DIR, "result_cache.db")
+RESULT_CACHE_MAX_ENTRIES = 10_000
+
+# Hit/miss counters and last_used of hits are kept in memory and written at most
+# this often (and with every put), so a lookup does not take the write lock
+RESULT_STATS_FLUSH_INTERVAL = 30.0
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _normalize_date(value):
+    if value is None or value == "":
+        return None
+    return pd.Timestamp(value).strftime("%Y-%m-%d")
+
+
+def _last_trading_day(end_date, last_tradedate):
+    """Конец периода, округлённый вниз до последнего торгового дня в базе."""
+    if end_date is None:
+        return last_tradedate
+    if last_tradedate is not None and end_date > last_tradedate:
+        return last_tradedate
+
+    matrix = get_shared_matrix()
+    if matrix is not None and len(matrix.dates):
+        i = np.searchsorted(matrix.dates, np.datetime64(end_date, "D"), side="right")
+        if i > 0:
+            return str(matrix.dates[i - 1])
+    return end_date
+
+
+def canonical_request(params, last_tradedate=None):
+    """
+    Каноническая форма параметров запроса.
+
+    Тикеры сортируются, даты приводятся к YYYY-MM-DD, конец периода
+    округляется до последнего торгового дня, числа - к float.
+    """
+    canonical = {}
+    for name, value in params.items():
+        if name == "tickers":
+            value = sorted(set(value))
+        elif name == "start_date":
+            value = _normalize_date(value)
+        elif name == "end_date":
+            value = _last_trading_day(_normalize_date(value), last_tradedate)
+        elif isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+            value = float(value)
+        canonical[name] = value
+    return canonical
+
+
+def request_key(endpoint, params, last_tradedate=None):
+    canonical = canonical_request(params, last_tradedate)
+    text = json.dumps({"endpoint": endpoint, "params": canonical}, sort_keys=True, default=_json_default)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Кэш результатов (JSON) в SQLite, ключ - хэш канонического запроса.
+
+    Запись действительна только для версии данных, с которой она посчитана:
+    после обновления котировок (bump_data_version) старые записи не выдаются
+    и удаляются при следующей записи. Чтение из кэша - только чтение SQLite:
+    счётчики и время последнего использования копятся в памяти процесса и
+    записываются раз в flush_interval секунд или вместе с новой записью.
+    """
+
+    def __init__(self, path=RESULT_CACHE_PATH, max_entries=RESULT_CACHE_MAX_ENTRIES,
+                 flush_interval=RESULT_STATS_FLUSH_INTERVAL):
+        self.path = path
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._initialized = False
+        self._pending_stats = {}  # endpoint -> [hits, misses]
+        self._pending_used = {}  # key -> [last_used, hits]
+        self._flushed = time.monotonic()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    endpoint TEXT,
+                    data_version TEXT,
+                    payload TEXT,
+                    created REAL,
+                    last_used REAL,
+                    hits INTEGER DEFAULT 0
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS result_stats (
+                    endpoint TEXT PRIMARY KEY,
+                    hits INTEGER DEFAULT 0,
+                    misses INTEGER DEFAULT 0
+                )
+            """)
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def _count(self, endpoint, key, hit):
+        """Учёт обращения в памяти; True, если пора записать накопленное."""
+        with self._lock:
+            counts = self._pending_stats.setdefault(endpoint, [0, 0])
+            if hit:
+                counts[0] += 1
+                self.hits += 1
+                used = self._pending_used.setdefault(key, [0.0, 0])
+                used[0] = time.time()
+                used[1] += 1
+            else:
+                counts[1] += 1
+                self.misses += 1
+            return time.monotonic() - self._flushed >= self.flush_interval
+
+    def _write_pending(self, conn):
+        # Called inside a write transaction of conn
+        with self._lock:
+            stats, used = self._pending_stats, self._pending_used
+            self._pending_stats, self._pending_used = {}, {}
+            self._flushed = time.monotonic()
+
+        conn.executemany("INSERT OR IGNORE INTO result_stats (endpoint) VALUES (?)", [(e,) for e in stats])
+        conn.executemany(
+            "UPDATE result_stats SET hits = hits + ?, misses = misses + ? WHERE endpoint = ?",
+            [(hits, misses, endpoint) for endpoint, (hits, misses) in stats.items()],
+        )
+        conn.executemany(
+            "UPDATE results SET hits = hits + ?, last_used = MAX(last_used, ?) WHERE key = ?",
+            [(hits, last_used, key) for key, (last_used, hits) in used.items()],
+        )
+
+    def flush_stats(self):
+        """Запись накопленных счётчиков и времени использования в файл кэша."""
+        with self._lock:
+            if not self._pending_stats and not self._pending_used:
+                return
+        conn = self._connect()
+        try:
+            with conn:
+                self._write_pending(conn)
+        finally:
+            conn.close()
+
+    def get(self, endpoint, key, data_version):
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT payload FROM results WHERE key = ? AND data_version = ?", (key, data_version)
+            ).fetchone()
+        finally:
+            conn.close()
+
+        if self._count(endpoint, key, row is not None):
+            try:
+                self.flush_stats()
+            except sqlite3.Error as e:
+                # Only the statistics are lost, the cached result is still served
+                print(f"Не удалось записать статистику кэша результатов: {e}")
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, endpoint, key, data_version, payload):
+        text = json.dumps(payload, default=_json_default)
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM results WHERE data_version != ?", (data_version,))
+                # Pending counters go with this write; last_used is current before the LRU eviction
+                self._write_pending(conn)
+                conn.execute("""
+                    INSERT OR REPLACE INTO results (key, endpoint, data_version, payload, created, last_used, hits)
+                    VALUES (?, ?, ?, ?, ?, ?, 0)
+                """, (key, endpoint, data_version, text, now, now))
+                # Least recently used entries above the limit
+                conn.execute("""
+                    DELETE FROM results WHERE key IN (
+                        SELECT key FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,))
+        finally:
+            conn.close()
+
+    def get_or_compute(self, endpoint, params, compute):
+        """
+        Результат compute() для запроса params из кэша или с сохранением в кэш.
+
+        Ошибки самого кэша (блокировка, повреждённый файл) не влияют на ответ:
+        результат просто вычисляется заново.
+        """
+        try:
+            data_version = get_data_version()
+            key = request_key(endpoint, params, data_version["last_tradedate"])
+            cached = self.get(endpoint, key, data_version["version"])
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Кэш результатов недоступен: {e}")
+            return compute()
+
+        if cached is not None:
+            return cached
+
+        # The result is stored under this version: panels of an older one must not be reused
+        price_cache.check_version(data_version["version"])
+        result = compute()
+        try:
+            self.put(endpoint, key, data_version["version"], result)
+        except sqlite3.Error as e:
+            print(f"Не удалось сохранить результат в кэш: {e}")
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._pending_stats, self._pending_used = {}, {}
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM results")
+                conn.execute("DELETE FROM result_stats")
+        finally:
+            conn.close()
+
+    def stats(self):
+        self.flush_stats()
+        conn = self._connect()
+        try:
+            entries = dict(conn.execute("SELECT endpoint, COUNT(*) FROM results GROUP BY endpoint").fetchall())
+            nbytes = conn.execute("SELECT COALESCE(SUM(LENGTH(payload)), 0) FROM results").fetchone()[0]
+            endpoints = {
+                endpoint: {
+                    "entries": entries.get(endpoint, 0),
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_rate": hits / (hits + misses) if hits + misses else None,
+                }
+                for endpoint, hits, misses in conn.execute("SELECT endpoint, hits, misses FROM result_stats")
+            }
+        finally:
+            conn.close()
+
+        with self._lock:
+            process = {"hits": self.hits, "misses": self.misses}
+        return {
+            "entries": sum(entries.values()),
+            "nbytes": nbytes,
+            "max_entries": self.max_entries,
+            "process": process,
+            "endpoints": endpoints,
+        }
+
+
+# Process-wide handle of the shared cache file
+result_cache = ResultCache()
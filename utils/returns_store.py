@@ -0,0 +1,211 @@
+# Importing libraries
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from .table_models import AssetReturn
+from .get_prices_sql import read_wide_panels, get_prices_orm
+from .price_cache import price_cache
+from .shared_matrix import get_shared_matrix
+
+RETURNS_TABLE = AssetReturn.__tablename__
+
+# Instrument id column of every price table
+ID_COLUMNS = {
+    "stock_values": "ticker",
+    "index_values": "secid",
+    "currency_values": "secid",
+}
+
+
+def compute_log_returns(closes, last_log_close=None):
+    """
+    Очищает цены одной бумаги и считает лог-доходности.
+
+    Нулевые и пустые цены заменяются предыдущей ценой (ffill), а ведущие -
+    первой положительной ценой (bfill), как это делалось в get_portfolio_history.
+
+    Args:
+        closes: цены закрытия бумаги в порядке дат.
+        last_log_close: логарифм последней уже сохранённой цены (для дозаписи).
+
+    Returns:
+        log_close: логарифмы очищенных цен (NaN, если цены нет вовсе)
+        log_return: лог-доходности к предыдущему торговому дню бумаги
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    positions = np.arange(len(closes))
+    valid = closes > 0
+
+    # Forward fill of zero/NaN prices
+    last_valid = np.maximum.accumulate(np.where(valid, positions, -1))
+    log_close = np.full(len(closes), np.nan)
+    filled = last_valid >= 0
+    log_close[filled] = np.log(closes[last_valid[filled]])
+
+    # Leading gap: previous stored price, otherwise the first positive price
+    if not filled.all():
+        if last_log_close is not None:
+            log_close[~filled] = last_log_close
+        elif valid.any():
+            log_close[~filled] = np.log(closes[np.argmax(valid)])
+
+    previous = np.nan if last_log_close is None else last_log_close
+    log_return = np.diff(log_close, prepend=previous)
+
+    return log_close, log_return
+
+
+def ensure_returns_table(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {RETURNS_TABLE} (
+            tradedate DATE NOT NULL,
+            ticker TEXT NOT NULL,
+            log_close REAL,
+            log_return REAL,
+            PRIMARY KEY (ticker, tradedate)
+        )
+    """)
+
+
+# Appending returns for the new candles of one ticker
+def update_returns(conn, ticker, table_name="stock_values"):
+    ensure_returns_table(conn)
+    id_column = ID_COLUMNS[table_name]
+
+    last = conn.execute(f"""
+        SELECT tradedate, log_close FROM {RETURNS_TABLE}
+        WHERE ticker = ? ORDER BY tradedate DESC LIMIT 1
+    """, (ticker,)).fetchone()
+    last_date, last_log_close = last if last else (None, None)
+
+    query = f"SELECT tradedate, close FROM {table_name} WHERE {id_column} = ?"
+    params = [ticker]
+    if last_date:
+        query += " AND tradedate > ?"
+        params.append(last_date)
+    query += " GROUP BY tradedate ORDER BY tradedate"
+    rows = conn.execute(query, params).fetchall()
+
+    if not rows:
+        return 0
+
+    dates = [row[0] for row in rows]
+    log_close, log_return = compute_log_returns([row[1] for row in rows], last_log_close)
+
+    records = [
+        (d, ticker, float(lc), None if np.isnan(lr) else float(lr))
+        for d, lc, lr in zip(dates, log_close, log_return)
+        if not np.isnan(lc)
+    ]
+    conn.executemany(f"""
+        INSERT OR REPLACE INTO {RETURNS_TABLE} (tradedate, ticker, log_close, log_return)
+        VALUES (?, ?, ?, ?)
+    """, records)
+    conn.commit()
+    return len(records)
+
+
+# Full rebuild of the returns table from all price tables
+def rebuild_returns(db_path="moex_data.db"):
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"DROP TABLE IF EXISTS {RETURNS_TABLE}")
+    ensure_returns_table(conn)
+
+    for table_name, id_column in ID_COLUMNS.items():
+        tickers = [row[0] for row in conn.execute(f"SELECT DISTINCT {id_column} FROM {table_name}")]
+        for ticker in tickers:
+            count = update_returns(conn, ticker, table_name=table_name)
+            print(f"{ticker}: {count} строк доходностей")
+
+    conn.close()
+
+
+# Computing the panels from prices for tickers that are not in the store yet
+def _panels_from_prices(tickers, start_date=None, end_date=None):
+    prices = get_prices_orm(tickers, start_date=start_date, end_date=end_date)
+    log_close = pd.DataFrame(np.nan, index=prices.index, columns=prices.columns)
+    log_return = log_close.copy()
+
+    for ticker in prices.columns:
+        series = prices[ticker].dropna()
+        lc, lr = compute_log_returns(series.values)
+        log_close.loc[series.index, ticker] = lc
+        log_return.loc[series.index, ticker] = lr
+
+    return log_close, log_return
+
+
+def _read_return_panels(tickers, start_date=None, end_date=None):
+    matrix = get_shared_matrix()
+    if matrix is not None and matrix.covers(tickers, end_date):
+        panels = matrix.panels(("log_close", "log_return"), tickers, start_date, end_date)
+        return panels["log_close"], panels["log_return"]
+
+    # Both panels are one cache entry, so a subset keeps the same dates in each
+    panels = price_cache.get_panels(tickers, start_date, end_date, namespace="returns")
+    if panels is not None:
+        return panels["log_close"], panels["log_return"]
+
+    try:
+        panels = read_wide_panels(
+            RETURNS_TABLE, ("log_close", "log_return"), tickers,
+            start_date=start_date, end_date=end_date,
+        )
+        log_close, log_return = panels["log_close"], panels["log_return"]
+    except sqlite3.OperationalError:
+        # The store has not been built yet
+        log_close, log_return = pd.DataFrame(), pd.DataFrame()
+
+    missing = [t for t in dict.fromkeys(tickers) if t not in log_close.columns]
+    if missing:
+        extra_close, extra_return = _panels_from_prices(missing, start_date, end_date)
+        if not extra_close.empty:
+            log_close = pd.concat([log_close, extra_close], axis=1).sort_index()
+            log_return = pd.concat([log_return, extra_return], axis=1).sort_index()
+            log_close.columns.name = log_return.columns.name = "ticker"
+            log_close.index.name = log_return.index.name = "tradedate"
+
+    price_cache.put_panels(
+        tickers, start_date, end_date,
+        {"log_close": log_close, "log_return": log_return}, namespace="returns",
+    )
+    return log_close, log_return
+
+
+def get_log_close_panel(tickers, start_date=None, end_date=None, frequency=252):
+    """Широкая панель логарифмов очищенных цен (NaN - бумага в этот день не торговалась)."""
+    log_close, _ = _read_return_panels(tickers, start_date, end_date)
+
+    if log_close.empty:
+        return pd.DataFrame()
+
+    if frequency == 12:
+        log_close = log_close.resample('M').last()
+
+    return log_close
+
+
+def get_simple_returns(tickers, start_date=None, end_date=None, frequency=252):
+    """
+    Простые доходности бумаг для оценки mu/S (NaN там, где доходности нет).
+
+    Дневная доходность берётся напрямую из хранилища, а первая доходность
+    бумаги в периоде отбрасывается, так как опирается на цену до start_date.
+    """
+    log_close, log_return = _read_return_panels(tickers, start_date, end_date)
+
+    if log_close.empty:
+        return pd.DataFrame()
+
+    if frequency == 12:
+        returns = log_close.resample('M').last().diff()
+    else:
+        values = log_return.to_numpy(copy=True)
+        present = ~np.isnan(log_close.to_numpy())
+        columns = np.flatnonzero(present.any(axis=0))
+        values[present.argmax(axis=0)[columns], columns] = np.nan
+        returns = pd.DataFrame(values, index=log_return.index, columns=log_return.columns)
+
+    return np.expm1(returns).dropna(how="all")
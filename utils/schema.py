@@ -0,0 +1,186 @@
+# Import libraries
+import sys
+import sqlite3
+
+from .table_models import AllAssetValue
+from .returns_store import ID_COLUMNS, RETURNS_TABLE, ensure_returns_table
+
+# Unified price table (replaces the UNION ALL view with the same name and columns)
+ASSET_PRICES_TABLE = AllAssetValue.__tablename__
+
+# asset_type of every price table
+ASSET_TYPES = {
+    "stock_values": "stock",
+    "index_values": "index",
+    "currency_values": "currency",
+}
+
+# Hot queries of the API and the updater: (name, sql, params).
+# None of them may fall back to a full table scan
+HOT_QUERIES = [
+    ("price panel", f"""
+        SELECT tradedate, ticker, close FROM {ASSET_PRICES_TABLE}
+        WHERE ticker IN (?, ?) AND tradedate >= ? AND tradedate <= ?
+    """, ("SBER", "GAZP", "2020-01-01", "2024-01-01")),
+    ("price panel without dates", f"""
+        SELECT tradedate, ticker, close FROM {ASSET_PRICES_TABLE} WHERE ticker IN (?, ?)
+    """, ("SBER", "GAZP")),
+    ("index and currency prices", f"""
+        SELECT tradedate, ticker AS secid, close FROM {ASSET_PRICES_TABLE}
+        WHERE ticker IN (?, ?) AND asset_type IN ('index', 'currency') AND tradedate >= ?
+        ORDER BY tradedate
+    """, ("MCFTR", "USD000UTSTOM", "2020-01-01")),
+    ("returns panel", f"""
+        SELECT tradedate, ticker, log_close, log_return FROM {RETURNS_TABLE}
+        WHERE ticker IN (?, ?) AND tradedate >= ? AND tradedate <= ?
+    """, ("SBER", "GAZP", "2020-01-01", "2024-01-01")),
+    ("last return", f"""
+        SELECT tradedate, log_close FROM {RETURNS_TABLE}
+        WHERE ticker = ? ORDER BY tradedate DESC LIMIT 1
+    """, ("SBER",)),
+] + [
+    (f"{table_name} new candles", f"""
+        SELECT tradedate, close FROM {table_name}
+        WHERE {id_column} = ? AND tradedate > ? GROUP BY tradedate ORDER BY tradedate
+    """, ("SBER", "2024-01-01"))
+    for table_name, id_column in ID_COLUMNS.items()
+] + [
+    (f"{table_name} last date", f"""
+        SELECT MAX(tradedate) FROM {table_name} WHERE {id_column} = ?
+    """, ("SBER",))
+    for table_name, id_column in ID_COLUMNS.items()
+]
+
+
+def _object_type(conn, name):
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+
+def ensure_asset_prices(conn):
+    """
+    Материализованная таблица всех цен вместо представления all_assets.
+
+    Таблица WITHOUT ROWID с первичным ключом (ticker, tradedate): строки хранятся
+    в B-дереве этого ключа рядом с close, поэтому выборка по тикерам и окну дат -
+    поиск по покрывающему индексу (ticker, tradedate, close) без обращения к
+    исходным таблицам и без UNION.
+
+    Returns:
+        True, если таблица была создана (и заполнена) при этом вызове.
+    """
+    object_type = _object_type(conn, ASSET_PRICES_TABLE)
+    if object_type == "table":
+        return False
+
+    with conn:
+        if object_type == "view":
+            conn.execute(f"DROP VIEW {ASSET_PRICES_TABLE}")
+        conn.execute(f"""
+            CREATE TABLE {ASSET_PRICES_TABLE} (
+                tradedate DATE NOT NULL,
+                ticker TEXT NOT NULL,
+                close REAL,
+                asset_type TEXT,
+                PRIMARY KEY (ticker, tradedate)
+            ) WITHOUT ROWID
+        """)
+        for table_name in ID_COLUMNS:
+            if _object_type(conn, table_name) == "table":
+                _copy_prices(conn, table_name)
+    return True
+
+
+def _copy_prices(conn, table_name, ticker=None, since=None):
+    id_column = ID_COLUMNS[table_name]
+    query = f"""
+        INSERT OR REPLACE INTO {ASSET_PRICES_TABLE} (tradedate, ticker, close, asset_type)
+        SELECT substr(tradedate, 1, 10), {id_column}, close, ?
+        FROM {table_name}
+        WHERE {id_column} IS NOT NULL
+    """
+    params = [ASSET_TYPES[table_name]]
+    if ticker is not None:
+        query += f" AND {id_column} = ?"
+        params.append(ticker)
+    if since is not None:
+        query += " AND tradedate >= ?"
+        params.append(since)
+    # Later rows win for duplicated (id, tradedate), as in the old view + pivot
+    query += " ORDER BY rowid"
+    return conn.execute(query, params).rowcount
+
+
+def refresh_asset_prices(conn, ticker, table_name="stock_values", since=None):
+    """
+    Перенос новых (или перезаписанных) цен одной бумаги в таблицу all_assets.
+
+    Args:
+        since: первая изменённая дата ('YYYY-MM-DD'); None - все даты бумаги.
+
+    Returns:
+        Количество записанных строк.
+    """
+    ensure_asset_prices(conn)
+    with conn:
+        return _copy_prices(conn, table_name, ticker=ticker, since=since)
+
+
+def migrate(db_path="moex_data.db"):
+    """Индексы (id, tradedate) исходных таблиц, таблица доходностей и материализация all_assets."""
+    from .bulk_write import ensure_unique_index
+
+    conn = sqlite3.connect(db_path)
+    try:
+        for table_name in ID_COLUMNS:
+            if _object_type(conn, table_name) == "table":
+                ensure_unique_index(conn, table_name)
+        ensure_returns_table(conn)
+        conn.commit()
+        if ensure_asset_prices(conn):
+            print(f"Таблица {ASSET_PRICES_TABLE} материализована")
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def explain(conn, sql, params=()):
+    """Строки EXPLAIN QUERY PLAN запроса."""
+    return [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def check_query_plans(db_path="moex_data.db", queries=None):
+    """
+    Проверка, что горячие запросы используют индексы.
+
+    Raises:
+        RuntimeError: если план хотя бы одного запроса содержит полный просмотр таблицы (SCAN).
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        problems = []
+        for name, sql, params in queries or HOT_QUERIES:
+            plan = explain(conn, sql, params)
+            scans = [step for step in plan if step.startswith("SCAN")]
+            if scans:
+                problems.append(f"{name}: {'; '.join(scans)}")
+    finally:
+        conn.close()
+
+    if problems:
+        raise RuntimeError("Полный просмотр таблицы в горячих запросах:\n" + "\n".join(problems))
+    return True
+
+
+# Run from the project root: python -m utils.schema [migrate|check]
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "migrate"
+    if command == "migrate":
+        migrate(db_path="moex_data.db")
+    try:
+        check_query_plans(db_path="moex_data.db")
+        print("Планы запросов в порядке")
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
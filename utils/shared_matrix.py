@@ -0,0 +1,161 @@
+# Importing libraries
+import os
+import json
+import time
+import shutil
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .db import BASE_DIR
+from .table_models import AllAssetValue
+from .data_version import covers_window
+
+# Versioned matrices live in <dir>/v<timestamp>/, <dir>/current.json points to the active one
+# (a pointer file instead of a symlink: os.symlink needs extra rights on Windows)
+SHARED_MATRIX_DIR = os.path.join(BASE_DIR, "shared_matrix")
+CURRENT_POINTER = "current.json"
+
+# Panels of the matrix: prices and the returns store
+PANELS = ("close", "log_close", "log_return")
+RETURNS_TABLE = "asset_returns"
+
+# Old versions kept for workers that have not re-attached yet
+KEEP_VERSIONS = 2
+
+
+class SharedMatrix:
+    """
+    Матрицы (даты × тикеры) в .npy, открытые через mmap только для чтения.
+
+    Все процессы-воркеры отображают одни и те же файлы, поэтому страницы
+    находятся в общем page cache ОС, а запрос цен - это срез по окну дат и
+    колонкам без обращения к SQL.
+    """
+
+    def __init__(self, path, dates, tickers, arrays):
+        self.path = path
+        self.dates = dates
+        self.tickers = tickers
+        self.positions = {ticker: i for i, ticker in enumerate(tickers)}
+        self.arrays = arrays
+
+    @classmethod
+    def attach(cls, path):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        dates = np.load(os.path.join(path, "dates.npy"), mmap_mode="r")
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in meta["panels"]}
+        return cls(path, dates, meta["tickers"], arrays)
+
+    def covers(self, tickers, end_date=None):
+        """Есть ли в матрице все тикеры и все даты окна, заканчивающегося end_date."""
+        if not all(ticker in self.positions for ticker in tickers) or not len(self.dates):
+            return False
+        return covers_window(str(self.dates[-1]), end_date)
+
+    def panels(self, names, tickers, start_date=None, end_date=None):
+        """
+        Срезы панелей names для тикеров и окна дат.
+
+        Как и read_wide_panels, оставляются только даты и тикеры, по которым
+        в окне есть значения первой панели (колонки отсортированы по тикеру).
+        """
+        requested = sorted(set(tickers))
+        columns = np.array([self.positions[ticker] for ticker in requested], dtype=np.intp)
+
+        lo = np.searchsorted(self.dates, np.datetime64(start_date, "D"), side="left") if start_date else 0
+        hi = np.searchsorted(self.dates, np.datetime64(end_date, "D"), side="right") if end_date else len(self.dates)
+
+        # Only the requested window is copied out of the mapped file
+        blocks = [np.asarray(self.arrays[name][lo:hi][:, columns]) for name in names]
+        present = ~np.isnan(blocks[0])
+        rows = present.any(axis=1)
+        keep = present.any(axis=0)
+
+        index = pd.DatetimeIndex(np.asarray(self.dates[lo:hi][rows]).astype("datetime64[ns]"), name="tradedate")
+        labels = pd.Index([ticker for ticker, k in zip(requested, keep) if k], name="ticker")
+        return {
+            name: pd.DataFrame(block[rows][:, keep], index=index, columns=labels)
+            for name, block in zip(names, blocks)
+        }
+
+
+def build_shared_matrix(db_path="moex_data.db", path=SHARED_MATRIX_DIR):
+    """
+    Построение новой версии матрицы и атомарное переключение указателя current.json.
+
+    Воркеры, которые уже отобразили предыдущую версию, продолжают читать её,
+    пока не переподключатся (см. get_shared_matrix).
+    """
+    from .get_prices_sql import read_wide_panels
+
+    conn = sqlite3.connect(db_path)
+    try:
+        tickers = [row[0] for row in conn.execute(
+            f"SELECT DISTINCT ticker FROM {AllAssetValue.__tablename__} ORDER BY ticker")]
+    finally:
+        conn.close()
+
+    close = read_wide_panels(AllAssetValue.__tablename__, ("close",), tickers, db_path=db_path)["close"]
+    try:
+        returns = read_wide_panels(RETURNS_TABLE, ("log_close", "log_return"), tickers, db_path=db_path)
+    except sqlite3.OperationalError:
+        # The returns store has not been built yet
+        returns = {"log_close": pd.DataFrame(), "log_return": pd.DataFrame()}
+
+    dates = close.index.union(returns["log_close"].index)
+    tickers = sorted(set(close.columns) | set(returns["log_close"].columns))
+    panels = {"close": close, **returns}
+
+    os.makedirs(path, exist_ok=True)
+    version = f"v{time.time_ns()}"
+    version_path = os.path.join(path, version)
+    os.makedirs(version_path)
+
+    np.save(os.path.join(version_path, "dates.npy"), dates.values.astype("datetime64[D]"))
+    for name in PANELS:
+        values = panels[name].reindex(index=dates, columns=tickers).to_numpy(dtype=np.float64)
+        np.save(os.path.join(version_path, f"{name}.npy"), np.ascontiguousarray(values))
+    with open(os.path.join(version_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"tickers": tickers, "panels": list(PANELS)}, f)
+
+    # Atomic switch of the pointer: readers see either the old or the new file
+    tmp_pointer = os.path.join(path, CURRENT_POINTER + ".tmp")
+    with open(tmp_pointer, "w", encoding="utf-8") as f:
+        json.dump({"version": version}, f)
+    os.replace(tmp_pointer, os.path.join(path, CURRENT_POINTER))
+
+    # Mapped files of removed versions stay readable until workers re-attach
+    versions = sorted(name for name in os.listdir(path) if name.startswith("v"))
+    for old in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(path, old), ignore_errors=True)
+
+    print(f"Общая матрица цен обновлена: {len(dates)} дат, {len(tickers)} бумаг ({version})")
+    return version_path
+
+
+_attached = {"matrix": None, "target": None}
+_attach_lock = threading.Lock()
+
+
+def get_shared_matrix(path=SHARED_MATRIX_DIR):
+    """Матрица текущего процесса; после переключения current.json подключается новая версия."""
+    try:
+        with open(os.path.join(path, CURRENT_POINTER), encoding="utf-8") as f:
+            target = json.load(f)["version"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+    with _attach_lock:
+        if _attached["matrix"] is None or _attached["target"] != target:
+            _attached["matrix"] = SharedMatrix.attach(os.path.join(path, target))
+            _attached["target"] = target
+        return _attached["matrix"]
+
+
+# Run from the project root: python -m utils.shared_matrix
+if __name__ == "__main__":
+    build_shared_matrix(db_path="moex_data.db")
@@ -24,7 +24,7 @@ class CurrencyValue(Base):
 
 class AllAssetValue(Base):
     __tablename__ = 'all_assets'
-    __table_args__ = {'extend_existing': True}  # важно для view
+    __table_args__ = {'extend_existing': True}  # view UNION ALL или материализованная таблица (utils/schema.py)
 
     tradedate = Column(Date, primary_key=True)
     ticker = Column(String, primary_key=True)
@@ -37,6 +37,20 @@ class AllAssetValue(Base):
             f"close={self.close}, type='{self.asset_type}')>"
         )
     
+class AssetReturn(Base):
+    __tablename__ = 'asset_returns'
+
+    tradedate = Column(Date, primary_key=True)
+    ticker = Column(String, primary_key=True)
+    log_close = Column(Float)   # Логарифм очищенной цены закрытия
+    log_return = Column(Float)  # Лог-доходность к предыдущему торговому дню бумаги
+
+    def __repr__(self):
+        return (
+            f"<AssetReturn(ticker='{self.ticker}', date='{self.tradedate}', "
+            f"log_return={self.log_return})>"
+        )
+
 class AssetClass(Base):
     __tablename__ = 'asset_classes'
 